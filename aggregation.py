@@ -0,0 +1,238 @@
+"""Time series aggregation: reduce demand and wind time series to a small
+number of representative periods (e.g. days), each weighted by the number
+of periods it represents, so that models can be solved with far fewer time
+steps."""
+
+
+import time
+import logging
+import numpy as np
+import pandas as pd
+import buq
+
+
+AGGREGATION_METHODS = ['kmeans', 'kmedoids']
+
+
+def _init_centres(features, num_clusters, rng):
+    """Choose initial cluster centres with k-means++ seeding."""
+    centres = [int(rng.integers(features.shape[0]))]
+    sq_dists = ((features - features[centres[0]])**2).sum(axis=1)
+    for _ in range(1, num_clusters):
+        if sq_dists.sum() == 0:    # Fewer distinct periods than clusters
+            centres.append(int(rng.integers(features.shape[0])))
+        else:
+            centres.append(int(rng.choice(features.shape[0],
+                                          p=sq_dists/sq_dists.sum())))
+        sq_dists = np.minimum(
+            sq_dists, ((features - features[centres[-1]])**2).sum(axis=1)
+        )
+    return np.array(centres)
+
+
+def _get_sq_dists(points, centres):
+    """Squared distances between each point and each centre."""
+    sq_dists = ((points**2).sum(axis=1)[:, None]
+                - 2 * points @ centres.T
+                + (centres**2).sum(axis=1)[None, :])
+    return np.maximum(sq_dists, 0)
+
+
+def _assign_clusters(features, centres):
+    """Number of the nearest centre of each period."""
+    return _get_sq_dists(features, centres).argmin(axis=1)
+
+
+def _get_medoid(points, block_size=1000):
+    """Row number of the point with the smallest total distance to all
+    other points. Distances are calculated in blocks of rows to limit
+    memory use."""
+    total_dists = np.concatenate([
+        np.sqrt(_get_sq_dists(points[start:start+block_size],
+                              points)).sum(axis=1)
+        for start in range(0, points.shape[0], block_size)
+    ])
+    return total_dists.argmin()
+
+
+def kmeans(features, num_clusters, rng, max_iter=100):
+    """Cluster periods with k-means (Lloyd's algorithm).
+
+    Parameters:
+    -----------
+    features (numpy array) : one row of features per period
+    num_clusters (int) : number of clusters
+    rng (numpy Generator) : random number generator for the initial centres
+    max_iter (int) : maximum number of iterations
+
+    Returns:
+    --------
+    labels (numpy array) : cluster number of each period
+    centres (numpy array) : mean features of each cluster
+    """
+
+    centres = features[_init_centres(features, num_clusters, rng)]
+    labels = _assign_clusters(features, centres)
+    for _ in range(max_iter):
+        for cluster in range(num_clusters):
+            if (labels == cluster).any():
+                centres[cluster] = features[labels == cluster].mean(axis=0)
+        new_labels = _assign_clusters(features, centres)
+        if (new_labels == labels).all():
+            break
+        labels = new_labels
+
+    return labels, centres
+
+
+def kmedoids(features, num_clusters, rng, max_iter=100):
+    """Cluster periods with k-medoids (alternating algorithm), so that the
+    centre of each cluster is one of the periods.
+
+    Parameters and returns as for kmeans, and additionally:
+    medoids (numpy array) : period number of the centre of each cluster
+    """
+
+    medoids = _init_centres(features, num_clusters, rng)
+    labels = _assign_clusters(features, features[medoids])
+    for _ in range(max_iter):
+        for cluster in range(num_clusters):
+            members = np.flatnonzero(labels == cluster)
+            if len(members) == 0:
+                continue
+            medoids[cluster] = members[_get_medoid(features[members])]
+        new_labels = _assign_clusters(features, features[medoids])
+        if (new_labels == labels).all():
+            break
+        labels = new_labels
+
+    return labels, features[medoids], medoids
+
+
+def aggregate_time_series(ts_data, num_periods, period_hours=24,
+                          method='kmedoids', seed=0, max_iter=100):
+    """Reduce a time series to representative periods, with time step
+    weights.
+
+    The time series is split into consecutive periods, which are clustered
+    on their hourly demand and wind values (each column scaled to unit
+    standard deviation). Each cluster is represented by one period: the
+    cluster mean for 'kmeans', or its most central period for 'kmedoids'
+    (which keeps realistic combinations of demand and wind). The time
+    steps of a representative period get the number of periods in its
+    cluster as weight, so that the weights add up to the length of the
+    original time series.
+
+    Parameters:
+    -----------
+    ts_data (pandas DataFrame) : demand and wind time series, whose length
+        is a multiple of period_hours
+    num_periods (int) : number of representative periods
+    period_hours (int) : length of each period, e.g. 24 for representative
+        days or 1 for representative hours
+    method (str) : 'kmeans' or 'kmedoids'
+    seed (int) : seed of the random initial cluster centres
+    max_iter (int) : maximum number of clustering iterations
+
+    Returns:
+    --------
+    aggregated (pandas DataFrame) : the representative periods in order of
+        their first occurrence, with a dummy hourly index starting in 2020
+        and an extra column 'weight' with the weight of each time step
+    """
+
+    if method not in AGGREGATION_METHODS:
+        raise ValueError('Aggregation method must be one of {}.'.format(
+            AGGREGATION_METHODS
+        ))
+    if ts_data.shape[0] % period_hours != 0:
+        raise ValueError('Time series length ({}) is not a multiple of the '
+                         'period length ({}).'.format(ts_data.shape[0],
+                                                      period_hours))
+    num_all_periods = ts_data.shape[0] // period_hours
+    if not 0 < num_periods <= num_all_periods:
+        raise ValueError('Number of representative periods must be between '
+                         '1 and {}.'.format(num_all_periods))
+
+    # One row of hourly values per period
+    values = ts_data.values.astype(float)
+    periods = values.reshape(num_all_periods, -1)
+    scale = np.tile(values.std(axis=0), period_hours)
+    scale[scale == 0] = 1.
+    features = periods / scale
+
+    rng = np.random.default_rng(seed)
+    if method == 'kmeans':
+        labels, centres = kmeans(features, num_periods, rng,
+                                 max_iter=max_iter)
+        rep_periods = centres * scale
+    else:
+        labels, _, medoids = kmedoids(features, num_periods, rng,
+                                      max_iter=max_iter)
+        rep_periods = periods[medoids]
+
+    # Keep non-empty clusters, ordered by first occurrence
+    clusters = pd.unique(labels)
+    counts = np.bincount(labels, minlength=num_periods)[clusters]
+    aggregated_values = rep_periods[clusters].reshape(-1, values.shape[1])
+    index = pd.date_range(start='2020-01-01',
+                          periods=aggregated_values.shape[0], freq='h')
+    aggregated = pd.DataFrame(aggregated_values, index=index,
+                              columns=ts_data.columns)
+    aggregated['weight'] = np.repeat(counts, period_hours).astype(float)
+
+    return aggregated
+
+
+def compare_with_full_resolution(model_name_in_paper, ts_data,
+                                 aggregations, fixed_caps=None):
+    """Measure the accuracy and speed-up of solving a model on aggregated
+    time series, against solving it on the full time series.
+
+    Parameters:
+    -----------
+    model_name_in_paper (str) : 'LP_planning', 'MILP_planning' or
+        'operation'
+    ts_data (pandas DataFrame) : demand and wind time series
+    aggregations (list) : aggregation settings to compare, each a dict of
+        keyword arguments of aggregate_time_series, e.g.
+        {'num_periods': 20}
+    fixed_caps (pandas DataFrame or Series) : capacities of the operation
+        model, see buq.run_simulation
+
+    Returns:
+    --------
+    comparison (pandas DataFrame) : one column per aggregation setting
+        (in the order given) with the number of time steps, solve time, and
+        the relative error of each summary output against the full solve
+        (NaN for outputs that are zero in the full solve)
+    """
+
+    full_results = buq.run_simulation(model_name_in_paper, ts_data=ts_data,
+                                      check_consistency=False,
+                                      fixed_caps=fixed_caps)
+    full_outputs = full_results.loc[:, 'output'].drop(
+        buq.RUN_INFO_OUTPUTS
+    )
+    comparison = {}
+    for setting_num, aggregation in enumerate(aggregations):
+        start = time.time()
+        aggregated = aggregate_time_series(ts_data, **aggregation)
+        results = buq.run_simulation(model_name_in_paper,
+                                     ts_data=aggregated,
+                                     check_consistency=False,
+                                     fixed_caps=fixed_caps)
+        outputs = results.loc[:, 'output'].drop(buq.RUN_INFO_OUTPUTS)
+        rel_errors = ((outputs - full_outputs).abs()
+                      / full_outputs.abs().where(full_outputs.abs() > 1e-6))
+        comparison[setting_num] = pd.concat([pd.Series({
+            'num_timesteps': aggregated.shape[0],
+            'time': time.time() - start,
+            'time_full': full_results.loc['time', 'output'],
+            'max_rel_error': rel_errors.max()
+        }), rel_errors.rename('rel_error: {}'.format)])
+    comparison = pd.DataFrame(comparison)
+    logging.info('Aggregated against full resolution runs:\n%s',
+                 comparison)
+
+    return comparison
@@ -0,0 +1,245 @@
+"""
+Performance benchmarks, with regression tracking against stored baseline
+timings. Separate from the correctness checks in tests.py.
+
+Micro-benchmarks time individual functions on synthetic data of several
+sizes. Macro-benchmarks time one bootstrap simulation of each of the
+models in the paper, and require the data in `data/` and a solver (CBC by
+default). Run from a command line with
+
+    python3 benchmarks.py --save-baseline    # store baseline timings
+    python3 benchmarks.py                    # compare against baseline
+"""
+
+
+import os
+import json
+import time
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+import buq
+import models
+import tests
+import timing
+
+
+BASELINE_PATH = 'test_benchmarks/timings_baseline.json'
+
+# Number of years of synthetic data used in the micro-benchmarks
+DATA_SIZES = [1, 5, 20]
+
+
+def _time_function(function, num_repeats):
+    """Best wall time (in seconds) of num_repeats calls of function."""
+    times = []
+    for _ in range(num_repeats):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def _make_synthetic_years(num_years):
+    """Synthetic hourly data for num_years non-leap years."""
+    index = pd.date_range('1981-01-01', periods=8760*num_years, freq='h')
+    index = index[~((index.month == 2) & (index.day == 29))]
+    return tests.make_synthetic_time_series(index[:8760*num_years])
+
+
+def run_micro_benchmarks(num_repeats=5):
+    """Time functions that do not solve any models.
+
+    Returns:
+    --------
+    timings (dict) : best time (in seconds) of each benchmark
+    """
+
+    timings = {}
+    for num_years in DATA_SIZES:
+        data = _make_synthetic_years(num_years)
+        rng = np.random.default_rng(0)
+        for name, function in [
+                ('bootstrap_sample_weeks',
+                 lambda: buq.bootstrap_sample_weeks(data, 3, rng=rng)),
+                ('bootstrap_sample_weeks_batch_100',
+                 lambda: buq.bootstrap_sample_weeks_batch(data, 3, 100,
+                                                          rng=rng)),
+                ('bootstrap_sample_months',
+                 lambda: buq.bootstrap_sample_months(data, 1, rng=rng)),
+                ('bootstrap_sample_months_batch_10',
+                 lambda: buq.bootstrap_sample_months_batch(data, 1, 10,
+                                                           rng=rng)),
+                ('detect_missing_leap_days',
+                 lambda: models.detect_missing_leap_days(data))
+        ]:
+            benchmark_name = 'micro/{}/{}_years'.format(name, num_years)
+            timings[benchmark_name] = _time_function(function, num_repeats)
+            logging.info('%s: %.6fs', benchmark_name,
+                         timings[benchmark_name])
+
+    # Override dicts from summary outputs, as in planning -> operation runs
+    summary_outputs = pd.DataFrame(
+        np.random.default_rng(0).random(
+            len(models.SUMMARY_OUTPUT_TABLE_6_REGION)
+        ),
+        index=models.SUMMARY_OUTPUT_TABLE_6_REGION.index,
+        columns=['output']
+    )
+
+    def create_cap_override_dict():
+        models._CAP_OVERRIDE_DICT_CACHE.clear()    # Time without cache
+        models.get_cap_override_dict('6_region', summary_outputs)
+    timings['micro/get_cap_override_dict'] = _time_function(
+        create_cap_override_dict, num_repeats
+    )
+    logging.info('micro/get_cap_override_dict: %.6fs',
+                 timings['micro/get_cap_override_dict'])
+
+    return timings
+
+
+def run_macro_benchmarks(num_blocks_per_bin=(1, 3), num_repeats=5):
+    """Time one bootstrap simulation ('weeks' scheme) of each model in the
+    paper, and summary output extraction from the solved models.
+
+    Parameters:
+    -----------
+    num_blocks_per_bin (tuple) : bootstrap sample sizes, as number of weeks
+        per season, for which summary output extraction is timed
+    num_repeats (int) : number of repeats for output extraction
+
+    Returns:
+    --------
+    timings (dict) : time (in seconds) of each benchmark. Also contains the
+        time of each phase of each simulation
+    """
+
+    timings = {}
+    data = buq.import_time_series_data()
+    for num_blocks in num_blocks_per_bin:
+        for model_name_in_paper in buq.MODELS_IN_PAPER:
+            if num_blocks != num_blocks_per_bin[0] and (
+                    model_name_in_paper != 'LP_planning'):
+                continue    # Larger samples only for output extraction
+            sample = buq.bootstrap_sample_weeks(
+                data, num_blocks, rng=buq.get_sample_rng(0, 0)
+            )
+            timer = timing.PhaseTimer()
+            start = time.perf_counter()
+            model = models.SixRegionModel(
+                ts_data=sample, timer=timer,
+                **buq.MODELS_IN_PAPER[model_name_in_paper]
+            )
+            model.run()
+            model.get_summary_outputs()
+            benchmark_name = 'macro/{}/{}_weeks'.format(model_name_in_paper,
+                                                        4*num_blocks)
+            timings[benchmark_name] = time.perf_counter() - start
+            for phase_name, phase in timer.phases.items():
+                timings['{}/{}'.format(benchmark_name, phase_name)] = (
+                    phase['time']
+                )
+
+            def extract_outputs():
+                model._summary_outputs = None
+                model.get_summary_outputs()
+            timings['micro/get_summary_outputs/{}/{}_weeks'.format(
+                model_name_in_paper, 4*num_blocks
+            )] = _time_function(extract_outputs, num_repeats)
+            logging.info('%s: %.3fs', benchmark_name,
+                         timings[benchmark_name])
+
+    return timings
+
+
+def compare_with_baseline(timings, baseline, threshold=0.25,
+                          min_time=1e-3):
+    """Compare timings against baseline timings.
+
+    Parameters:
+    -----------
+    timings (dict) : current timings, in seconds
+    baseline (dict) : baseline timings, in seconds
+    threshold (float) : relative slowdown above which a benchmark is
+        flagged, e.g. 0.25 flags benchmarks that are 25% slower
+    min_time (float) : benchmarks taking less than this (in seconds) in the
+        baseline are not flagged, since their timings are noisy
+
+    Returns:
+    --------
+    report (pandas DataFrame) : baseline and current time, their ratio and
+        whether the benchmark is flagged as a slowdown, for each benchmark
+    """
+
+    report = pd.DataFrame({'baseline': pd.Series(baseline, dtype=float),
+                           'current': pd.Series(timings, dtype=float)})
+    report['ratio'] = report['current'] / report['baseline']
+    report['slowdown'] = ((report['ratio'] > 1 + threshold)
+                          & (report['baseline'] >= min_time))
+
+    return report
+
+
+def run_benchmarks(save_baseline=False, micro_only=False, threshold=0.25,
+                   baseline_path=BASELINE_PATH):
+    """Run all benchmarks, and either store them as the new baseline or
+    compare them against the stored baseline.
+
+    Returns:
+    --------
+    passing (bool) : False if any benchmark is slower than the baseline by
+        more than the threshold, True otherwise
+    """
+
+    timings = run_micro_benchmarks()
+    if not micro_only:
+        timings.update(run_macro_benchmarks())
+
+    if save_baseline:
+        with open(baseline_path, 'w') as file:
+            json.dump(timings, file, indent=4, sort_keys=True)
+        logging.info('Saved baseline timings to %s', baseline_path)
+        return True
+
+    if not os.path.exists(baseline_path):
+        logging.error('No baseline timings found at %s. Run with '
+                      '--save-baseline first.', baseline_path)
+        return False
+    with open(baseline_path) as file:
+        baseline = json.load(file)
+    report = compare_with_baseline(timings, baseline, threshold=threshold)
+    with pd.option_context('display.max_rows', None,
+                           'display.width', 200):
+        logging.info('Benchmark report:\n%s', report)
+    slowdowns = report[report['slowdown']]
+    if len(slowdowns) > 0:
+        logging.error('FAIL: %s benchmarks are more than %s%% slower than '
+                      'the baseline:\n%s', len(slowdowns),
+                      int(100*threshold), slowdowns)
+        return False
+    logging.info('No slowdowns beyond %s%% of the baseline.',
+                 int(100*threshold))
+
+    return True
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        format='[%(asctime)s] %(levelname)s: %(message)s',
+        level=getattr(logging, 'INFO'),
+        datefmt='%Y-%m-%d,%H:%M:%S'
+    )
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--save-baseline', action='store_true',
+                        help='store timings as the new baseline')
+    parser.add_argument('--micro-only', action='store_true',
+                        help='skip benchmarks that solve models')
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help='relative slowdown that is flagged')
+    args = parser.parse_args()
+    passing = run_benchmarks(save_baseline=args.save_baseline,
+                             micro_only=args.micro_only,
+                             threshold=args.threshold)
+    raise SystemExit(0 if passing else 1)
@@ -1,23 +1,388 @@
 """Code for the bootstrap uncertainty quantification (BUQ) algorithm."""
 
 
+import os
 import time
+import json
+import hashlib
+import shutil
 import logging
+import tempfile
+import functools
+import collections
+import itertools
+import concurrent.futures
 import numpy as np
 import pandas as pd
+import aggregation
 import buq
 import models
+import storage
 import tests
+import timing
 
 
-def import_time_series_data():
-    """Import time series data for model, without any time slicing."""
-    ts_data = pd.read_csv('data/demand_wind.csv', index_col=0)
+# Time series data used by all simulations, and the directory next to a
+# time series CSV in which a binary copy of it is kept for fast
+# (memory-mapped) loading
+TS_DATA_PATH = 'data/demand_wind.csv'
+TS_CACHE_DIR = '.cache'
+
+# Time series already loaded in this process, keyed by CSV path
+_TS_DATA_CACHE = {}
+
+
+def _hash_file(path):
+    """Calculate the sha256 hash of a file's contents."""
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(2**20), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def _build_time_series_cache(path, cache_dir, csv_hash):
+    """Parse the time series CSV and store a binary copy in cache_dir.
+
+    The copy is written to a temporary directory, which is then moved into
+    place as a version directory named by the CSV's hash and made current
+    by replacing the file 'current'. Processes reading the cache at the
+    same time therefore see either the old or the new copy, never a mix of
+    both. Returns the version directory.
+    """
+
+    ts_data = pd.read_csv(path, index_col=0)
     ts_data.index = pd.to_datetime(ts_data.index)
+    csv_stat = os.stat(path)
+
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp_dir = tempfile.mkdtemp(prefix='.tmp', dir=cache_dir)
+    np.save(os.path.join(tmp_dir, 'values.npy'),
+            ts_data.values.astype(np.float64))
+    np.save(os.path.join(tmp_dir, 'index.npy'),
+            ts_data.index.values.astype('datetime64[ns]').astype(np.int64))
+    meta = {'columns': list(ts_data.columns),
+            'csv_mtime_ns': csv_stat.st_mtime_ns,
+            'csv_size': csv_stat.st_size,
+            'csv_sha256': csv_hash}
+    with open(os.path.join(tmp_dir, 'meta.json'), 'w') as file:
+        json.dump(meta, file)
+    version = csv_hash[:16]
+    try:
+        os.rename(tmp_dir, os.path.join(cache_dir, version))
+    except OSError:    # Same copy made by another process meanwhile
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    storage._write_atomic(os.path.join(cache_dir, 'current'), version)
+
+    # Remove copies of earlier versions of the CSV, but not the files of
+    # other processes updating the cache ('current.tmp<pid>' and '.tmp*')
+    for name in os.listdir(cache_dir):
+        if (name == version or name.startswith('current')
+                or name.startswith('.')):
+            continue
+        old_path = os.path.join(cache_dir, name)
+        if os.path.isdir(old_path):
+            shutil.rmtree(old_path, ignore_errors=True)
+        else:    # Copy of the CSV from before version directories
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+    return os.path.join(cache_dir, version)
+
+
+def _get_current_time_series_cache(cache_dir):
+    """Version directory of the current binary copy in cache_dir, or None
+    if there is none."""
+    try:
+        with open(os.path.join(cache_dir, 'current')) as file:
+            return os.path.join(cache_dir, file.read())
+    except FileNotFoundError:
+        return None
+
+
+def _time_series_cache_is_valid(path, version_dir):
+    """Check if the binary copy in version_dir matches the CSV at path.
+
+    The CSV is only hashed if its modification time or size has changed
+    since the copy was made. If the contents are unchanged, the stored
+    modification time is updated and the copy is reused.
+    """
+
+    if version_dir is None:
+        return False
+    meta_path = os.path.join(version_dir, 'meta.json')
+    try:
+        with open(meta_path) as file:
+            meta = json.load(file)
+    except FileNotFoundError:    # Replaced by a newer copy meanwhile
+        return False
+    csv_stat = os.stat(path)
+    if (meta['csv_mtime_ns'] == csv_stat.st_mtime_ns
+            and meta['csv_size'] == csv_stat.st_size):
+        return True
+    if _hash_file(path) != meta['csv_sha256']:
+        return False
+    meta['csv_mtime_ns'] = csv_stat.st_mtime_ns
+    meta['csv_size'] = csv_stat.st_size
+    storage._write_atomic(meta_path, json.dumps(meta))
+    return True
+
+
+def _get_time_series_cache_dir(path):
+    """Directory of the binary copies of the time series CSV at path. It is
+    next to the CSV, so that CSVs with the same name in different
+    directories are kept apart."""
+    return os.path.join(os.path.dirname(path), TS_CACHE_DIR,
+                        os.path.splitext(os.path.basename(path))[0])
+
+
+def _get_time_series_hash(path):
+    """sha256 hash of the time series CSV at path, as stored with its
+    binary copy."""
+    import_time_series_data(path)    # Keeps the binary copy up to date
+    version_dir = _get_current_time_series_cache(
+        _get_time_series_cache_dir(path)
+    )
+    with open(os.path.join(version_dir, 'meta.json')) as file:
+        return json.load(file)['csv_sha256']
+
+
+def import_time_series_data(path=TS_DATA_PATH):
+    """Import time series data for model, without any time slicing.
+
+    The CSV is parsed only once: a binary copy is stored in TS_CACHE_DIR
+    next to it and rebuilt whenever the CSV changes. The values are
+    memory-mapped read-only, so that all processes share a single copy
+    through the page cache, and each process keeps the DataFrame after the
+    first call.
+
+    Parameters:
+    -----------
+    path (str) : path to CSV file with time series data
+
+    Returns:
+    --------
+    ts_data (pandas DataFrame) : time series data. Its values are
+        read-only: copy the DataFrame before changing them.
+    """
+
+    abs_path = os.path.abspath(path)
+    csv_mtime_ns = os.stat(path).st_mtime_ns
+    if (abs_path in _TS_DATA_CACHE
+            and _TS_DATA_CACHE[abs_path][0] == csv_mtime_ns):
+        return _TS_DATA_CACHE[abs_path][1]
+
+    cache_dir = _get_time_series_cache_dir(path)
+    while True:
+        version_dir = _get_current_time_series_cache(cache_dir)
+        if not _time_series_cache_is_valid(path, version_dir):
+            logging.info('Creating binary copy of time series data in %s',
+                         cache_dir)
+            version_dir = _build_time_series_cache(path, cache_dir,
+                                                   _hash_file(path))
+        try:
+            with open(os.path.join(version_dir, 'meta.json')) as file:
+                meta = json.load(file)
+            values = np.load(os.path.join(version_dir, 'values.npy'),
+                             mmap_mode='r')
+            index = pd.to_datetime(
+                np.load(os.path.join(version_dir, 'index.npy'))
+            )
+            break
+        except FileNotFoundError:
+            continue    # Replaced by a newer copy meanwhile
+    ts_data = pd.DataFrame(values, index=index, columns=meta['columns'],
+                           copy=False)
+    _TS_DATA_CACHE[abs_path] = (csv_mtime_ns, ts_data)
+
     return ts_data
 
 
-def bootstrap_sample_weeks(data, num_weeks_per_season):
+# Meteorological seasons used in the 'weeks' scheme, as calendar months
+SEASONS = [[12, 1, 2], [3, 4, 5], [6, 7, 8], [9, 10, 11]]
+
+# Number of hours in each month of a non-leap year, used in the 'months'
+# scheme
+MONTH_HOURS = 24 * np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+# Most recently created season block index, with the data it belongs to
+_SEASON_BLOCK_INDEX_CACHE = [None, None]
+
+
+def _sample_to_dataframe(sample_values):
+    """Change a bootstrap sample from numpy array to pandas DataFrame, with
+    a dummy datetime index starting in 2020.
+    """
+    if sample_values.shape[1] == 2:
+        output_columns = ['demand', 'wind']
+    if sample_values.shape[1] == 6:
+        output_columns = ['demand_region2', 'demand_region4',
+                          'demand_region5', 'wind_region2',
+                          'wind_region5', 'wind_region6']
+    index = _get_dummy_index(sample_values.shape[0])
+    output = pd.DataFrame(sample_values, index=index, columns=output_columns)
+
+    return output
+
+
+@functools.lru_cache(maxsize=4)
+def _get_dummy_index(num_timesteps):
+    """Dummy hourly datetime index starting in 2020. Indexes are immutable,
+    so all samples of the same length share one.
+    """
+    return pd.to_datetime(np.arange(num_timesteps), origin='2020', unit='h')
+
+
+def get_sample_rng(seed, sample_num):
+    """Create the random number generator of a single bootstrap sample.
+
+    The generator is the sample_num-th child of np.random.SeedSequence(seed)
+    (the same as SeedSequence(seed).spawn(K)[sample_num] for any K larger
+    than sample_num). Each sample can therefore be created on its own, and
+    is the same whichever process creates it and in whatever order.
+
+    Parameters:
+    -----------
+    seed (int) : master seed of all bootstrap samples
+    sample_num (int) : bootstrap sample number
+
+    Returns:
+    --------
+    rng (numpy Generator) : random number generator
+    """
+    return np.random.default_rng(
+        np.random.SeedSequence(seed, spawn_key=(int(sample_num),))
+    )
+
+
+def _draw_integers(rng, high, size=None):
+    """Draw integers in [0, high) from rng, or from the global random
+    state if rng is None.
+    """
+    if rng is None:
+        return np.random.randint(high, size=size)
+    return rng.integers(high, size=size)
+
+
+def _draw_uniform(rng, size):
+    """Draw floats in [0, 1) from rng, or from the global random state if
+    rng is None.
+    """
+    if rng is None:
+        return np.random.random_sample(size)
+    return rng.random(size)
+
+
+def get_season_block_index(data):
+    """Create an index of the rows in data belonging to each (year, season)
+    combination, used to create 'weeks' scheme bootstrap samples.
+
+    Parameters:
+    -----------
+    data (pandas DataFrame) : demand and wind data
+
+    Returns:
+    --------
+    block_index (dict) : with keys
+        'years' (array) : years in data, in order of appearance
+        'rows' (array) : row numbers of data, grouped by (year, season)
+            and in their original order within each group
+        'offsets' (array, shape (num_years, 4)) : position in 'rows' where
+            each (year, season) group starts
+        'num_startdays' (array, shape (num_years, 4)) : number of possible
+            start days of a week in each (year, season) group
+    """
+
+    if _SEASON_BLOCK_INDEX_CACHE[0] is data:
+        return _SEASON_BLOCK_INDEX_CACHE[1]
+
+    season_of_month = np.zeros(13, dtype=int)
+    for season_num, months in enumerate(SEASONS):
+        season_of_month[months] = season_num
+
+    year_nums, years = pd.factorize(data.index.year)
+
+    group = 4*year_nums + season_of_month[data.index.month]
+    rows = np.argsort(group, kind='stable')
+    group_sizes = np.bincount(group, minlength=4*len(years))
+    offsets = np.concatenate(([0], np.cumsum(group_sizes)[:-1]))
+    num_startdays = np.ceil(group_sizes/24 - 7 + 1).astype(int)
+
+    block_index = {'years': np.asarray(years),
+                   'rows': rows,
+                   'offsets': offsets.reshape(len(years), 4),
+                   'num_startdays': num_startdays.reshape(len(years), 4)}
+    _SEASON_BLOCK_INDEX_CACHE[:] = [data, block_index]
+
+    return block_index
+
+
+def _weeks_sample_rows(block_index, year_nums, startdays):
+    """Get the data row numbers of weeks starting at certain days.
+
+    Parameters:
+    -----------
+    block_index (dict) : created by get_season_block_index
+    year_nums (array, shape (..., num_weeks_per_season, 4)) : which year
+        (position in block_index['years']) each week is taken from
+    startdays (array, same shape as year_nums) : start day of each week
+        within its (year, season) group
+
+    Returns:
+    --------
+    rows (array, shape (..., 4*num_weeks_per_season*7*24)) : row numbers
+    """
+    seasons = np.arange(4)
+    block_starts = (block_index['offsets'][year_nums, seasons]
+                    + 24*startdays)
+    positions = block_starts[..., np.newaxis] + np.arange(7*24)
+    rows = block_index['rows'][positions]
+    return rows.reshape(rows.shape[:-3] + (-1,))
+
+
+def get_weeks_sample_rows(data, num_weeks_per_season, rng=None):
+    """Get the data row numbers of a 'weeks' scheme bootstrap sample,
+    without creating the sample.
+
+    Parameters:
+    -----------
+    data (pandas DataFrame) : demand and wind data
+    num_weeks_per_season (int) : number of weeks sampled from each season
+    rng (numpy Generator) : random number generator. If None, the global
+        random state is used, drawing random numbers one week at a time
+
+    Returns:
+    --------
+    rows (array, shape (4*num_weeks_per_season*7*24,)) : row numbers
+    """
+
+    block_index = get_season_block_index(data)
+    if rng is not None:
+        year_nums, startdays = draw_weeks(data, num_weeks_per_season,
+                                          num_samples=1, rng=rng)
+        return _weeks_sample_rows(block_index, year_nums, startdays)[0]
+
+    num_years = len(block_index['years'])
+
+    # Sample weeks from the meteorological seasons. Random numbers are drawn
+    # in the same order as sampling the weeks one by one, so that seeded
+    # results do not change
+    year_nums = np.zeros(shape=(num_weeks_per_season, 4), dtype=int)
+    startdays = np.zeros(shape=(num_weeks_per_season, 4), dtype=int)
+    for block in range(num_weeks_per_season):
+        for bin_num in range(4):
+            year_nums[block, bin_num] = np.random.choice(num_years)
+            startdays[block, bin_num] = np.random.choice(
+                block_index['num_startdays'][year_nums[block, bin_num],
+                                             bin_num]
+            )
+
+    return _weeks_sample_rows(block_index, year_nums, startdays)
+
+
+def bootstrap_sample_weeks(data, num_weeks_per_season, rng=None):
     """Create bootstrap sample by sampling weeks from different
     meteorological seasons.
 
@@ -25,194 +390,1180 @@ def bootstrap_sample_weeks(data, num_weeks_per_season):
     -----------
     data (pandas DataFrame) : demand and wind data
     num_weeks_per_season (int) : number of weeks sampled from each season
+    rng (numpy Generator) : random number generator. If None, the global
+        random state is used, drawing random numbers one week at a time
 
     Returns:
     --------
     output (pandas DataFrame) : the bootstrap sample
     """
 
-    # Sample weeks from the meteorological seasons
-    bins = [[12, 1, 2], [3, 4, 5], [6, 7, 8], [9, 10, 11]]
-    sample_length = 4*num_weeks_per_season*7*24
-    output = np.zeros(shape=(sample_length, data.shape[1]))
-    k = 0
-    for block in range(num_weeks_per_season):
-        for bin_num in range(4):
-            year = np.random.choice(list(data.index.year.unique()))
-            data_sel = data[(data.index.year == year)&
-                            (data.index.month.isin(bins[bin_num]))]
-            num_days = data_sel.shape[0]/24
-            possible_startdays = np.arange(num_days - 7 + 1)
-            sample_index = (24*np.random.choice(possible_startdays)
-                            + np.arange(7*24))
-            sample = data_sel.iloc[sample_index]
-            output[k:k+sample.shape[0]] = sample.values
-            k = k + sample.shape[0]
-
-    # Change output from numpy array to pandas DataFrame
-    if data.shape[1] == 2:
-        output_columns = ['demand', 'wind']
-    if data.shape[1] == 6:
-        output_columns = ['demand_region2', 'demand_region4',
-                          'demand_region5', 'wind_region2',
-                          'wind_region5', 'wind_region6']
-    index = pd.to_datetime(np.arange(sample_length),
-                           origin='2020', unit='h')  # Dummy datetime index
-    output = pd.DataFrame(output, index=index, columns=output_columns)
+    rows = get_weeks_sample_rows(data, num_weeks_per_season, rng=rng)
+    output = _sample_to_dataframe(np.asarray(data.values)[rows])
 
     return output
 
 
-def bootstrap_sample_months(data, num_years):
+def bootstrap_sample_weeks_batch(data, num_weeks_per_season, num_samples,
+                                 rng=None):
+    """Create multiple 'weeks' scheme bootstrap samples at once.
+
+    All years are drawn before any start days, so that the samples differ
+    from those of repeated calls of bootstrap_sample_weeks with the same
+    random state, whether it is the global random state or a Generator.
+    Only with num_samples=1 and a Generator is the sample the same as that
+    of bootstrap_sample_weeks.
+
+    Parameters:
+    -----------
+    data (pandas DataFrame) : demand and wind data
+    num_weeks_per_season (int) : number of weeks sampled from each season
+    num_samples (int) : number of bootstrap samples
+    rng (numpy Generator) : random number generator. If None, the global
+        random state is used
+
+    Returns:
+    --------
+    output (numpy array) : the bootstrap samples, with shape
+        (num_samples, 4*num_weeks_per_season*7*24, number of columns of
+        data). The columns are in the same order as in data.
+    """
+
+    block_index = get_season_block_index(data)
+    year_nums, startdays = draw_weeks(data, num_weeks_per_season,
+                                      num_samples, rng=rng)
+    rows = _weeks_sample_rows(block_index, year_nums, startdays)
+    output = np.asarray(data.values)[rows]
+
+    return output
+
+
+def draw_weeks(data, num_weeks_per_season, num_samples, rng=None):
+    """Draw the weeks of 'weeks' scheme bootstrap samples, without creating
+    the samples. Gives the weeks of bootstrap_sample_weeks_batch with the
+    same random state.
+
+    Parameters:
+    -----------
+    data (pandas DataFrame) : demand and wind data
+    num_weeks_per_season (int) : number of weeks sampled from each season
+    num_samples (int) : number of bootstrap samples
+    rng (numpy Generator) : random number generator. If None, the global
+        random state is used
+
+    Returns:
+    --------
+    year_nums (array, shape (num_samples, num_weeks_per_season, 4)) : which
+        year (position in get_season_block_index(data)['years']) each week
+        is taken from, for each season
+    startdays (array, same shape as year_nums) : start day of each week
+        within its (year, season) group
+    """
+
+    block_index = get_season_block_index(data)
+    num_years = len(block_index['years'])
+
+    shape = (num_samples, num_weeks_per_season, 4)
+    year_nums = _draw_integers(rng, num_years, size=shape)
+    startdays = _draw_integers(
+        rng, block_index['num_startdays'][year_nums, np.arange(4)]
+    )
+
+    return year_nums, startdays
+
+
+def get_month_block_index(data):
+    """Create a table of the rows in data at which each calendar month
+    starts, used to create 'months' scheme bootstrap samples.
+
+    Months are only used if they are complete. In leap years, February is
+    complete once it contains 28 days, and its leap day is never sampled.
+    This means leap years and partial years in the data are handled
+    correctly, as long as the data is in chronological order.
+
+    Parameters:
+    -----------
+    data (pandas DataFrame) : demand and wind data
+
+    Returns:
+    --------
+    block_index (dict) : with keys
+        'years' (array) : years in data, in order of appearance
+        'month_starts' (array, shape (num_years, 12)) : row at which
+            each month starts
+        'candidates' (array, shape (12, num_years)) : for each calendar
+            month, the years (as positions in 'years') in which that month
+            is complete, followed by padding
+        'num_candidates' (array, shape (12,)) : the number of years in
+            which each calendar month is complete
+    """
+
+    year_nums, years = pd.factorize(data.index.year)
+    group = 12*year_nums + data.index.month - 1
+    month_starts = np.zeros(12*len(years), dtype=int)
+    group_sizes = np.zeros(12*len(years), dtype=int)
+    groups, group_starts, group_counts = np.unique(
+        group, return_index=True, return_counts=True
+    )
+    month_starts[groups], group_sizes[groups] = group_starts, group_counts
+    month_starts = month_starts.reshape(len(years), 12)
+    complete = group_sizes.reshape(len(years), 12) >= MONTH_HOURS
+
+    if not complete.any(axis=0).all():
+        raise ValueError('Time series must contain at least one complete '
+                         'instance of each calendar month.')
+
+    block_index = {'years': np.asarray(years),
+                   'month_starts': month_starts,
+                   'candidates': np.argsort(~complete.T, axis=1,
+                                            kind='stable'),
+                   'num_candidates': complete.sum(axis=0)}
+
+    return block_index
+
+
+def _months_sample_rows(block_index, month_draws):
+    """Get the data row numbers of hypothetical years made up of months.
+
+    Parameters:
+    -----------
+    block_index (dict) : created by get_month_block_index
+    month_draws (array, shape (..., num_years, 12)) : uniform random numbers
+        in [0, 1) that determine which year each month is taken from
+
+    Returns:
+    --------
+    rows (array, shape (..., 8760*num_years)) : row numbers
+    """
+    months = np.arange(12)
+    candidate_nums = (block_index['num_candidates']
+                      * month_draws).astype(int)
+    year_nums = block_index['candidates'][months, candidate_nums]
+    month_starts = block_index['month_starts'][year_nums, months]
+    month_of_hour = np.repeat(months, MONTH_HOURS)
+    hour_in_month = np.arange(8760) - np.repeat(
+        np.cumsum(MONTH_HOURS) - MONTH_HOURS, MONTH_HOURS
+    )
+    rows = month_starts[..., month_of_hour] + hour_in_month
+    return rows.reshape(rows.shape[:-2] + (-1,))
+
+
+def get_months_sample_rows(data, num_years, rng=None):
+    """Get the data row numbers of a 'months' scheme bootstrap sample,
+    without creating the sample.
+
+    Parameters:
+    -----------
+    data (pandas DataFrame) : demand and wind data
+    num_years (int) : number of years of the sample
+    rng (numpy Generator) : random number generator. If None, the global
+        random state is used
+
+    Returns:
+    --------
+    rows (array, shape (8760*num_years,)) : row numbers
+    """
+    month_draws = _draw_uniform(rng, (num_years, 12))
+    return _months_sample_rows(get_month_block_index(data), month_draws)
+
+
+def bootstrap_sample_months(data, num_years, rng=None):
     """"Create hypothetical years by block bootstrapping months.
 
     Parameters:
     -----------
     data (pandas DataFrame) : demand and wind data
     num_years (int) : number of years of the output sample
+    rng (numpy Generator) : random number generator. If None, the global
+        random state is used
 
     Returns:
     --------
     output (pandas DataFrame) : the bootstrap sample
     """
 
-    years_np = np.zeros(shape=(8760*num_years, data.shape[1]))
-    num_years_inp = data.values.shape[0]/8760
-
-    # Create each year individually and input them
-    for year_num in range(num_years):
-        year_np = np.zeros(shape=(8760, data.shape[1]))
-        lims = [0, 744, 1416, 2160, 2880, 3624, 4344, 5088, 5832,
-                6552, 7296, 8016, 8760]
-        # List of years from which months are taken
-        month_years = np.array([int(num_years_inp*np.random.rand(1))
-                                for month in range(12)])
-        # Input the sampled months
-        for month in range(12):
-            llim, rlim = lims[month], lims[month+1]
-            yrstart = 8760 * month_years[month]
-            year_np[llim:rlim] = data.values[yrstart+llim:yrstart+rlim]
-
-        # Input the year into the years array
-        years_np[8760*year_num:8760*(year_num+1)] = year_np
-
-    # Change output from numpy array to pandas DataFrame
-    output_columns = ['demand_region2', 'demand_region4', 'demand_region5',
-                      'wind_region2', 'wind_region5', 'wind_region6']
-    index = pd.to_datetime(np.arange(years_np.shape[0]),
-                           origin='2020', unit='h')  # Dummy datetime index
-    output = pd.DataFrame(years_np, index=index, columns=output_columns)
+    rows = get_months_sample_rows(data, num_years, rng=rng)
+    output = _sample_to_dataframe(np.asarray(data.values)[rows])
+
+    return output
+
+
+def bootstrap_sample_months_batch(data, num_years, num_samples, rng=None):
+    """Create multiple 'months' scheme bootstrap samples at once.
+
+    Random numbers are drawn in the same order as creating the samples
+    one by one with bootstrap_sample_months.
+
+    Parameters:
+    -----------
+    data (pandas DataFrame) : demand and wind data
+    num_years (int) : number of years of each output sample
+    num_samples (int) : number of bootstrap samples
+    rng (numpy Generator) : random number generator. If None, the global
+        random state is used
+
+    Returns:
+    --------
+    output (numpy array) : the bootstrap samples, with shape
+        (num_samples, 8760*num_years, number of columns of data). The
+        columns are in the same order as in data.
+    """
+
+    block_index = get_month_block_index(data)
+    month_draws = _draw_uniform(rng, (num_samples, num_years, 12))
+    rows = _months_sample_rows(block_index, month_draws)
+    output = np.asarray(data.values)[rows]
 
     return output
 
 
-def run_simulation(model_name_in_paper, ts_data, run_id=0):
+# Settings of the models used in the paper, passed to models.SixRegionModel
+MODELS_IN_PAPER = {
+    'LP_planning': {'run_mode': 'plan',
+                    'baseload_integer': False,
+                    'baseload_ramping': False,
+                    'allow_unmet': True},
+    'MILP_planning': {'run_mode': 'plan',
+                      'baseload_integer': True,
+                      'baseload_ramping': False,
+                      'allow_unmet': True},
+    'operation': {'run_mode': 'operate',
+                  'baseload_integer': False,
+                  'baseload_ramping': True,
+                  'allow_unmet': True}
+}
+
+# Rows of run_simulation outputs that describe the run itself, as opposed
+# to the model outputs
+RUN_INFO_OUTPUTS = ['time', 'consistency_check', 'status']
+
+# Status of a run, stored in the 'status' row of its outputs as the position
+# in this list: solved to optimality, or failed without a solution. Runs
+# stopped by a time limit fail, since Calliope does not load non-optimal
+# solutions
+RUN_STATUSES = ['optimal', 'failed']
+
+# What to do with bootstrap runs that are not solved to optimality: run a
+# new sample instead, or leave them out
+STRAGGLER_POLICIES = ['resubmit', 'drop']
+
+# Solvers, and the override in model.yaml that selects each of them (CBC
+# is the default in model.yaml)
+SOLVER_OVERRIDES = {'cbc': None, 'gurobi': 'gurobi'}
+
+# Policies for checking the consistency of model outputs after each run:
+# check every run, every Nth run, only the first run, or never
+CONSISTENCY_CHECK_POLICIES = ['full', 'every_n', 'first', 'off']
+
+# Solved models whose optimisation problem is reused in this process, keyed
+# by all inputs of the simulation apart from the time series values (see
+# _get_backend_key)
+_BACKEND_MODELS = {}
+
+
+def get_simulation_key(model_name_in_paper, ts_data, fixed_caps=None,
+                       mip_gap=None):
+    """Create a key that identifies the inputs of a simulation, used to
+    look up its outputs in a storage.ResultCache.
+
+    The key is a hash of the time series values and index, the Calliope
+    scenario, the fixed capacities override dict, the MIP gap (if any) and
+    the contents of the model definition files, so that changing any of
+    them gives a new key.
+
+    Returns:
+    --------
+    key (str) : sha256 hash
+    """
+
+    model_settings = MODELS_IN_PAPER[model_name_in_paper]
+    scenario = models.get_scenario(**model_settings)
+    override_dict = (models.get_cap_override_dict('6_region', fixed_caps)
+                     if fixed_caps is not None else {})
+
+    sha256 = hashlib.sha256()
+    sha256.update(json.dumps([scenario, override_dict, list(ts_data.columns)],
+                             sort_keys=True).encode())
+    if mip_gap is not None:    # Keys without a MIP gap are unchanged
+        sha256.update('mip_gap={!r}'.format(float(mip_gap)).encode())
+    sha256.update(np.ascontiguousarray(ts_data.values,
+                                       dtype=np.float64).tobytes())
+    sha256.update(np.ascontiguousarray(
+        ts_data.index.values.astype('datetime64[ns]').astype(np.int64)
+    ).tobytes())
+    model_dir = os.path.join('models', '6_region')
+    for filename in sorted(os.listdir(model_dir)):
+        if filename.endswith('.yaml'):
+            sha256.update(filename.encode())
+            with open(os.path.join(model_dir, filename), 'rb') as file:
+                sha256.update(file.read())
+
+    return sha256.hexdigest()
+
+
+def _get_run_status(model):
+    """Status of a solved model (see RUN_STATUSES), from the termination
+    condition reported by the solver."""
+    termination = model.results.attrs.get('termination_condition')
+    if termination is None:
+        logging.warning('Solver did not report a termination condition.')
+        return 'failed'
+    if str(termination) == 'optimal':
+        return 'optimal'
+    return 'failed'
+
+
+def _get_backend_key(model_name_in_paper, ts_data, fixed_caps, solver,
+                     solver_threads, time_limit, mip_gap):
+    """Key of a model in _BACKEND_MODELS. Only the time series values can
+    change when the optimisation problem is re-solved, so all other inputs
+    of the simulation are part of the key."""
+    fixed_caps_json = None
+    if fixed_caps is not None:
+        fixed_caps_json = json.dumps(
+            models.get_cap_override_dict('6_region', fixed_caps),
+            sort_keys=True
+        )
+    return (model_name_in_paper, ts_data.shape[0], fixed_caps_json,
+            solver or 'cbc', solver_threads, time_limit, mip_gap)
+
+
+def _solve_simulation(model_name_in_paper, ts_data, run_id, reuse_backend,
+                      check_consistency, timer, fixed_caps, solver=None,
+                      solver_threads=None, time_limit=None, mip_gap=None):
+    """Build and solve the model for run_simulation.
+
+    Errors of the solver or the Calliope backend (models.SOLVER_ERRORS)
+    are logged, and give a run with status 'failed' whose model outputs
+    are NaN. Other errors are raised.
+
+    Returns:
+    --------
+    results (pandas DataFrame) : model outputs
+    model (models.SixRegionModel) : the solved model, or None if it failed
+    """
+
+    model_settings = MODELS_IN_PAPER[model_name_in_paper]
+    start = time.time()
+    backend_key = _get_backend_key(model_name_in_paper, ts_data,
+                                   fixed_caps, solver, solver_threads,
+                                   time_limit, mip_gap)
+    try:
+        if reuse_backend and backend_key in _BACKEND_MODELS:
+            model = _BACKEND_MODELS[backend_key]
+            model.timer = timer
+            model.rerun_with_time_series(ts_data)
+        else:
+            model = models.SixRegionModel(
+                ts_data=ts_data,
+                run_id=run_id,
+                fixed_caps=fixed_caps,
+                timer=timer,
+                extra_override=SOLVER_OVERRIDES.get(solver),
+                solver_options=models.get_solver_options(
+                    solver or 'cbc', threads=solver_threads,
+                    time_limit=time_limit, mip_gap=mip_gap
+                ),
+                operation_window=(
+                    models.get_operation_window(ts_data.shape[0])
+                    if model_settings['run_mode'] == 'operate' else None
+                ),
+                **model_settings
+            )
+            model.run()
+        status = _get_run_status(model)
+        # Only a model solved to optimality is a sound starting point for
+        # re-solving with other time series
+        if (reuse_backend and status == 'optimal'
+                and backend_key not in _BACKEND_MODELS):
+            _BACKEND_MODELS[backend_key] = model
+        if status == 'optimal':
+            results = model.get_summary_outputs()
+        else:
+            results = pd.DataFrame(columns=['output'], dtype=float)
+    except models.SOLVER_ERRORS:
+        logging.exception('Simulation %s failed.', run_id)
+        status, model = 'failed', None
+        results = pd.DataFrame(columns=['output'], dtype=float)
+    if status != 'optimal':
+        logging.warning('Simulation %s was not solved to optimality: %s.',
+                        run_id, status)
+
+    # Save results
+    finish = time.time()
+    results.loc['time'] = finish - start
+    results.loc['consistency_check'] = np.nan
+    results.loc['status'] = RUN_STATUSES.index(status)
+    if check_consistency and status == 'optimal':
+        with timer.phase('consistency_check'):
+            results.loc['consistency_check'] = float(
+                tests.test_output_consistency_6_region(
+                    model, run_mode=model_settings['run_mode']
+                )
+            )
+
+    return results, model
+
+
+def run_simulation(model_name_in_paper, ts_data, run_id=0,
+                   reuse_backend=False, check_consistency=True,
+                   timer=None, timings_path=None, fixed_caps=None,
+                   result_store=None, run_info=None,
+                   result_cache=None, aggregation_settings=None,
+                   solver=None, solver_threads=None, time_limit=None,
+                   mip_gap=None):
     """Run Calliope model with demand & wind data.
 
     Parameters:
     -----------
     model_name_in_paper (str) : 'LP_planning', 'MILP_planning' or
         'operation'
-    ts_data (pandas DataFrame) : demand & wind time series data
+    ts_data (pandas DataFrame) : demand & wind time series data. The
+        'operation' model is solved in a single window on time series
+        shorter than its horizon, e.g. 'weeks' scheme bootstrap samples of
+        one week per season, see models.get_operation_window
     run_id (int or str) : unique id, useful if running in parallel
+    reuse_backend (bool) : build the optimisation problem only once per
+        process and model, and re-solve it with updated demand and wind
+        values for later time series of the same length. Not possible for
+        the 'operation' model, which is always built from scratch
+    check_consistency (bool) : check if the model outputs are internally
+        consistent after solving. The result is stored in the
+        'consistency_check' row of the outputs: 1 if passed, 0 if failed
+        and NaN if not checked
+    timer (timing.PhaseTimer) : timer in which to record the time and peak
+        memory of each phase of the simulation. May already contain
+        earlier phases, such as sample generation
+    timings_path (str) : if given, a JSON lines file to which a record of
+        the phase timings of this simulation is appended
+    fixed_caps (pandas DataFrame or Series) : capacities for the
+        'operation' model, e.g. the outputs of a planning run. If None, the
+        capacities in the operate override in model.yaml are used
+    result_store (storage.ResultStore) : if given, the outputs, phase
+        timings and (optionally) hourly dispatch of this simulation are
+        added to it as a new row
+    run_info (dict) : information about how the time series was created,
+        stored with the outputs in result_store: 'scheme', 'sample_num'
+        and 'seed'
+    result_cache (storage.ResultCache) : if given, the outputs are loaded
+        from this cache if the same simulation (see get_simulation_key) has
+        been run before, and added to it otherwise
+    aggregation_settings (dict) : if given, the time series is reduced to
+        representative periods before solving, using
+        aggregation.aggregate_time_series with these keyword arguments
+        (e.g. {'num_periods': 20}). Fewer periods give a smaller problem
+        but less accurate outputs, see
+        aggregation.compare_with_full_resolution
+    solver (str) : 'cbc' or 'gurobi'. If None, the solver in model.yaml
+        (CBC) is used
+    solver_threads (int) : number of threads the solver may use. If None,
+        the solver's default is used
+    time_limit (float) : wall time limit of the solve, in seconds. A run
+        that reaches it gets status 'failed', since Calliope does not load
+        the best solution found so far
+    mip_gap (float) : relative optimality gap at which a MILP solve stops,
+        e.g. 0.01 for 1%
 
     Returns:
     --------
-    results (pandas DataFrame) : model outputs
+    results (pandas DataFrame) : model outputs. The 'status' row contains
+        the status of the run, as its position in RUN_STATUSES
     """
 
-    start = time.time()
-    if model_name_in_paper == 'LP_planning':
-        model = models.SixRegionModel(ts_data=ts_data,
-                                      run_mode='plan',
-                                      baseload_integer=False,
-                                      baseload_ramping=False,
-                                      allow_unmet=True,
-                                      run_id=run_id)
-    elif model_name_in_paper == 'MILP_planning':
-        model = models.SixRegionModel(ts_data=ts_data,
-                                      run_mode='plan',
-                                      baseload_integer=True,
-                                      baseload_ramping=False,
-                                      allow_unmet=True,
-                                      run_id=run_id)
-    elif model_name_in_paper == 'operation':
-        model = models.SixRegionModel(ts_data=ts_data,
-                                      run_mode='operate',
-                                      baseload_integer=False,
-                                      baseload_ramping=True,
-                                      allow_unmet=True,
-                                      run_id=run_id)
-    else:
+    if model_name_in_paper not in MODELS_IN_PAPER:
         raise ValueError('Invalid model name.')
+    model_settings = MODELS_IN_PAPER[model_name_in_paper]
+    if solver is not None and solver not in SOLVER_OVERRIDES:
+        raise ValueError('Solver must be one of {}.'.format(
+            list(SOLVER_OVERRIDES)
+        ))
+    if fixed_caps is not None and model_settings['run_mode'] != 'operate':
+        raise ValueError('Fixed capacities can only be used in operate '
+                         'mode.')
+    if reuse_backend and model_settings['run_mode'] == 'operate':
+        logging.warning('Cannot reuse optimisation problem in operate '
+                        'mode. Building model from scratch.')
+        reuse_backend = False
+    if reuse_backend and aggregation_settings is not None:
+        logging.warning('Cannot reuse optimisation problem with aggregated '
+                        'time series, whose weights differ between runs. '
+                        'Building model from scratch.')
+        reuse_backend = False
 
-    # Run model and save results
-    model.run()
-    finish = time.time()
-    tests.test_output_consistency_6_region(model, run_mode=(
-        'operate' if model_name_in_paper == 'operation' else 'plan'
-    ))
-    results = model.get_summary_outputs()
-    results.loc['time'] = finish - start
+    if timer is None:
+        timer = timing.PhaseTimer()
+    if aggregation_settings is not None:
+        with timer.phase('aggregation'):
+            ts_data = aggregation.aggregate_time_series(
+                ts_data, **aggregation_settings
+            )
+    start = time.time()
+    results, model = None, None
+    if result_cache is not None:
+        with timer.phase('cache_lookup'):
+            cache_key = get_simulation_key(model_name_in_paper, ts_data,
+                                           fixed_caps=fixed_caps,
+                                           mip_gap=mip_gap)
+            results = result_cache.get(cache_key)
+        if results is not None and check_consistency and np.isnan(
+                results.loc['consistency_check', 'output']):
+            results = None    # Consistency was not checked when stored
+        if results is not None:
+            logging.info('Loaded model outputs from result cache.')
+            results.loc['time'] = time.time() - start
+            status = 'optimal'
+            results.loc['status'] = RUN_STATUSES.index(status)
+    if results is None:
+        results, model = _solve_simulation(
+            model_name_in_paper, ts_data, run_id=run_id,
+            reuse_backend=reuse_backend,
+            check_consistency=check_consistency, timer=timer,
+            fixed_caps=fixed_caps, solver=solver,
+            solver_threads=solver_threads, time_limit=time_limit,
+            mip_gap=mip_gap
+        )
+        status = RUN_STATUSES[int(results.loc['status', 'output'])]
+        if result_cache is not None and status == 'optimal':
+            result_cache.put(cache_key, results)
+
+    if timings_path is not None:
+        timing.write_record(timings_path, timer.get_record(
+            model_name_in_paper=model_name_in_paper,
+            run_id=run_id,
+            num_timesteps=ts_data.shape[0],
+            status=status
+        ))
+    if result_store is not None:
+        info = {'model': model_name_in_paper,
+                'scheme': '',
+                'sample_num': -1,
+                'seed': -1,
+                'run_id': str(run_id),
+                'num_timesteps': ts_data.shape[0],
+                'aggregation': (
+                    json.dumps(aggregation_settings, sort_keys=True)
+                    if aggregation_settings is not None else ''
+                )}
+        info.update(run_info or {})
+        result_store.append(results.loc[:, 'output'], info, timer=timer,
+                            model=model)
 
     return results
 
 
-def run_years_simulation(model_name_in_paper, startyear, endyear, run_id=0):
+def _check_point_estimate_status(results, model_name_in_paper):
+    """Raise an error if a point estimate simulation was not solved to
+    optimality, since it cannot be replaced like a bootstrap simulation.
+    Results of several models have a column for each, and fail if any of
+    them failed.
+    """
+    status = RUN_STATUSES[int(results.loc['status'].dropna().max())]
+    if status != 'optimal':
+        if not isinstance(model_name_in_paper, str):
+            model_name_in_paper = ', '.join(model_name_in_paper)
+        raise RuntimeError('The {} point estimate simulation was not solved '
+                           'to optimality: {}.'.format(model_name_in_paper,
+                                                       status))
+
+
+def _get_sample_status(outputs):
+    """Status of a bootstrap simulation from its outputs (pandas Series),
+    indexed by output or by (model, output): the worst status of its
+    model runs."""
+    if isinstance(outputs.index, pd.MultiIndex):
+        statuses = outputs.xs('status', level=-1).dropna()
+    else:
+        statuses = [outputs.get('status', 0)]
+    return RUN_STATUSES[int(max(statuses))]
+
+
+def _check_consistency_of_run(policy, sample_num, check_every):
+    """Decide whether to check the consistency of a bootstrap run.
+
+    Parameters:
+    -----------
+    policy (str) : one of CONSISTENCY_CHECK_POLICIES
+    sample_num (int) : bootstrap sample number, starting at 0
+    check_every (int) : check every this many runs, if policy is 'every_n'
+
+    Returns:
+    --------
+    check (bool) : whether to check the run
+    """
+    if policy not in CONSISTENCY_CHECK_POLICIES:
+        raise ValueError('Consistency check policy must be one of {}.'.
+                         format(CONSISTENCY_CHECK_POLICIES))
+    if policy == 'full':
+        return True
+    if policy == 'every_n':
+        return sample_num % check_every == 0
+    if policy == 'first':
+        return sample_num == 0
+    return False
+
+
+def run_years_simulation(model_name_in_paper, startyear, endyear, run_id=0,
+                         check_consistency=True, timings_path=None,
+                         ts_data_path=TS_DATA_PATH, fixed_caps=None,
+                         result_store=None,
+                         result_cache=None, aggregation_settings=None,
+                         solver=None, solver_threads=None,
+                         mip_gap=None):
     """Run model with certain years of data."""
-    ts_data = import_time_series_data()
-    ts_data = ts_data.loc[str(startyear):str(endyear)]
+    timer = timing.PhaseTimer()
+    with timer.phase('sample_generation'):
+        ts_data = import_time_series_data(ts_data_path)
+        ts_data = ts_data.loc[str(startyear):str(endyear)]
     results = run_simulation(model_name_in_paper, ts_data=ts_data,
-                             run_id=run_id)
+                             run_id=run_id,
+                             check_consistency=check_consistency,
+                             timer=timer, timings_path=timings_path,
+                             fixed_caps=fixed_caps,
+                             result_store=result_store,
+                             result_cache=result_cache,
+                             run_info={'scheme': 'years'},
+                             aggregation_settings=aggregation_settings,
+                             solver=solver, solver_threads=solver_threads,
+                             mip_gap=mip_gap)
     return results
 
 
-def run_bootstrap_simulation(model_name_in_paper, scheme,
-                             num_blocks_per_bin, run_id=0):
-    """Run model with bootstrap sampled data
+def create_bootstrap_sample(scheme, num_blocks_per_bin, rng=None,
+                            ts_data_path=TS_DATA_PATH):
+    """Create a bootstrap sample of the time series data.
 
     Parameters:
     -----------
-    model_name_in_paper (str) : 'LP_planning', 'MILP_planning' or
-        'operation'
     scheme: either 'months' or 'weeks' -- scheme used to create bootstrap
         samples
     num_blocks_per_bin: either the number of months sampled from each
         calendar month, or the number of weeks sampled from each season
+    rng (numpy Generator) : random number generator used to create the
+        bootstrap sample. If None, the global random state is used
+    ts_data_path (str) : CSV file with the time series data from which
+        the bootstrap sample is created
 
     Returns:
     --------
-    results (pandas DataFrame) : model outputs
+    sample (pandas DataFrame) : bootstrap sample
     """
 
-    ts_data = import_time_series_data()
+    ts_data = import_time_series_data(ts_data_path)
+    if scheme == 'months':
+        sample = buq.bootstrap_sample_months(ts_data, num_blocks_per_bin,
+                                             rng=rng)
+    elif scheme == 'weeks':
+        sample = buq.bootstrap_sample_weeks(ts_data, num_blocks_per_bin,
+                                            rng=rng)
+    else:
+        raise ValueError('Must be either months or weeks scheme')
 
-    # Create bootstrap sample and run model
+    return sample
+
+
+def get_bootstrap_sample_rows(scheme, num_blocks_per_bin, rng=None,
+                              ts_data_path=TS_DATA_PATH):
+    """Get the row numbers in the time series data of a bootstrap sample,
+    without creating the sample. Gives the rows of the sample that
+    create_bootstrap_sample creates with the same random state.
+
+    Parameters and returns as for create_bootstrap_sample, except:
+    rows (numpy array) : row numbers of the bootstrap sample
+    """
+
+    ts_data = import_time_series_data(ts_data_path)
     if scheme == 'months':
-        sample = buq.bootstrap_sample_months(ts_data,
-                                             num_blocks_per_bin)
+        rows = get_months_sample_rows(ts_data, num_blocks_per_bin, rng=rng)
     elif scheme == 'weeks':
-        sample = buq.bootstrap_sample_weeks(ts_data,
-                                            num_blocks_per_bin)
+        rows = get_weeks_sample_rows(ts_data, num_blocks_per_bin, rng=rng)
     else:
         raise ValueError('Must be either months or weeks scheme')
+
+    return rows
+
+
+def write_sample_index(sample_index_dir, scheme, num_blocks_per_bin, seed,
+                       sample_nums, ts_data_path=TS_DATA_PATH):
+    """Store the row numbers of bootstrap samples in a sample index, so
+    that simulations can create their sample from the time series data
+    just before solving it (see run_bootstrap_simulation). Sample i is
+    drawn with get_sample_rng(seed, sample_num), and samples that are
+    already in the index are kept.
+
+    Parameters:
+    -----------
+    sample_index_dir (str) : directory of the storage.SampleIndexStore
+    scheme (str) : 'months' or 'weeks'
+    num_blocks_per_bin (int) : see create_bootstrap_sample
+    seed (int) : master seed of the bootstrap samples
+    sample_nums (iterable) : bootstrap sample numbers
+    ts_data_path (str) : CSV file with the time series data
+
+    Returns:
+    --------
+    sample_index (storage.SampleIndexStore) : the sample index
+    """
+
+    sample_index = storage.SampleIndexStore(sample_index_dir, config={
+        'scheme': scheme,
+        'num_blocks_per_bin': num_blocks_per_bin,
+        'seed': seed,
+        'ts_data_path': ts_data_path,
+        'ts_data_sha256': _get_time_series_hash(ts_data_path)
+    })
+    for sample_num in sample_nums:
+        if not sample_index.has_sample(sample_num):
+            sample_index.save_rows(sample_num, get_bootstrap_sample_rows(
+                scheme, num_blocks_per_bin,
+                rng=get_sample_rng(seed, sample_num),
+                ts_data_path=ts_data_path
+            ))
+
+    return sample_index
+
+
+def run_bootstrap_simulation(model_name_in_paper, scheme,
+                             num_blocks_per_bin, run_id=0,
+                             reuse_backend=False, check_consistency=True,
+                             rng=None, timings_path=None,
+                             ts_data_path=TS_DATA_PATH, result_store=None,
+                             run_info=None, result_cache=None,
+                             aggregation_settings=None, solver=None,
+                             solver_threads=None, time_limit=None,
+                             mip_gap=None, sample_rows=None,
+                             fixed_caps=None):
+    """Run model with bootstrap sampled data
+
+    Parameters:
+    -----------
+    model_name_in_paper (str) : 'LP_planning', 'MILP_planning' or
+        'operation'
+    scheme: either 'months' or 'weeks' -- scheme used to create bootstrap
+        samples
+    num_blocks_per_bin: either the number of months sampled from each
+        calendar month, or the number of weeks sampled from each season
+    run_id (int or str) : unique id, useful if running in parallel
+    reuse_backend (bool) : re-solve the optimisation problem built for
+        an earlier sample of the same length, see run_simulation
+    check_consistency (bool) : check if the model outputs are internally
+        consistent, see run_simulation
+    rng (numpy Generator) : random number generator used to create the
+        bootstrap sample. If None, the global random state is used
+    timings_path (str) : if given, a JSON lines file to which a record of
+        the phase timings of this simulation is appended
+    ts_data_path (str) : CSV file with the time series data from which
+        the bootstrap sample is created
+    result_store (storage.ResultStore) : if given, the outputs of this
+        simulation are added to it, see run_simulation
+    run_info (dict) : information about the sample (e.g. 'sample_num' and
+        'seed') stored with the outputs in result_store
+    result_cache (storage.ResultCache) : if given, cache of model outputs,
+        see run_simulation
+    aggregation_settings (dict) : if given, the sample is reduced to
+        representative periods before solving, see run_simulation
+    solver (str) : 'cbc' or 'gurobi', see run_simulation
+    solver_threads (int) : number of threads the solver may use
+    time_limit (float) : wall time limit of the solve, in seconds, see
+        run_simulation
+    mip_gap (float) : relative optimality gap of MILP solves
+    sample_rows (numpy array) : if given, the row numbers in the time
+        series data of the bootstrap sample (e.g. from a sample index, see
+        write_sample_index), which are used instead of drawing a sample
+        with rng
+    fixed_caps (pandas DataFrame/Series or dict) : capacities of the
+        'operation' model, see run_simulation
+
+    Returns:
+    --------
+    results (pandas DataFrame) : model outputs
+    """
+
+    timer = timing.PhaseTimer()
+    with timer.phase('sample_generation'):
+        if sample_rows is not None:
+            # Gather the rows from the memory-mapped data
+            ts_data = import_time_series_data(ts_data_path)
+            sample = _sample_to_dataframe(
+                np.asarray(ts_data.values)[sample_rows]
+            )
+        else:
+            sample = create_bootstrap_sample(scheme, num_blocks_per_bin,
+                                             rng=rng,
+                                             ts_data_path=ts_data_path)
     results = run_simulation(model_name_in_paper, ts_data=sample,
-                             run_id=run_id)
+                             run_id=run_id, reuse_backend=reuse_backend,
+                             check_consistency=check_consistency,
+                             timer=timer, timings_path=timings_path,
+                             result_store=result_store,
+                             result_cache=result_cache,
+                             run_info=dict(run_info or {}, scheme=scheme),
+                             aggregation_settings=aggregation_settings,
+                             solver=solver, solver_threads=solver_threads,
+                             time_limit=time_limit, mip_gap=mip_gap,
+                             fixed_caps=fixed_caps)
 
     return results
 
 
+class OnlineMoments:
+    """Running mean, variance and fourth central moment of each model
+    output, updated one simulation at a time.
+
+    Uses Welford's algorithm, extended to higher moments, so that the
+    outputs of individual simulations do not need to be stored. Missing
+    (NaN) outputs are skipped, so each output has its own count.
+    """
+
+    def __init__(self, index):
+        """Create accumulator for model outputs with a certain index."""
+        self.index = index
+        self.count = np.zeros(len(index))
+        self.mean = np.zeros(len(index))
+        self._m2 = np.zeros(len(index))
+        self._m3 = np.zeros(len(index))
+        self._m4 = np.zeros(len(index))
+
+    def update(self, values):
+        """Add the outputs (pandas Series) of one simulation."""
+        values = values.reindex(self.index).values.astype(float)
+        use = np.isfinite(values)
+        n_prev = self.count[use]
+        n = n_prev + 1
+        delta = values[use] - self.mean[use]
+        delta_n = delta / n
+        term = delta * delta_n * n_prev
+        m2, m3 = self._m2[use], self._m3[use]
+        self._m4[use] += (term * delta_n**2 * (n*n - 3*n + 3)
+                          + 6 * delta_n**2 * m2 - 4 * delta_n * m3)
+        self._m3[use] += term * delta_n * (n - 2) - 3 * delta_n * m2
+        self._m2[use] += term
+        self.mean[use] += delta_n
+        self.count[use] = n
+
+    def variance(self):
+        """Sample variance (ddof=1) of each output."""
+        with np.errstate(divide='ignore', invalid='ignore'):
+            variance = np.where(self.count > 1,
+                                self._m2 / (self.count - 1), np.nan)
+        return pd.Series(variance, index=self.index)
+
+    def stdev_relative_standard_error(self):
+        """Approximate relative standard error of the sample standard
+        deviation of each output, estimated from its fourth moment.
+        """
+        n = self.count
+        with np.errstate(divide='ignore', invalid='ignore'):
+            variance = self._m2 / (n - 1)
+            fourth_moment = self._m4 / n
+            variance_of_variance = (
+                fourth_moment - variance**2 * (n - 3) / (n - 1)
+            ) / n
+            relative_error = (np.sqrt(np.maximum(variance_of_variance, 0))
+                              / (2 * variance))
+        relative_error[n < 2] = np.inf
+        return pd.Series(relative_error, index=self.index)
+
+
+def _bootstrap_converged(moments, stdev_rel_tol):
+    """Check if the stdev estimate of every model output is accurate enough.
+
+    Outputs that do not vary between samples (up to round-off, such as
+    fixed capacities in operate mode) are ignored.
+    """
+    stdev = np.sqrt(moments.variance())
+    scale = np.maximum(np.abs(pd.Series(moments.mean, moments.index)), 1)
+    varying = ~(stdev <= 1e-9 * scale)
+    relative_error = moments.stdev_relative_standard_error()
+    return bool((relative_error[varying] < stdev_rel_tol).all())
+
+
+def _get_worker_sample_rows(scheme, num_blocks_per_bin, seed, sample_num,
+                            ts_data_path, sample_index_dir):
+    """Row numbers of a bootstrap sample in the sample index in
+    sample_index_dir, or None if there is no sample index."""
+    if sample_index_dir is None:
+        return None
+    # Samples added after the sampling stage, such as replacements of
+    # straggling samples, are added to the index here
+    sample_index = write_sample_index(sample_index_dir, scheme,
+                                      num_blocks_per_bin, seed, [sample_num],
+                                      ts_data_path=ts_data_path)
+    return sample_index.load_rows(sample_num)
+
+
+def _create_worker_sample(scheme, num_blocks_per_bin, seed, sample_num,
+                          ts_data_path, sample_index_dir):
+    """Create a bootstrap sample as in _run_bootstrap_simulation_worker,
+    for workers that run several models on it."""
+    sample_rows = _get_worker_sample_rows(scheme, num_blocks_per_bin, seed,
+                                          sample_num, ts_data_path,
+                                          sample_index_dir)
+    if sample_rows is not None:
+        ts_data = import_time_series_data(ts_data_path)
+        return _sample_to_dataframe(np.asarray(ts_data.values)[sample_rows])
+    return create_bootstrap_sample(scheme, num_blocks_per_bin,
+                                   rng=get_sample_rng(seed, sample_num),
+                                   ts_data_path=ts_data_path)
+
+
+def _run_bootstrap_simulation_worker(model_name_in_paper, scheme,
+                                     num_blocks_per_bin, seed, sample_num,
+                                     reuse_backend, consistency_check,
+                                     consistency_check_every, timings_path,
+                                     ts_data_path=TS_DATA_PATH,
+                                     result_store=None,
+                                     result_cache=None, solver=None,
+                                     solver_threads=None, time_limit=None,
+                                     mip_gap=None, sample_index_dir=None,
+                                     fixed_caps=None):
+    """Run a single bootstrap simulation, with the sample created from its
+    own random number generator (see get_sample_rng), or from its rows in
+    the sample index in sample_index_dir if given. Used both in worker
+    processes and in the current process.
+    """
+    check_consistency = _check_consistency_of_run(
+        consistency_check, sample_num, consistency_check_every
+    )
+    sample_rows = _get_worker_sample_rows(scheme, num_blocks_per_bin, seed,
+                                          sample_num, ts_data_path,
+                                          sample_index_dir)
+    results = run_bootstrap_simulation(model_name_in_paper,
+                                       scheme,
+                                       num_blocks_per_bin,
+                                       run_id=sample_num,
+                                       reuse_backend=reuse_backend,
+                                       check_consistency=check_consistency,
+                                       rng=get_sample_rng(seed, sample_num),
+                                       timings_path=timings_path,
+                                       ts_data_path=ts_data_path,
+                                       result_store=result_store,
+                                       result_cache=result_cache,
+                                       run_info={'sample_num': sample_num,
+                                                 'seed': seed},
+                                       solver=solver,
+                                       solver_threads=solver_threads,
+                                       time_limit=time_limit,
+                                       mip_gap=mip_gap,
+                                       sample_rows=sample_rows,
+                                       fixed_caps=fixed_caps)
+    return results.loc[:, 'output']
+
+
+class _SampleQueue:
+    """Iterator over sample numbers, to which sample numbers can be added
+    while it is used. Unlike a generator, it can continue after it has run
+    out, once new sample numbers are added."""
+
+    def __init__(self, sample_nums):
+        self._sample_nums = collections.deque(sample_nums)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if not self._sample_nums:
+            raise StopIteration
+        return self._sample_nums.popleft()
+
+    def append(self, sample_num):
+        """Add a sample number at the end."""
+        self._sample_nums.append(sample_num)
+
+
+def _map_samples(function, sample_nums, num_workers, **kwargs):
+    """Call function(sample_num=sample_num, **kwargs) for each sample
+    number, yielding (sample_num, result) as each call finishes.
+
+    When run in parallel, at most num_workers calls are submitted at any
+    time, so that closing the generator early (e.g. when the stdev
+    estimates have converged) leaves at most num_workers calls to finish.
+    The next sample number is taken only after the last result has been
+    handled, so sample numbers can be added to sample_nums (a _SampleQueue)
+    as results come in.
+
+    Parameters:
+    -----------
+    function (callable) : function of a single bootstrap sample. Must be
+        defined at module level if num_workers > 1
+    sample_nums (iterable) : bootstrap sample numbers
+    num_workers (int) : number of worker processes. If 1, the calls are
+        made one after another in the current process
+    """
+
+    sample_nums = iter(sample_nums)
+    if num_workers == 1:
+        for sample_num in sample_nums:
+            logging.info('\n\nCalculating bootstrap sample %s', sample_num+1)
+            results = function(sample_num=sample_num, **kwargs)
+            logging.info('Done.')
+            yield sample_num, results
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(
+            max_workers=num_workers) as executor:
+
+        def submit_next(running):
+            for sample_num in itertools.islice(sample_nums, 1):
+                future = executor.submit(function, sample_num=sample_num,
+                                         **kwargs)
+                running[future] = sample_num
+
+        running = {}
+        for _ in range(num_workers):
+            submit_next(running)
+        while running:
+            done, _ = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                sample_num = running.pop(future)
+                logging.info('Done with bootstrap sample %s.', sample_num+1)
+                yield sample_num, future.result()
+                submit_next(running)
+
+
+def _run_bootstrap_simulations(model_name_in_paper, bootstrap_scheme,
+                               num_blocks_per_bin, sample_nums, seed,
+                               num_workers, reuse_backend,
+                               consistency_check, consistency_check_every,
+                               timings_path, ts_data_path=TS_DATA_PATH,
+                               result_store=None,
+                               result_cache=None, scheduler=None,
+                               time_limit=None, mip_gap=None,
+                               sample_index_dir=None,
+                               worker=_run_bootstrap_simulation_worker,
+                               model_kwargs=None):
+    """Run bootstrap simulations, yielding (sample_num, outputs) as each
+    simulation finishes.
+
+    If seed is None and simulations are run one after another (without a
+    sample index), samples are drawn from the global random state in
+    order. Otherwise, each sample
+    is drawn from its own random number generator, derived from seed and
+    the sample number, so that results do not depend on which process runs
+    which sample. See _map_samples for how simulations are run in parallel,
+    or scheduler.JobScheduler.map_samples if a scheduler is given, and
+    run_buq_algorithm for the other arguments.
+    """
+
+    model_kwargs = model_kwargs or {}
+    if (num_workers == 1 and seed is None and scheduler is None
+            and sample_index_dir is None
+            and worker is _run_bootstrap_simulation_worker):
+        for sample_num in sample_nums:
+            logging.info('\n\nCalculating bootstrap sample %s', sample_num+1)
+            results = run_bootstrap_simulation(
+                model_name_in_paper,
+                bootstrap_scheme,
+                num_blocks_per_bin,
+                run_id=sample_num,
+                reuse_backend=reuse_backend,
+                check_consistency=_check_consistency_of_run(
+                    consistency_check, sample_num, consistency_check_every
+                ),
+                timings_path=timings_path,
+                ts_data_path=ts_data_path,
+                result_store=result_store,
+                result_cache=result_cache,
+                run_info={'sample_num': sample_num},
+                time_limit=time_limit,
+                mip_gap=mip_gap,
+                **model_kwargs
+            ).loc[:, 'output']
+            logging.info('Done.')
+            yield sample_num, results
+        return
+
+    # The seed is drawn from the global random state, so that seeding numpy
+    # before calling this function gives reproducible results
+    if seed is None:
+        seed = np.random.randint(2**32 - 1)
+    if scheduler is not None:
+        map_samples = functools.partial(
+            scheduler.map_samples,
+            num_timesteps=_get_bootstrap_sample_length(bootstrap_scheme,
+                                                       num_blocks_per_bin)
+        )
+    else:
+        map_samples = functools.partial(_map_samples,
+                                        num_workers=num_workers)
+    yield from map_samples(
+        worker, sample_nums,
+        model_name_in_paper=model_name_in_paper,
+        scheme=bootstrap_scheme,
+        num_blocks_per_bin=num_blocks_per_bin,
+        seed=seed,
+        reuse_backend=reuse_backend,
+        consistency_check=consistency_check,
+        consistency_check_every=consistency_check_every,
+        timings_path=timings_path,
+        ts_data_path=ts_data_path,
+        result_store=result_store,
+        result_cache=result_cache,
+        time_limit=time_limit,
+        mip_gap=mip_gap,
+        sample_index_dir=sample_index_dir,
+        **model_kwargs
+    )
+
+
+def _get_bootstrap_sample_length(scheme, num_blocks_per_bin):
+    """Length (in hours) of the bootstrap samples of a scheme, used for
+    rescaling the variance."""
+    if scheme == 'weeks':
+        return num_blocks_per_bin * 4 * 7 * 24
+    if scheme == 'months':
+        return num_blocks_per_bin * 8760
+    raise ValueError('Must be either months or weeks scheme')
+
+
+def _get_point_sample_length(point_estimate_range,
+                             ts_data_path=TS_DATA_PATH):
+    """Length (in hours) of the point estimate simulation: the number of
+    time steps of the data in the years of point_estimate_range, used for
+    rescaling the variance. This is 8760 per year for complete non-leap
+    years, and less for data that only covers part of the years."""
+    ts_data = import_time_series_data(ts_data_path)
+    point_sample_length = ts_data.loc[str(point_estimate_range[0]):
+                                      str(point_estimate_range[1])].shape[0]
+    if point_sample_length == 0:
+        raise ValueError('Time series data {} has no data in the years {} '
+                         'to {}.'.format(ts_data_path,
+                                         *point_estimate_range))
+    return point_sample_length
+
+
 def run_buq_algorithm(model_name_in_paper,
                       point_sample_length,
                       bootstrap_scheme,
                       num_blocks_per_bin,
-                      num_bootstrap_samples):
+                      num_bootstrap_samples,
+                      num_workers=1,
+                      reuse_backend=False,
+                      consistency_check='full',
+                      consistency_check_every=10,
+                      stdev_rel_tol=None,
+                      min_bootstrap_samples=10,
+                      run_store=None,
+                      seed=None,
+                      timings_path=None,
+                      ts_data_path=TS_DATA_PATH,
+                      result_store=None,
+                      result_cache=None,
+                      scheduler=None,
+                      time_limit=None,
+                      mip_gap=None,
+                      straggler_policy='drop',
+                      sample_index_dir=None,
+                      worker=_run_bootstrap_simulation_worker,
+                      model_kwargs=None):
     """Run through BUQ algorithm once to estimate standard deviation.
 
     Parameters:
     -----------
-    model_name_in_paper (str) : 'LP_planning', 'MILP_planning' or
-        'operation'
+    model_name_in_paper (str or list) : 'LP_planning', 'MILP_planning' or
+        'operation', or a list of them for workers that run several models
+        on each bootstrap sample
     point_sample_length (int) : length of sample used to determine point
         estimate (in hours), used only for rescaling
     boostrap scheme (str) : bootstrap scheme for calculating standard
@@ -220,53 +1571,393 @@ def run_buq_algorithm(model_name_in_paper,
     num_blocks_per_bin (int) : number of months from each calendar month
         or number of weeks from each season
     num_bootstrap_samples (int) : number of bootstrap samples over which to
-        calculate the standard deviation
+        calculate the standard deviation. If stdev_rel_tol is given, this is
+        the maximum number of bootstrap samples
+    num_workers (int) : number of processes over which to run the bootstrap
+        simulations. The default (1) runs them one after another in the
+        current process
+    reuse_backend (bool) : build the optimisation problem once per process
+        and re-solve it for each bootstrap sample, see run_simulation
+    consistency_check (str) : which runs to check for internal consistency
+        of the model outputs: 'full' (all), 'every_n' (every
+        consistency_check_every-th run), 'first' or 'off'
+    consistency_check_every (int) : see consistency_check
+    stdev_rel_tol (float) : if given, stop running bootstrap simulations
+        once the estimated relative standard error of every stdev estimate
+        is below this value, e.g. 0.1 for 10%
+    min_bootstrap_samples (int) : minimum number of bootstrap samples
+        before stopping, if stdev_rel_tol is given
+    run_store (storage.RunStore) : if given, the outputs of each bootstrap
+        simulation are stored as soon as it finishes, and samples already
+        in the store are not run again. The seed is kept in the store
+    seed (int) : master seed of the bootstrap samples. If given, sample i is
+        created from its own random stream (see get_sample_rng), so that it
+        is the same in serial and parallel runs. If None, serial runs draw
+        samples from the global random state in order, and parallel runs
+        draw the master seed from it
+    timings_path (str) : if given, a JSON lines file to which a record of
+        the phase timings of each simulation is appended
+    ts_data_path (str) : CSV file with the time series data from which
+        the bootstrap samples are created
+    result_store (storage.ResultStore) : if given, the outputs of each
+        bootstrap simulation are added to it, see run_simulation
+    result_cache (storage.ResultCache) : if given, cache of model outputs,
+        see run_simulation
+    scheduler (scheduler.JobScheduler) : if given, the bootstrap
+        simulations are run as jobs of this scheduler instead of over
+        num_workers processes, sharing its cores and memory with any other
+        jobs (e.g. the point estimate). A work_queue.WorkQueue can be
+        given instead, to run them on several machines
+    time_limit (float) : wall time limit of each bootstrap simulation, in
+        seconds, see run_simulation
+    mip_gap (float) : relative optimality gap of MILP solves
+    straggler_policy (str) : what to do with bootstrap simulations that are
+        not solved to optimality (see RUN_STATUSES): 'resubmit' runs a new
+        sample instead (at most num_bootstrap_samples times in total) and
+        'drop' leaves them out
+    sample_index_dir (str) : if given, the row numbers of all bootstrap
+        samples are first stored in this directory (see
+        write_sample_index), and each simulation gathers its sample from
+        the memory-mapped time series data just before solving. A seed is
+        then drawn from the global random state if not given
+    worker (callable) : function at module level that runs a single
+        bootstrap simulation, with the arguments of
+        _run_bootstrap_simulation_worker. Defaults to running
+        model_name_in_paper. Workers that run several models on each
+        sample (e.g. _run_multi_model_bootstrap_simulation_worker) return
+        their outputs as the columns of a pandas DataFrame, and a sample is
+        only used if every model solved it to optimality
+    model_kwargs (dict) : further arguments of worker, e.g. fixed_caps
 
     Returns:
     --------
     point_estimate_stdev (pandas DataFrame) : estimates for the standard
-        deviation of each model output
+        deviation of each model output ('stdev'), and the number of
+        bootstrap simulations each estimate is based on ('num_samples').
+        Indexed by (model, output) if worker runs several models. Run
+        information (RUN_INFO_OUTPUTS) is not included
     """
 
-    if bootstrap_scheme == 'weeks':
-        bootstrap_sample_length = num_blocks_per_bin * 4 * 7 * 24
-    elif bootstrap_scheme == 'months':
-        bootstrap_sample_length = num_blocks_per_bin * 8760
+    if straggler_policy not in STRAGGLER_POLICIES:
+        raise ValueError('Straggler policy must be one of {}.'.format(
+            STRAGGLER_POLICIES
+        ))
+    bootstrap_sample_length = _get_bootstrap_sample_length(
+        bootstrap_scheme, num_blocks_per_bin
+    )
 
     # Calculate variance across bootstrap samples
     logging.info('Starting bootstrap samples')
 
-    # Run model for each bootstrap sample
-    run_index = np.arange(num_bootstrap_samples)
-    for sample_num in run_index:
-        logging.info('\n\nCalculating bootstrap sample %s', sample_num+1)
-        results = run_bootstrap_simulation(model_name_in_paper,
-                                           bootstrap_scheme,
-                                           num_blocks_per_bin)
-        if sample_num == 0:
-            outputs = pd.DataFrame(columns=np.arange(num_bootstrap_samples),
-                                   index=results.index)
-        outputs[sample_num] = results.loc[:, 'output']
-        logging.info('Done.')
+    # Load simulations that have already finished. These include runs that
+    # were not used, and their replacements (numbered from
+    # num_bootstrap_samples), so that neither is run again
+    completed = {}
+    if run_store is not None:
+        seed = run_store.get_seed(seed)
+        completed = {
+            sample_num: outputs for sample_num, (sample_seed, outputs)
+            in run_store.load_samples().items()
+            if sample_seed == seed
+        }
+        logging.info('Loaded %s finished bootstrap samples from run store.',
+                     len(completed))
+
+    # Sampling stage: store the rows of the samples still to be run
+    if sample_index_dir is not None:
+        if seed is None:
+            seed = int(np.random.randint(2**32 - 1))
+        write_sample_index(
+            sample_index_dir, bootstrap_scheme, num_blocks_per_bin, seed,
+            [sample_num for sample_num in range(num_bootstrap_samples)
+             if sample_num not in completed],
+            ts_data_path=ts_data_path
+        )
+        logging.info('Stored bootstrap sample rows in %s.',
+                     sample_index_dir)
+
+    # Run model for each bootstrap sample, updating the variance of each
+    # output as simulations finish
+    moments = None
+    num_samples_used = 0
+    num_replacements = 0
+    status_counts = collections.Counter()
+    to_run = _SampleQueue(sample_num for sample_num
+                          in range(num_bootstrap_samples)
+                          if sample_num not in completed)
+    # Keep the generator of new simulations, since only it can be closed
+    new_simulations = _run_bootstrap_simulations(
+        model_name_in_paper, bootstrap_scheme, num_blocks_per_bin,
+        to_run, seed, num_workers, reuse_backend,
+        consistency_check, consistency_check_every, timings_path,
+        ts_data_path=ts_data_path, result_store=result_store,
+        result_cache=result_cache, scheduler=scheduler,
+        time_limit=time_limit, mip_gap=mip_gap,
+        sample_index_dir=sample_index_dir, worker=worker,
+        model_kwargs=model_kwargs
+    )
+    simulations = itertools.chain(
+        sorted((sample_num, outputs) for sample_num, outputs
+               in completed.items() if sample_num < num_bootstrap_samples),
+        new_simulations
+    )
+    for sample_num, outputs in simulations:
+        if run_store is not None and sample_num not in completed:
+            run_store.append_sample(sample_num, seed, outputs)
+        finished = [(sample_num, outputs)]
+        while finished:
+            sample_num, outputs = finished.pop()
+            if isinstance(outputs, pd.DataFrame):
+                outputs = outputs.unstack()    # Index (model, output)
+            status = _get_sample_status(outputs)
+            status_counts[status] += 1
+            if status == 'optimal':
+                if moments is None:
+                    # Run information (e.g. time) has no meaningful stdev
+                    moments = OnlineMoments(outputs.index[
+                        ~outputs.index.get_level_values(-1).isin(
+                            RUN_INFO_OUTPUTS
+                        )
+                    ])
+                moments.update(outputs)
+                num_samples_used += 1
+            elif straggler_policy == 'resubmit':
+                if num_replacements >= num_bootstrap_samples:
+                    logging.warning('Not replacing bootstrap sample %s: '
+                                    'too many samples replaced.',
+                                    sample_num+1)
+                    continue
+                replacement = num_bootstrap_samples + num_replacements
+                num_replacements += 1
+                logging.info('Replacing bootstrap sample %s (%s) with '
+                             'sample %s.', sample_num+1, status,
+                             replacement+1)
+                if replacement in completed:
+                    finished.append((replacement, completed[replacement]))
+                else:
+                    to_run.append(replacement)
+        if moments is None:
+            continue
+        if (stdev_rel_tol is not None
+                and num_samples_used >= min_bootstrap_samples
+                and _bootstrap_converged(moments, stdev_rel_tol)):
+            logging.info('Stdev estimates converged after %s bootstrap '
+                         'samples.', num_samples_used)
+            new_simulations.close()
+            break
+    logging.info('Status of bootstrap simulations: %s. Used %s of them.',
+                 dict(status_counts), num_samples_used)
+    if moments is None:
+        raise RuntimeError('None of the bootstrap simulations could be '
+                           'used, see log for details.')
 
     # Calculate variance across model outputs
-    bootstrap_variance = outputs.var(axis=1)
+    bootstrap_variance = moments.variance()
 
     # Rescale variance to determine stdev of point estimate
     point_estimate_variance = (
         (bootstrap_sample_length/point_sample_length) * bootstrap_variance
     )
-    point_estimate_stdev = pd.DataFrame(np.sqrt(point_estimate_variance),
-                                        columns=['stdev'])
+    point_estimate_stdev = pd.DataFrame({
+        'stdev': np.sqrt(point_estimate_variance),
+        'num_samples': moments.count.astype(int)
+    })
 
     return point_estimate_stdev
 
 
+def _calculate_estimates(model_name_in_paper,
+                         point_estimate_range,
+                         bootstrap_scheme,
+                         num_blocks_per_bin,
+                         num_bootstrap_samples,
+                         point_estimate_function=run_years_simulation,
+                         worker=_run_bootstrap_simulation_worker,
+                         model_kwargs=None,
+                         fixed_caps_from_point_estimate=False,
+                         num_workers=1,
+                         reuse_backend=False,
+                         consistency_check='full',
+                         consistency_check_every=10,
+                         stdev_rel_tol=None,
+                         min_bootstrap_samples=10,
+                         run_store_dir=None,
+                         seed=None,
+                         timings_path=None,
+                         ts_data_path=TS_DATA_PATH,
+                         result_store_dir=None,
+                         store_dispatch=False,
+                         result_cache_dir=None,
+                         scheduler=None,
+                         time_limit=None,
+                         mip_gap=None,
+                         straggler_policy='drop',
+                         sample_index_dir=None):
+    """Calculate point estimates using a single long simulation and
+    estimate their standard deviation with the BUQ algorithm, for one or
+    several models. The settings from num_workers on are shared by
+    calculate_point_estimate_and_stdev, which documents them,
+    calculate_point_estimates_and_stdevs and
+    calculate_plan_operate_estimates.
+
+    Parameters:
+    -----------
+    model_name_in_paper (str or list) : model, or models, to run
+    point_estimate_function (callable) : function at module level that
+        runs the point estimate simulation, with the arguments of
+        run_years_simulation. Functions that run several models return
+        their outputs as columns
+    worker (callable) : function that runs a single bootstrap simulation,
+        see run_buq_algorithm
+    model_kwargs (dict) : further arguments of point_estimate_function and
+        worker, e.g. fixed_caps. Those that are not None are part of the
+        run store configuration
+    fixed_caps_from_point_estimate (bool) : run the bootstrap simulations
+        with the capacities of the point estimate of the first model,
+        passed to worker as fixed_caps. The bootstrap simulations then
+        start once the point estimate has finished
+
+    Returns:
+    --------
+    estimates (pandas DataFrame) : see calculate_point_estimate_and_stdev
+        for a single model, and calculate_point_estimates_and_stdevs for
+        several
+    """
+
+    model_kwargs = dict(model_kwargs or {})
+    point_sample_length = _get_point_sample_length(point_estimate_range,
+                                                   ts_data_path)
+
+    result_store = None
+    if result_store_dir is not None:
+        result_store = storage.ResultStore(result_store_dir,
+                                           store_dispatch=store_dispatch)
+    result_cache = None
+    if result_cache_dir is not None:
+        result_cache = storage.ResultCache(result_cache_dir)
+
+    run_store = None
+    if run_store_dir is not None:
+        # Every setting that affects the stored outputs, so that a run
+        # with other settings cannot be resumed from the store
+        config = {
+            'model_name_in_paper': model_name_in_paper,
+            'point_estimate_range': list(point_estimate_range),
+            'bootstrap_scheme': bootstrap_scheme,
+            'num_blocks_per_bin': num_blocks_per_bin,
+            'ts_data_path': ts_data_path,
+            'consistency_check': consistency_check,
+            'consistency_check_every': consistency_check_every,
+            'solver': getattr(scheduler, 'solver', None),
+            'time_limit': time_limit,
+            'mip_gap': mip_gap,
+            'straggler_policy': straggler_policy
+        }
+        config.update({name: value for name, value in model_kwargs.items()
+                       if value is not None})
+        if fixed_caps_from_point_estimate:
+            config['fixed_caps_from_point_estimate'] = True
+        run_store = storage.RunStore(run_store_dir, config=config)
+
+    def save_point_estimate(point_estimate):
+        """Check the status of the point estimate and store it."""
+        _check_point_estimate_status(point_estimate, model_name_in_paper)
+        if run_store is not None:
+            run_store.save_point_estimate(point_estimate)
+
+    # Calculate point estimate via single long simulation
+    logging.info('Calculating point estimate...')
+    point_estimate = (run_store.load_point_estimate()
+                      if run_store is not None else None)
+    point_estimate_future = None
+    point_estimate_kwargs = dict(
+        model_kwargs,
+        startyear=point_estimate_range[0],
+        endyear=point_estimate_range[1],
+        check_consistency=(consistency_check != 'off'),
+        timings_path=timings_path,
+        ts_data_path=ts_data_path,
+        result_store=result_store,
+        result_cache=result_cache,
+        mip_gap=mip_gap
+    )
+    if point_estimate is not None:
+        logging.info('Loaded point estimate from run store.')
+    elif scheduler is not None:
+        # Run alongside the bootstrap simulations, collected further below
+        point_estimate_future = scheduler.submit(
+            point_estimate_function, model_name_in_paper,
+            num_timesteps=point_sample_length, **point_estimate_kwargs
+        )
+    else:
+        point_estimate = point_estimate_function(
+            model_name_in_paper=model_name_in_paper,
+            **point_estimate_kwargs
+        )
+        save_point_estimate(point_estimate)
+    if fixed_caps_from_point_estimate:
+        if point_estimate_future is not None:
+            point_estimate = point_estimate_future.result()
+            point_estimate_future = None
+            save_point_estimate(point_estimate)
+        model_kwargs['fixed_caps'] = models.get_fixed_caps(
+            point_estimate.iloc[:, 0]
+        )
+
+    # Estimate standard deviation with BUQ algorithm
+    logging.info('Calculating stdev estimate...')
+    point_estimate_stdev = run_buq_algorithm(
+        model_name_in_paper=model_name_in_paper,
+        point_sample_length=point_sample_length,
+        bootstrap_scheme=bootstrap_scheme,
+        num_blocks_per_bin=num_blocks_per_bin,
+        num_bootstrap_samples=num_bootstrap_samples,
+        num_workers=num_workers,
+        reuse_backend=reuse_backend,
+        consistency_check=consistency_check,
+        consistency_check_every=consistency_check_every,
+        stdev_rel_tol=stdev_rel_tol,
+        min_bootstrap_samples=min_bootstrap_samples,
+        run_store=run_store,
+        seed=seed,
+        timings_path=timings_path,
+        ts_data_path=ts_data_path,
+        result_store=result_store,
+        result_cache=result_cache,
+        scheduler=scheduler,
+        time_limit=time_limit,
+        mip_gap=mip_gap,
+        straggler_policy=straggler_policy,
+        sample_index_dir=sample_index_dir,
+        worker=worker,
+        model_kwargs=model_kwargs
+    )
+    logging.info('Done calculating stdev estimate.')
+
+    if point_estimate_future is not None:
+        point_estimate = point_estimate_future.result()
+        save_point_estimate(point_estimate)
+    logging.info('Done calculating point_estimate.')
+
+    if not isinstance(model_name_in_paper, str):
+        return _get_joint_estimates(point_estimate, point_estimate_stdev)
+
+    # Create single dataframe with point and standard deviation estimate
+    point_estimate = pd.DataFrame(point_estimate.values,
+                                  columns=['point_estimate'],
+                                  index=point_estimate.index)
+    estimate_with_stdev = point_estimate.join(point_estimate_stdev)
+
+    return estimate_with_stdev
+
+
 def calculate_point_estimate_and_stdev(model_name_in_paper,
                                        point_estimate_range,
                                        bootstrap_scheme,
                                        num_blocks_per_bin,
-                                       num_bootstrap_samples):
+                                       num_bootstrap_samples,
+                                       fixed_caps=None,
+                                       **kwargs):
     """Calculate point estimate using a single long simulation and estimate
     standard deviation using multiple short simulations and BUQ algorithm.
 
@@ -283,43 +1974,385 @@ def calculate_point_estimate_and_stdev(model_name_in_paper,
         or number of weeks from each season
     num_bootstrap_samples (int) : number of bootstrap samples over which to
         calculate the standard deviation
+    fixed_caps (pandas DataFrame/Series or dict) : capacities of the
+        'operation' model, e.g. the outputs of a planning run, see
+        run_simulation. If None, those in model.yaml are used
+    The other arguments are settings shared with
+    calculate_point_estimates_and_stdevs and
+    calculate_plan_operate_estimates:
+    num_workers (int) : number of processes over which to run the bootstrap
+        simulations
+    reuse_backend (bool) : build the optimisation problem for the bootstrap
+        simulations once per process and re-solve it for each sample
+    consistency_check (str) : which runs to check for internal consistency
+        of the model outputs: 'full', 'every_n', 'first' or 'off'. The
+        point estimate run is checked unless this is 'off'
+    consistency_check_every (int) : check every this many bootstrap runs,
+        if consistency_check is 'every_n'
+    stdev_rel_tol (float) : if given, stop running bootstrap simulations
+        once the relative standard error of every stdev estimate is below
+        this value. num_bootstrap_samples is then the maximum number
+    min_bootstrap_samples (int) : minimum number of bootstrap samples
+        before stopping, if stdev_rel_tol is given
+    run_store_dir (str) : if given, directory in which the outputs of each
+        simulation are stored as soon as it finishes. Calling this function
+        again with the same arguments and directory skips the simulations
+        that have already finished. Settings that affect the outputs
+        (e.g. time_limit or straggler_policy) cannot be changed on resuming
+    seed (int) : master seed of the bootstrap samples, see run_buq_algorithm
+    timings_path (str) : if given, a JSON lines file to which a record of
+        the phase timings of each simulation is appended
+    ts_data_path (str) : CSV file with the time series data used by all
+        simulations. Defaults to the full data set in `data/`
+    result_store_dir (str) : if given, directory of a storage.ResultStore
+        to which the outputs of every simulation are added, one row per
+        simulation
+    store_dispatch (bool) : also store the hourly dispatch of every
+        simulation in the result store
+    result_cache_dir (str) : if given, directory of a storage.ResultCache.
+        Simulations with exactly the same inputs as an earlier simulation
+        (e.g. the point estimate in repeated experiments) are then loaded
+        from the cache instead of being solved again
+    scheduler (scheduler.JobScheduler) : if given, the point estimate and
+        the bootstrap simulations are run as jobs of this scheduler, within
+        its budget of cores and memory. The long point estimate simulation
+        then runs at the same time as the bootstrap simulations, instead of
+        before them. num_workers is not used. A work_queue.WorkQueue can
+        be given instead, to run the simulations on several machines
+    time_limit (float) : wall time limit of each bootstrap simulation, in
+        seconds. The point estimate simulation has no time limit
+    mip_gap (float) : relative optimality gap of MILP solves, for all
+        simulations
+    straggler_policy (str) : what to do with bootstrap simulations that
+        reach the time limit or fail: 'resubmit' or 'drop', see
+        run_buq_algorithm
+    sample_index_dir (str) : if given, directory in which the row numbers
+        of the bootstrap samples are stored before the bootstrap
+        simulations start, see run_buq_algorithm
 
     Returns:
     --------
-    estimate_with_stdev (pandas DataFrame) : has 2 columns: the point
-        estimates and the stdev of the relevant model outputs
+    estimate_with_stdev (pandas DataFrame) : has 3 columns: the point
+        estimates and the stdev of the relevant model outputs, and the
+        number of bootstrap simulations used for each stdev estimate. The
+        run information rows (RUN_INFO_OUTPUTS) of the point estimate have
+        no stdev
     """
+    if fixed_caps is not None:
+        fixed_caps = models.get_fixed_caps(fixed_caps)
+    return _calculate_estimates(model_name_in_paper, point_estimate_range,
+                                bootstrap_scheme, num_blocks_per_bin,
+                                num_bootstrap_samples,
+                                model_kwargs={'fixed_caps': fixed_caps},
+                                **kwargs)
 
-    point_sample_length = 8760 * (point_estimate_range[1]
-                                  - point_estimate_range[0] + 1)
 
-    # Calculate point estimate via single long simulation
-    logging.info('Calculating point estimate...')
-    point_estimate = run_years_simulation(
-        model_name_in_paper=model_name_in_paper,
-        startyear=point_estimate_range[0],
-        endyear=point_estimate_range[1]
+def _get_joint_estimates(point_estimates, point_estimate_stdev):
+    """Combine the point estimates of several models with the stdev
+    estimates of their outputs into a single table.
+
+    Parameters:
+    -----------
+    point_estimates (pandas DataFrame) : point estimate of each model, as
+        columns
+    point_estimate_stdev (pandas DataFrame) : stdev estimate and number of
+        bootstrap simulations of each output, indexed by (model, output),
+        see run_buq_algorithm. Models without bootstrap outputs are left
+        out
+
+    Returns:
+    --------
+    estimates (pandas DataFrame) : see calculate_point_estimates_and_stdevs
+    """
+
+    bootstrap_models = point_estimate_stdev.index.get_level_values(0)
+    estimates = pd.concat({
+        name: pd.DataFrame({
+            'point_estimate': point_estimates[name]
+        }).join(point_estimate_stdev.loc[name])
+        for name in point_estimates.columns if name in bootstrap_models
+    }, axis=1)
+
+    return estimates
+
+
+def _add_paired_differences(outputs, paired_differences):
+    """Add the difference between the outputs of each pair of models
+    (columns of outputs) as columns 'model1 - model2', without run
+    information, if paired_differences is True."""
+    if not paired_differences:
+        return outputs
+    outputs = outputs.copy()
+    for model_1, model_2 in itertools.combinations(outputs.columns, 2):
+        outputs['{} - {}'.format(model_1, model_2)] = (
+            outputs[model_1] - outputs[model_2]
+        ).drop(index=RUN_INFO_OUTPUTS)
+    return outputs
+
+
+def run_multi_model_years_simulation(model_name_in_paper, startyear,
+                                     endyear, paired_differences=False,
+                                     **kwargs):
+    """Run several models (model_name_in_paper, a list) with certain years
+    of data, see run_years_simulation for the other arguments.
+
+    Returns:
+    --------
+    outputs (pandas DataFrame) : outputs of each model, and their paired
+        differences if paired_differences is True, as columns
+    """
+    outputs = pd.DataFrame({
+        name: run_years_simulation(name, startyear, endyear,
+                                   **kwargs).loc[:, 'output']
+        for name in model_name_in_paper
+    })
+    return _add_paired_differences(outputs, paired_differences)
+
+
+def _run_multi_model_bootstrap_simulation_worker(
+        model_name_in_paper, scheme, num_blocks_per_bin, seed, sample_num,
+        reuse_backend, consistency_check, consistency_check_every,
+        timings_path, ts_data_path=TS_DATA_PATH, result_store=None,
+        result_cache=None, solver=None, solver_threads=None,
+        time_limit=None, mip_gap=None, sample_index_dir=None,
+        paired_differences=False):
+    """Create a single bootstrap sample, as in
+    _run_bootstrap_simulation_worker, and run every model in
+    model_name_in_paper (a list) with it.
+
+    Returns:
+    --------
+    outputs (pandas DataFrame) : outputs of each model, and their paired
+        differences if paired_differences is True, as columns
+    """
+
+    check_consistency = _check_consistency_of_run(
+        consistency_check, sample_num, consistency_check_every
     )
-    point_estimate = pd.DataFrame(point_estimate.values,
-                                  columns=['point_estimate'],
-                                  index=point_estimate.index)
-    logging.info('Done calculating point_estimate.')
+    # The sample generation is recorded with the first model's phases
+    timer = timing.PhaseTimer()
+    with timer.phase('sample_generation'):
+        sample = _create_worker_sample(scheme, num_blocks_per_bin, seed,
+                                       sample_num, ts_data_path,
+                                       sample_index_dir)
+    run_info = {'scheme': scheme, 'sample_num': sample_num, 'seed': seed}
+    outputs = {}
+    for name in model_name_in_paper:
+        results = run_simulation(name, ts_data=sample, run_id=sample_num,
+                                 reuse_backend=reuse_backend,
+                                 check_consistency=check_consistency,
+                                 timer=timer, timings_path=timings_path,
+                                 result_store=result_store,
+                                 result_cache=result_cache,
+                                 run_info=run_info, solver=solver,
+                                 solver_threads=solver_threads,
+                                 time_limit=time_limit, mip_gap=mip_gap)
+        outputs[name] = results.loc[:, 'output']
+        timer = timing.PhaseTimer()
 
-    # Estimate standard deviation with BUQ algorithm
-    logging.info('Calculating stdev estimate...')
-    point_estimate_stdev = run_buq_algorithm(
-        model_name_in_paper=model_name_in_paper,
-        point_sample_length=point_sample_length,
-        bootstrap_scheme=bootstrap_scheme,
-        num_blocks_per_bin=num_blocks_per_bin,
-        num_bootstrap_samples=num_bootstrap_samples
+    return _add_paired_differences(pd.DataFrame(outputs), paired_differences)
+
+
+def calculate_point_estimates_and_stdevs(model_names_in_paper,
+                                         point_estimate_range,
+                                         bootstrap_scheme,
+                                         num_blocks_per_bin,
+                                         num_bootstrap_samples,
+                                         paired_differences=False,
+                                         **kwargs):
+    """Calculate point estimates and stdev estimates of several models,
+    with every model run on the same bootstrap samples.
+
+    Each bootstrap sample is created once and fed to every model (common
+    random numbers), so that the outputs of different models are paired.
+    The stdev of the difference between two models' outputs is then
+    usually much smaller than with independent samples, and can be
+    estimated with fewer bootstrap samples.
+
+    Parameters:
+    -----------
+    model_names_in_paper (list) : models to run, from 'LP_planning',
+        'MILP_planning' and 'operation'
+    paired_differences (bool) : also estimate the difference between the
+        outputs of each pair of models, with its stdev estimated from the
+        paired bootstrap outputs
+    kwargs : the settings of calculate_point_estimate_and_stdev from
+        num_workers on, e.g. seed, run_store_dir, scheduler or time_limit.
+        Each process or scheduler job runs all models for a sample, and a
+        sample is only used if every model solved it to optimality.
+        Simulations in the result store have the same sample_num and seed
+        for all models
+    See calculate_point_estimate_and_stdev for the other arguments.
+
+    Returns:
+    --------
+    estimates (pandas DataFrame) : with a column for the point estimate
+        and stdev of each model output, and the number of bootstrap
+        simulations each stdev is based on. Columns have two levels: the
+        model name (or 'model1 - model2' for paired differences), and
+        'point_estimate', 'stdev' or 'num_samples'. The run information
+        rows (RUN_INFO_OUTPUTS) of the point estimates have no stdev
+    """
+
+    for model_name_in_paper in model_names_in_paper:
+        if model_name_in_paper not in MODELS_IN_PAPER:
+            raise ValueError('Invalid model name.')
+    return _calculate_estimates(
+        list(model_names_in_paper), point_estimate_range, bootstrap_scheme,
+        num_blocks_per_bin, num_bootstrap_samples,
+        point_estimate_function=run_multi_model_years_simulation,
+        worker=_run_multi_model_bootstrap_simulation_worker,
+        model_kwargs={'paired_differences': paired_differences},
+        **kwargs
     )
-    point_estimate_stdev = pd.DataFrame(point_estimate_stdev.values,
-                                        columns=['stdev'],
-                                        index=point_estimate_stdev.index)
-    logging.info('Done calculating stdev estimate.')
 
-    # Create single dataframe with point and standard deviation estimate
-    estimate_with_stdev = point_estimate.join(point_estimate_stdev)
 
-    return estimate_with_stdev
+def run_plan_operate_years_simulation(model_name_in_paper, startyear,
+                                      endyear, **kwargs):
+    """Run a planning model (the first of model_name_in_paper) with certain
+    years of data, and then the 'operation' model with its capacities, see
+    run_years_simulation for the other arguments.
+
+    Returns:
+    --------
+    outputs (pandas DataFrame) : outputs of each model, as columns
+    """
+    planning_model_name_in_paper = model_name_in_paper[0]
+    planning_results = run_years_simulation(planning_model_name_in_paper,
+                                            startyear, endyear, **kwargs)
+    _check_point_estimate_status(planning_results,
+                                 planning_model_name_in_paper)
+    operation_results = run_years_simulation('operation', startyear,
+                                             endyear,
+                                             fixed_caps=planning_results,
+                                             **kwargs)
+    return pd.DataFrame({
+        planning_model_name_in_paper: planning_results.loc[:, 'output'],
+        'operation': operation_results.loc[:, 'output']
+    })
+
+
+def _run_plan_operate_bootstrap_simulation_worker(
+        model_name_in_paper, scheme, num_blocks_per_bin, seed, sample_num,
+        reuse_backend, consistency_check, consistency_check_every,
+        timings_path, ts_data_path=TS_DATA_PATH, result_store=None,
+        result_cache=None, solver=None, solver_threads=None,
+        time_limit=None, mip_gap=None, sample_index_dir=None,
+        fixed_caps=None):
+    """Create a single bootstrap sample, as in
+    _run_bootstrap_simulation_worker, and run the 'operation' model on it.
+
+    If fixed_caps is None, the planning model (the first of
+    model_name_in_paper) is first run on the same sample, and the
+    operation model uses its capacities. If that planning run is not
+    solved to optimality, the operation model is not run.
+
+    Returns:
+    --------
+    outputs (pandas DataFrame) : outputs of each model run, as columns
+    """
+
+    planning_model_name_in_paper = model_name_in_paper[0]
+    check_consistency = _check_consistency_of_run(
+        consistency_check, sample_num, consistency_check_every
+    )
+    timer = timing.PhaseTimer()
+    with timer.phase('sample_generation'):
+        sample = _create_worker_sample(scheme, num_blocks_per_bin, seed,
+                                       sample_num, ts_data_path,
+                                       sample_index_dir)
+    run_info = {'scheme': scheme, 'sample_num': sample_num, 'seed': seed}
+    run_kwargs = {'run_id': sample_num,
+                  'check_consistency': check_consistency,
+                  'timings_path': timings_path,
+                  'result_store': result_store,
+                  'result_cache': result_cache,
+                  'run_info': run_info,
+                  'solver': solver,
+                  'solver_threads': solver_threads,
+                  'time_limit': time_limit,
+                  'mip_gap': mip_gap}
+    outputs = {}
+    if fixed_caps is None:
+        planning_results = run_simulation(
+            planning_model_name_in_paper, ts_data=sample,
+            reuse_backend=reuse_backend, timer=timer, **run_kwargs
+        )
+        outputs[planning_model_name_in_paper] = (
+            planning_results.loc[:, 'output']
+        )
+        planning_status = RUN_STATUSES[
+            int(planning_results.loc['status', 'output'])
+        ]
+        if planning_status != 'optimal':
+            logging.warning('Not running the operation model on bootstrap '
+                            'sample %s: its planning run is %s.',
+                            sample_num+1, planning_status)
+            outputs['operation'] = pd.Series(
+                {'status': float(RUN_STATUSES.index('failed'))}
+            )
+            return pd.DataFrame(outputs)
+        fixed_caps = planning_results
+        timer = timing.PhaseTimer()
+    outputs['operation'] = run_simulation(
+        'operation', ts_data=sample, timer=timer, fixed_caps=fixed_caps,
+        **run_kwargs
+    ).loc[:, 'output']
+
+    return pd.DataFrame(outputs)
+
+
+def calculate_plan_operate_estimates(point_estimate_range,
+                                     bootstrap_scheme,
+                                     num_blocks_per_bin,
+                                     num_bootstrap_samples,
+                                     planning_model_name_in_paper=(
+                                         'LP_planning'
+                                     ),
+                                     capacities='point_estimate',
+                                     **kwargs):
+    """Calculate point estimates and stdev estimates of the 'operation'
+    model, with its capacities taken from a planning model run instead of
+    the operate override in model.yaml.
+
+    Parameters:
+    -----------
+    planning_model_name_in_paper (str) : 'LP_planning' or 'MILP_planning'
+    capacities (str) : which planning run the operation capacities are
+        taken from:
+        - 'point_estimate': the planning point estimate. All operation runs
+          use the same capacities, so the bootstrap simulations start once
+          the point estimate has finished
+        - 'bootstrap': the planning run on the same sample. Each bootstrap
+          sample is run through the planning and then the operation model,
+          so that the stdev estimates include the uncertainty in the
+          capacities
+    kwargs : the settings of calculate_point_estimate_and_stdev from
+        num_workers on, e.g. seed, run_store_dir, scheduler or time_limit
+    See calculate_point_estimate_and_stdev for the other arguments.
+
+    Returns:
+    --------
+    estimates (pandas DataFrame) : with a column for the point estimate
+        and stdev of each output of the operation model, and of the
+        planning model if capacities is 'bootstrap', and the number of
+        bootstrap simulations each stdev is based on. Columns have two
+        levels: the model name, and 'point_estimate', 'stdev' or
+        'num_samples'. The run information rows (RUN_INFO_OUTPUTS) of the
+        point estimates have no stdev
+    """
+
+    if MODELS_IN_PAPER.get(planning_model_name_in_paper,
+                           {}).get('run_mode') != 'plan':
+        raise ValueError('Invalid planning model name.')
+    if capacities not in ['point_estimate', 'bootstrap']:
+        raise ValueError('Capacities must be taken from either '
+                         'point_estimate or bootstrap runs.')
+    return _calculate_estimates(
+        [planning_model_name_in_paper, 'operation'], point_estimate_range,
+        bootstrap_scheme, num_blocks_per_bin, num_bootstrap_samples,
+        point_estimate_function=run_plan_operate_years_simulation,
+        worker=_run_plan_operate_bootstrap_simulation_worker,
+        fixed_caps_from_point_estimate=(capacities == 'point_estimate'),
+        **kwargs
+    )
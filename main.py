@@ -19,6 +19,13 @@ def run_example():
         subsample size is (365*num_blocks_per_bin) days.
       - 'weeks': number of weeks from each season sampled, so that the
         total subsample size is (28*num_blocks_per_bin) days.
+    - num_workers: number of processes over which the bootstrap
+      simulations are run in parallel. 1 runs them one after another.
+    - consistency_check: which runs are checked for internal consistency:
+      'full' (all), 'every_n' (every 10th run), 'first' or 'off'.
+    - Outputs of each simulation are cached in `data/.cache/results`, so
+      that running the same simulation again (e.g. the point estimate)
+      loads its outputs instead of solving the model.
     """
 
     # Arguments -- change as desired, see notes above
@@ -27,6 +34,8 @@ def run_example():
     bootstrap_scheme = 'weeks'
     num_blocks_per_bin = 3
     num_bootstrap_samples = 10    # K in paper
+    num_workers = 1    # number of parallel processes
+    consistency_check = 'full'
     logging_level = 'INFO'   # use 'ERROR' for fewer logging statements
 
     logging.basicConfig(
@@ -41,6 +50,7 @@ def run_example():
             '`outputs`, but this already exists. Delete or rename '
             'that directory.'
         )
+    os.mkdir('outputs')
 
     # Run the methodology, return point estimates and stdev estimates
     results = buq.calculate_point_estimate_and_stdev(
@@ -48,13 +58,17 @@ def run_example():
         point_estimate_range=point_estimate_range,
         bootstrap_scheme=bootstrap_scheme,
         num_blocks_per_bin=num_blocks_per_bin,
-        num_bootstrap_samples=num_bootstrap_samples
+        num_bootstrap_samples=num_bootstrap_samples,
+        num_workers=num_workers,
+        consistency_check=consistency_check,
+        timings_path='outputs/timings.jsonl',
+        result_store_dir='outputs/results',
+        result_cache_dir='data/.cache/results'
     )
 
     # Save outputs to CSV
     logging.info('Done with all model runs. '
                  'Saving outputs to new directory `outputs`')
-    os.mkdir('outputs')
     results.to_csv('outputs/model_outputs.csv', float_format='%.5f')
 
 
@@ -2,11 +2,18 @@
 
 
 import os
+import re
 import logging
 import shutil
+import contextlib
+import numpy as np
 import pandas as pd
 import calliope
-import tests
+import timing
+try:
+    from pyomo.common.errors import ApplicationError
+except ImportError:    # Pyomo versions before 5.7
+    from pyutilib.common import ApplicationError
 
 
 # Emission intensities of technologies, in ton CO2 equivalent per GWh
@@ -17,6 +24,102 @@ EMISSION_INTENSITIES = {'nuclear': 0,
                         'unmet': 0}
 
 
+# Location and technology whose resource is given by each time series
+# column. These should match the 'file=demand_wind.csv' entries in the
+# locations.yaml files in the model definitions
+TS_COLUMN_LOCATIONS = {
+    '1_region': {'demand': ('region1', 'demand_power'),
+                 'wind': ('region1', 'wind')},
+    '6_region': {'demand_region2': ('region2', 'demand_power'),
+                 'demand_region4': ('region4', 'demand_power'),
+                 'demand_region5': ('region5', 'demand_power'),
+                 'wind_region2': ('region2', 'wind_region2'),
+                 'wind_region5': ('region5', 'wind_region5'),
+                 'wind_region6': ('region6', 'wind_region6')}
+}
+
+
+# Length of the windows in which Calliope solves the operation model, and
+# of the horizon over which each window is optimised, in hours (see
+# 'operate' in models/6_region/model.yaml). Calliope cannot run the
+# operation model on time series shorter than the horizon
+OPERATION_WINDOW_HOURS = 672
+OPERATION_HORIZON_HOURS = 720
+
+
+# Topology of 6 region model: the regions in which each technology exists
+# and the regions connected by transmission lines. These should match the
+# information provided in the locations.yaml file in the model definition
+REGIONS_6_REGION = ['region{}'.format(i+1) for i in range(6)]
+TOPOLOGY_6_REGION = {
+    'nuclear': ['region3'],
+    'ccgt': ['region1', 'region3'],
+    'ocgt': ['region1', 'region6'],
+    'wind': ['region2', 'region5', 'region6'],
+    'unmet': ['region2', 'region4', 'region5'],
+    'demand': ['region2', 'region4', 'region5'],
+    'transmission': [('region1', 'region2'),
+                     ('region1', 'region5'),
+                     ('region1', 'region6'),
+                     ('region2', 'region3'),
+                     ('region3', 'region4'),
+                     ('region4', 'region5'),
+                     ('region5', 'region6')]
+}
+
+
+def get_summary_output_table():
+    """Create a table of the regional outputs of the 6 region model, used
+    to extract them from the Calliope results.
+
+    Returns:
+    --------
+    table (pandas DataFrame) : indexed by output name, in the order in
+        which they appear in model.get_summary_outputs(). Has columns
+        'quantity' (the reduction used: 'energy_cap', 'resource_area',
+        'peak_prod', 'prod' or 'con'), 'tech' and 'key' (the index in the
+        relevant Calliope results variable)
+    """
+
+    rows = []
+    for region in REGIONS_6_REGION:
+        for tech in ['nuclear', 'ccgt', 'ocgt']:
+            if region in TOPOLOGY_6_REGION[tech]:
+                rows.append(('cap_{}_{}'.format(tech, region), 'energy_cap',
+                             tech, '{}::{}_{}'.format(region, tech, region)))
+        if region in TOPOLOGY_6_REGION['wind']:
+            rows.append(('cap_wind_{}'.format(region), 'resource_area',
+                         'wind', '{}::wind_{}'.format(region, region)))
+        if region in TOPOLOGY_6_REGION['unmet']:
+            rows.append(('peak_unmet_{}'.format(region), 'peak_prod',
+                         'unmet', '{}::unmet_{}::power'.format(region,
+                                                               region)))
+        for region_from, region_to in TOPOLOGY_6_REGION['transmission']:
+            if region_from == region:
+                rows.append((
+                    'cap_transmission_{}_{}'.format(region, region_to),
+                    'energy_cap', 'transmission',
+                    '{}::transmission_{}_{}:{}'.format(region, region,
+                                                       region_to, region_to)
+                ))
+        for tech in ['nuclear', 'ccgt', 'ocgt', 'wind', 'unmet']:
+            if region in TOPOLOGY_6_REGION[tech]:
+                rows.append(('gen_{}_{}'.format(tech, region), 'prod', tech,
+                             '{}::{}_{}::power'.format(region, tech,
+                                                       region)))
+        if region in TOPOLOGY_6_REGION['demand']:
+            rows.append(('demand_{}'.format(region), 'con', 'demand',
+                         '{}::demand_power::power'.format(region)))
+
+    table = pd.DataFrame(rows, columns=['output', 'quantity', 'tech', 'key'])
+    table = table.set_index('output')
+
+    return table
+
+
+SUMMARY_OUTPUT_TABLE_6_REGION = get_summary_output_table()
+
+
 def detect_missing_leap_days(ts_data):
     """Detect if a time series has missing leap days.
 
@@ -40,6 +143,74 @@ def detect_missing_leap_days(ts_data):
     return False
 
 
+def detect_hourly_time_steps(ts_data):
+    """Detect if a time series has consecutive hourly time steps, without
+    any gaps.
+
+    Parameters:
+    -----------
+    ts_data (pandas DataFrame) : time series
+    """
+
+    time_deltas = np.diff(ts_data.index.values)
+
+    return bool((time_deltas == np.timedelta64(1, 'h')).all())
+
+
+# Names of solver options in CBC and Gurobi
+SOLVER_OPTION_NAMES = {
+    'cbc': {'threads': 'threads', 'time_limit': 'sec', 'mip_gap': 'ratio'},
+    'gurobi': {'threads': 'Threads', 'time_limit': 'TimeLimit',
+               'mip_gap': 'MIPGap'}
+}
+
+
+# Errors raised when the solver or the Calliope backend fails, e.g. the
+# solver crashes or runs out of memory. Runs that raise them are recorded
+# as failed, whereas any other error is a bug and is raised as usual
+SOLVER_ERRORS = (calliope.exceptions.BackendError, ApplicationError)
+
+
+@contextlib.contextmanager
+def _raise_unsolved_as_backend_error():
+    """Raise the error that Pyomo gives when Calliope loads the results of
+    a solve that stopped without an optimal solution (e.g. at a time
+    limit) as a Calliope BackendError, so that it is one of SOLVER_ERRORS.
+    """
+    try:
+        yield
+    except ValueError as error:
+        if 'Cannot load a SolverResults object' not in str(error):
+            raise
+        raise calliope.exceptions.BackendError(
+            'Solver stopped without an optimal solution: {}'.format(error)
+        ) from error
+
+
+def get_solver_options(solver, threads=None, time_limit=None, mip_gap=None):
+    """Get the solver options for certain settings, by the names the
+    solver uses.
+
+    Parameters:
+    -----------
+    solver (str) : 'cbc' or 'gurobi'
+    threads (int) : number of threads the solver may use
+    time_limit (float) : wall time limit of the solve, in seconds. A solve
+        that reaches it raises one of SOLVER_ERRORS, see ModelBase.run
+    mip_gap (float) : relative optimality gap at which a MILP solve stops,
+        e.g. 0.01 for 1%
+
+    Returns:
+    --------
+    solver_options (dict) : options for the settings that are not None
+    """
+
+    settings = {'threads': threads, 'time_limit': time_limit,
+                'mip_gap': mip_gap}
+    return {SOLVER_OPTION_NAMES[solver][name]: value
+            for name, value in settings.items() if value is not None}
+
+
 def get_scenario(run_mode, baseload_integer, baseload_ramping, allow_unmet):
     """Get the scenario name for different run settings.
 
@@ -71,15 +242,85 @@ def get_scenario(run_mode, baseload_integer, baseload_ramping, allow_unmet):
     return scenario
 
 
+def calliope_supports_timeseries_dataframes():
+    """Check if the installed Calliope version can read time series data
+    from pandas DataFrames (introduced in Calliope 0.6.6).
+    """
+    version = tuple(int(part) for part in
+                    re.findall(r'\d+', calliope.__version__)[:3])
+    return version >= (0, 6, 6)
+
+
+def get_ts_override_dict(model_name, ts_key='demand_wind'):
+    """Create an override dictionary that makes a Calliope model read its
+    demand and wind time series from a pandas DataFrame instead of a CSV
+    file.
+
+    Parameters:
+    -----------
+    model_name (str) : '1_region' or '6_region'
+    ts_key (str) : key of the DataFrame in the timeseries_dataframes
+        argument of the Calliope model
+
+    Returns:
+    --------
+    o_dict (dict) : A dict that can be fed as override_dict into Calliope
+        model
+    """
+
+    o_dict = {}
+    for column, (region, tech) in TS_COLUMN_LOCATIONS[model_name].items():
+        idx = 'locations.{}.techs.{}.constraints.resource'.format(region,
+                                                                   tech)
+        o_dict[idx] = 'df={}:{}'.format(ts_key, column)
+
+    return o_dict
+
+
+# Override dicts already created in this process, keyed by model name and
+# fixed capacities
+_CAP_OVERRIDE_DICT_CACHE = {}
+
+
+def get_fixed_caps(fixed_caps):
+    """Get the capacities (outputs starting with 'cap_') from model
+    outputs, as a dict of floats.
+
+    Parameters:
+    -----------
+    fixed_caps (pandas Series/DataFrame or dict) : model outputs, e.g. a
+        DataFrame created via model.get_summary_outputs. Only the first
+        column of a DataFrame is used
+
+    Returns:
+    --------
+    fixed_caps (dict) : capacity of each technology, which can be stored
+        as JSON
+    """
+    if isinstance(fixed_caps, pd.DataFrame):
+        fixed_caps = fixed_caps.iloc[:, 0]  # Change to Series
+    return {name: float(value) for name, value in fixed_caps.items()
+            if name.startswith('cap_')}
+
+
 def get_cap_override_dict(model_name, fixed_caps):
     """Create an override dictionary that can be used to set fixed
     fixed capacities in a Calliope model run.
 
+    Override dicts are cached, so that repeated calls with the same
+    capacities (e.g. one for each operation bootstrap simulation) only
+    create them once.
+
     Parameters:
     -----------
     model_name (str) : '1_region' or '6_region'
     fixed_caps (pandas Series/DataFrame or dict) : the fixed capacities.
-        A DataFrame created via model.get_summary_outputs will work.
+        A DataFrame created via model.get_summary_outputs will work. It
+        must contain a capacity for each technology in the model, else a
+        KeyError is raised. Nuclear capacities in the 6 region model are
+        split into the smallest number of equal units of at most 3GW, so
+        that capacities from continuous planning runs that are not a
+        multiple of 3GW can be operated
 
     Returns:
     --------
@@ -87,8 +328,20 @@ def get_cap_override_dict(model_name, fixed_caps):
         model in operate mode
     """
 
-    if isinstance(fixed_caps, pd.DataFrame):
-        fixed_caps = fixed_caps.iloc[:, 0]  # Change to Series
+    fixed_caps = get_fixed_caps(fixed_caps)
+
+    cache_key = (model_name, tuple(sorted(fixed_caps.items())))
+    if cache_key not in _CAP_OVERRIDE_DICT_CACHE:
+        _CAP_OVERRIDE_DICT_CACHE[cache_key] = _create_cap_override_dict(
+            model_name, fixed_caps
+        )
+
+    return dict(_CAP_OVERRIDE_DICT_CACHE[cache_key])
+
+
+def _create_cap_override_dict(model_name, fixed_caps):
+    """Create the override dictionary of get_cap_override_dict, from a
+    dict of capacities."""
 
     o_dict = {}
 
@@ -101,29 +354,36 @@ def get_cap_override_dict(model_name, fixed_caps):
                    format(tech, attribute))
             o_dict[idx] = fixed_caps['cap_{}_total'.format(tech)]
 
-    # Add baseload, peaking, wind and transmission capacities
+    # Add generation, wind and transmission capacities
     if model_name == '6_region':
-        for region in ['region{}'.format(i+1) for i in range(6)]:
-            for tech, attribute in [('baseload', 'energy_cap_equals'),
-                                    ('peaking', 'energy_cap_equals'),
-                                    ('wind', 'resource_area_equals')]:
-                try:
-                    idx = ('locations.{}.techs.{}_{}.constraints.{}'.
-                           format(region, tech, region, attribute))
-                    o_dict[idx] = (
-                        fixed_caps['cap_{}_{}'.format(tech, region)]
+        for tech in ['nuclear', 'ccgt', 'ocgt', 'wind']:
+            attribute = ('resource_area_equals' if tech == 'wind'
+                         else 'energy_cap_equals')
+            for region in TOPOLOGY_6_REGION[tech]:
+                cap = fixed_caps['cap_{}_{}'.format(tech, region)]
+                idx = 'locations.{}.techs.{}_{}.constraints.'.format(
+                    region, tech, region
+                )
+                o_dict[idx + attribute] = cap
+                if tech == 'nuclear':
+                    # Nuclear is operated in units (see the operate
+                    # override in model.yaml). The capacity is split into
+                    # the smallest number of equal units of at most 3GW,
+                    # e.g. 6GW into 2 units of 3GW and 7GW into 3 units of
+                    # 7/3GW. A capacity of 0 gives no units
+                    num_units = int(np.ceil(np.round(cap/3, 6)))
+                    o_dict[idx + 'units_max'] = num_units
+                    o_dict[idx + 'units_equals'] = num_units
+                    o_dict[idx + 'energy_cap_per_unit'] = (
+                        cap/num_units if num_units > 0 else 3
                     )
-                except KeyError:
-                    pass
-            for region_to in ['region{}'.format(i+1) for i in range(6)]:
-                tech = 'transmission'
-                idx = ('links.{},{}.techs.{}_{}_{}.constraints.energy_cap_equals'.
-                       format(region, region_to, tech, region, region_to))
-                try:
-                    o_dict[idx] = fixed_caps['cap_transmission_{}_{}'.
-                                             format(region, region_to)]
-                except KeyError:
-                    pass
+        for region_from, region_to in TOPOLOGY_6_REGION['transmission']:
+            cap = fixed_caps['cap_transmission_{}_{}'.format(region_from,
+                                                             region_to)]
+            idx = ('links.{},{}.techs.transmission_{}_{}.constraints.'
+                   'energy_cap_equals'.format(region_from, region_to,
+                                              region_from, region_to))
+            o_dict[idx] = cap
 
     if len(o_dict.keys()) == 0:
         raise AttributeError('Override dict is empty. Check if something '
@@ -152,13 +412,135 @@ def calculate_carbon_emissions(generation_levels):
     return emissions_tot
 
 
+def calculate_summary_outputs_6_region(energy_cap, resource_area,
+                                       carrier_prod, carrier_con, weights,
+                                       num_timesteps, cost=None):
+    """Calculate summary outputs of the 6 region model from its results,
+    using reductions over whole results arrays.
+
+    Parameters:
+    -----------
+    energy_cap, resource_area (pandas Series) : capacities, indexed by
+        loc_tech
+    carrier_prod, carrier_con (pandas DataFrame) : production and
+        consumption, indexed by loc_tech_carrier, with a column for each
+        time step
+    weights (pandas Series) : weight of each time step
+    num_timesteps (int or float) : number of time steps, used for
+        annualisation. For aggregated time series, the number of time
+        steps they represent (the sum of the weights)
+    cost (float) : total system cost. Not included in the outputs if None,
+        as in operate mode
+
+    Returns:
+    --------
+    outputs (pandas DataFrame) : summary outputs, as in
+        SixRegionModel.get_summary_outputs
+    """
+
+    corrfac = (8760/num_timesteps)    # For annualisation
+    table = SUMMARY_OUTPUT_TABLE_6_REGION
+
+    # Reduce time-varying results over time steps, for all technologies
+    # at once
+    carrier_prod = carrier_prod.fillna(0)
+    carrier_con = carrier_con.fillna(0)
+    reductions = {
+        'energy_cap': energy_cap,
+        'resource_area': resource_area,
+        'peak_prod': carrier_prod.max(axis=1),
+        'prod': corrfac * carrier_prod.dot(
+            weights.reindex(carrier_prod.columns)
+        ),
+        'con': -corrfac * carrier_con.dot(
+            weights.reindex(carrier_con.columns)
+        )
+    }
+
+    # Insert model outputs at regional level. Outputs that do not exist
+    # in the results are left out
+    regional = pd.Series(np.nan, index=table.index)
+    for quantity, reduction in reductions.items():
+        in_quantity = (table.quantity == quantity).values
+        regional[in_quantity] = reduction.reindex(
+            table.key[in_quantity]
+        ).values
+    exists = regional.notna().values
+    regional, table = regional[exists], table[exists]
+
+    # Insert totals: capacities, peak unmet demand, generation levels
+    # and demand levels
+    is_cap = table.quantity.isin(['energy_cap', 'resource_area'])
+    totals = regional.groupby([is_cap.values, table.quantity.values,
+                               table.tech.values]).sum()
+    cap_totals = totals.loc[True].groupby(level=1).sum()
+    prod_totals = totals.loc[False].loc['prod']
+    totals = pd.Series(dtype=float)
+    for tech in ['nuclear', 'ccgt', 'ocgt', 'wind', 'transmission']:
+        totals['cap_{}_total'.format(tech)] = cap_totals.get(tech, 0.)
+    totals['peak_unmet_total'] = (
+        regional[(table.quantity == 'peak_prod').values].sum()
+    )
+
+    # Insert total peak unmet demand -- not necessarily equal to
+    # peak_unmet_total. Total unmet capacity sums peak unmet demand
+    # across regions, whereas this is the systemwide peak unmet demand
+    unmet_keys = table.key[(table.quantity == 'prod').values
+                           & (table.tech == 'unmet').values]
+    totals['peak_unmet_systemwide'] = float(
+        carrier_prod.reindex(unmet_keys).sum(axis=0).max()
+    )
+
+    # Insert total annualised generation and unmet demand levels
+    for tech in ['nuclear', 'ccgt', 'ocgt', 'wind', 'unmet']:
+        totals['gen_{}_total'.format(tech)] = prod_totals.get(tech, 0.)
+
+    # Insert total annualised demand levels
+    totals['demand_total'] = (
+        regional[(table.quantity == 'con').values].sum()
+    )
+
+    # Insert annualised total system cost
+    # In operate mode, calliope behaves strangely, so don't insert costs.
+    # Instead calculate them manually
+    if cost is not None:
+        totals['cost_total'] = corrfac * cost
+
+    # Insert annualised carbon emissions
+    totals['emissions_total'] = calculate_carbon_emissions(
+        generation_levels={
+            'nuclear': totals['gen_nuclear_total'],
+            'ccgt': totals['gen_ccgt_total'],
+            'ocgt': totals['gen_ocgt_total'],
+            'wind': totals['gen_wind_total'],
+            'unmet': totals['gen_unmet_total']
+        }
+    )
+
+    outputs = pd.DataFrame(pd.concat([regional, totals]),
+                           columns=['output'])
+
+    return outputs
+
+
+def get_operation_window(num_timesteps):
+    """Get the operation_window (see ModelBase) of an operate mode model
+    on a time series with num_timesteps time steps: the whole time series
+    if it is shorter than the operation horizon, so that it is solved in a
+    single window, else None."""
+    if num_timesteps < OPERATION_HORIZON_HOURS:
+        return num_timesteps
+    return None
+
+
 class ModelBase(calliope.Model):
     """Instance of either 1-region or 6-region model."""
 
     def __init__(self, model_name, ts_data, run_mode,
                  baseload_integer=False, baseload_ramping=False,
                  allow_unmet=False, fixed_caps=None, extra_override=None,
-                 run_id=0):
+                 run_id=0, ts_in_memory=True, timer=None,
+                 solver_options=None, operation_window=None):
         """
         Create instance of either 1-region or 6-region model.
 
@@ -178,6 +560,20 @@ class ModelBase(calliope.Model):
         extra_override (str) : name of additional override, to customise
             model. The override should be defined in the relevant model.yaml
         run_id (int) : can be changed if multiple models are run in parallel
+        ts_in_memory (bool) : pass the time series to Calliope directly as
+            a DataFrame. If False, or if the installed Calliope version does
+            not support this, the time series is written to a CSV file in a
+            temporary copy of the model directory instead
+        timer (timing.PhaseTimer) : timer in which to record the time taken
+            by each phase of building and running the model. A new timer is
+            created if None, available as self.timer
+        solver_options (dict) : options passed to the solver, e.g. the
+            number of threads or a time limit, see get_solver_options. If
+            None, the solver's defaults are used
+        operation_window (int) : if given, operate mode solves windows of
+            this many time steps, with no horizon beyond each window,
+            instead of the window and horizon in model.yaml. Time series
+            shorter than that horizon can then be solved in one window
         """
 
         if model_name not in ['1_region', '6_region']:
@@ -188,6 +584,12 @@ class ModelBase(calliope.Model):
         self.run_mode = run_mode
         self.base_dir = os.path.join('models', model_name)
         self.num_timesteps = ts_data.shape[0]
+        # Length of the time series the time steps represent, used for
+        # annualisation: more than num_timesteps for aggregated time series
+        self.num_represented_timesteps = (
+            float(ts_data.loc[:, 'weight'].sum())
+            if 'weight' in ts_data.columns else self.num_timesteps
+        )
 
         # Create scenarios and overrides
         scenario = get_scenario(run_mode, baseload_integer,
@@ -196,22 +598,49 @@ class ModelBase(calliope.Model):
             scenario = ','.join((scenario, extra_override))
         override_dict = (get_cap_override_dict(model_name, fixed_caps)
                          if fixed_caps is not None else None)
-
-        # Calliope requires a CSV file of the time series data to be present
-        # at time of initialisation. This creates a new directory with the
-        # model files and data for the model, then deletes it once the model
-        # exists in Python
-        self._base_dir_iter = self.base_dir + '_' + str(run_id)
-        if os.path.exists(self._base_dir_iter):
-            shutil.rmtree(self._base_dir_iter)
-        shutil.copytree(self.base_dir, self._base_dir_iter)
-        ts_data = self._create_init_time_series(ts_data)
-        ts_data.to_csv(os.path.join(self._base_dir_iter, 'demand_wind.csv'))
-        super(ModelBase, self).__init__(os.path.join(self._base_dir_iter,
-                                                     'model.yaml'),
-                                        scenario=scenario,
-                                        override_dict=override_dict)
-        shutil.rmtree(self._base_dir_iter)
+        if solver_options:
+            override_dict = dict(override_dict or {})
+            for name, value in solver_options.items():
+                override_dict['run.solver_options.{}'.format(name)] = value
+        if operation_window is not None:
+            override_dict = dict(override_dict or {})
+            override_dict['run.operation.window'] = operation_window
+            override_dict['run.operation.horizon'] = operation_window
+        self.timer = timer if timer is not None else timing.PhaseTimer()
+        with self.timer.phase('ts_preparation'):
+            ts_data = self._create_init_time_series(ts_data)
+
+        if ts_in_memory and calliope_supports_timeseries_dataframes():
+            # Point the time series entries in the model definition at the
+            # DataFrame, leaving the model files on disk untouched
+            ts_override_dict = get_ts_override_dict(model_name)
+            if override_dict is not None:
+                ts_override_dict.update(override_dict)
+            with self.timer.phase('model_build'):
+                super(ModelBase, self).__init__(
+                    os.path.join(self.base_dir, 'model.yaml'),
+                    scenario=scenario,
+                    override_dict=ts_override_dict,
+                    timeseries_dataframes={'demand_wind': ts_data}
+                )
+        else:
+            # Calliope requires a CSV file of the time series data to be
+            # present at time of initialisation. This creates a new
+            # directory with the model files and data for the model, then
+            # deletes it once the model exists in Python
+            with self.timer.phase('model_build'):
+                self._base_dir_iter = self.base_dir + '_' + str(run_id)
+                if os.path.exists(self._base_dir_iter):
+                    shutil.rmtree(self._base_dir_iter)
+                shutil.copytree(self.base_dir, self._base_dir_iter)
+                ts_data.to_csv(os.path.join(self._base_dir_iter,
+                                            'demand_wind.csv'))
+                super(ModelBase, self).__init__(
+                    os.path.join(self._base_dir_iter, 'model.yaml'),
+                    scenario=scenario,
+                    override_dict=override_dict
+                )
+                shutil.rmtree(self._base_dir_iter)
 
         # Adjust weights if these are included in ts_data
         if 'weight' in ts_data.columns:
@@ -224,6 +653,80 @@ class ModelBase(calliope.Model):
             logging.warning('No fixed capacities passed into model call. '
                             'Will read fixed capacities from model.yaml')
 
+    def run(self, *args, **kwargs):
+        """Run model, recording the time taken to generate the optimisation
+        problem ('backend_generation') and to solve it ('solve') in
+        self.timer.
+
+        The split between the two uses the timings logged by Calliope, and
+        is only made in plan mode. In operate mode, where Calliope solves
+        many windows, the whole run is recorded as 'solve'. A solve that
+        stops without an optimal solution, e.g. at a time limit, raises a
+        Calliope BackendError.
+        """
+        with self.timer.phase('run'), _raise_unsolved_as_backend_error():
+            super(ModelBase, self).run(*args, **kwargs)
+        calliope_timings = getattr(self, '_timings', {})
+        if (self.run_mode == 'plan' and 'run_start' in calliope_timings
+                and 'run_backend_model_generated' in calliope_timings):
+            run_time = self.timer.phases['run']['time']
+            generation_time = (
+                calliope_timings['run_backend_model_generated']
+                - calliope_timings['run_start']
+            ).total_seconds()
+            self.timer.split_phase('run', {
+                'backend_generation': generation_time,
+                'solve': run_time - generation_time
+            })
+        else:
+            self.timer.split_phase('run', {
+                'solve': self.timer.phases['run']['time']
+            })
+
+    def rerun_with_time_series(self, ts_data):
+        """Solve the model again with new demand and wind time series,
+        reusing the optimisation problem built by the last call of run.
+
+        Only the resource (demand and wind) parameters are updated, so the
+        new time series must have the same number of time steps as the one
+        the model was created with. Time step weights are not updated.
+        Calliope builds a new problem for each window in operate mode, so
+        this only works in plan mode.
+
+        Parameters:
+        -----------
+        ts_data (pandas DataFrame) : time series with demand and wind data
+        """
+
+        if self.run_mode != 'plan':
+            raise ValueError('Can only rerun with new time series in '
+                             'plan mode.')
+        if not hasattr(self, '_backend_model'):
+            raise AttributeError('Optimisation problem has not been built: '
+                                 'call self.run() first.')
+        if ts_data.shape[0] != self.num_timesteps:
+            raise ValueError('New time series must have {} time steps.'.
+                             format(self.num_timesteps))
+
+        with self.timer.phase('ts_preparation'):
+            ts_data = self._create_init_time_series(ts_data)
+        with self.timer.phase('backend_generation'):
+            timesteps = list(self._backend_model.timesteps)
+            for column, (region, tech) in (
+                    TS_COLUMN_LOCATIONS[self.model_name].items()):
+                loc_tech = '{}::{}'.format(region, tech)
+                self.backend.update_param('resource', {
+                    (loc_tech, timestep): value for timestep, value
+                    in zip(timesteps, ts_data.loc[:, column].values)
+                })
+
+        # Calliope returns a new model with the updated inputs and results
+        with self.timer.phase('solve'), _raise_unsolved_as_backend_error():
+            new_model = self.backend.rerun()
+        self._model_data = new_model._model_data
+        self.inputs = new_model.inputs
+        self.results = new_model.results
+
     def _create_init_time_series(self, ts_data):
         """Create demand and wind time series data for Calliope model
         initialisation.
@@ -249,6 +752,16 @@ class ModelBase(calliope.Model):
                                                periods=self.num_timesteps,
                                                freq='h')
 
+        # Calliope weights each time step by the time until the next one,
+        # so gaps in the index (e.g. in data made of separate weeks) would
+        # give the steps before them too much weight -- reset index if so
+        if not detect_hourly_time_steps(ts_data_used):
+            logging.warning('Gaps detected in input time series index. '
+                            'Time series index reset to start in 2020.')
+            ts_data_used.index = pd.date_range(start='2020-01-01',
+                                               periods=self.num_timesteps,
+                                               freq='h')
+
         # Demand must be negative for Calliope
         ts_data_used.loc[:, ts_data.columns.str.contains('demand')] = (
             -ts_data_used.loc[:, ts_data.columns.str.contains('demand')]
@@ -262,7 +775,9 @@ class SixRegionModel(ModelBase):
 
     def __init__(self, ts_data, run_mode, baseload_integer=False,
                  baseload_ramping=False, allow_unmet=False,
-                 fixed_caps=None, extra_override=None, run_id=0):
+                 fixed_caps=None, extra_override=None, run_id=0,
+                 ts_in_memory=True, timer=None, solver_options=None,
+                 operation_window=None):
         """Initialize model from ModelBase parent."""
         super(SixRegionModel, self).__init__(
             model_name='6_region',
@@ -273,146 +788,55 @@ class SixRegionModel(ModelBase):
             allow_unmet=allow_unmet,
             fixed_caps=fixed_caps,
             extra_override=extra_override,
-            run_id=run_id
+            run_id=run_id,
+            ts_in_memory=ts_in_memory,
+            timer=timer,
+            solver_options=solver_options,
+            operation_window=operation_window
         )
 
+    def run(self, *args, **kwargs):
+        """Run model, discarding any previously extracted outputs.
+        See ModelBase."""
+        self._summary_outputs = None
+        super(SixRegionModel, self).run(*args, **kwargs)
+
+    def rerun_with_time_series(self, ts_data):
+        """Rerun model with new time series, see ModelBase."""
+        self._summary_outputs = None
+        super(SixRegionModel, self).rerun_with_time_series(ts_data)
+
     def get_summary_outputs(self):
-        """Create pandas DataFrame of subset of relevant model outputs."""
+        """Create pandas DataFrame of subset of relevant model outputs.
+
+        The outputs are only calculated once after each run, and a copy is
+        returned on every call.
+        """
 
         assert hasattr(self, 'results'), \
             'Model outputs have not been calculated: call self.run() first.'
 
-        outputs = pd.DataFrame(columns=['output'])    # Output DataFrame
-        corrfac = (8760/self.num_timesteps)    # For annualisation
-
-        # Insert model outputs at regional level
-        for region in ['region{}'.format(i+1) for i in range(6)]:
-
-            # Nuclear, CCGT and OCGT capacities
-            for tech in ['nuclear', 'ccgt', 'ocgt']:
-                try:
-                    outputs.loc['cap_{}_{}'.format(tech, region)] = (
-                        float(self.results.energy_cap.loc[
-                            '{}::{}_{}'.format(region, tech, region)
-                        ])
-                    )
-                except KeyError:
-                    pass
-
-            # Wind capacity
-            for tech in ['wind']:
-                try:
-                    outputs.loc['cap_{}_{}'.format(tech, region)] = (
-                        float(self.results.resource_area.loc[
-                            '{}::{}_{}'.format(region, tech, region)
-                        ])
-                    )
-                except KeyError:
-                    pass
-
-            # Peak unmet demand
-            for tech in ['unmet']:
-                try:
-                    outputs.loc['peak_unmet_{}'.format(region)] = (
-                        float(self.results.carrier_prod.loc[
-                            '{}::{}_{}::power'.format(region, tech, region)
-                        ].max())
-                    )
-                except KeyError:
-                    pass
-
-            # Transmission capacity
-            for tech in ['transmission']:
-                for region_to in ['region{}'.format(i+1) for i in range(6)]:
-                    # No double counting of links -- one way only
-                    if int(region[-1]) < int(region_to[-1]):
-                        try:
-                            outputs.loc['cap_transmission_{}_{}'.format(
-                                region, region_to
-                            )] = float(self.results.energy_cap.loc[
-                                '{}::{}_{}_{}:{}'.format(region,
-                                                         tech,
-                                                         region,
-                                                         region_to,
-                                                         region_to)
-                            ])
-                        except KeyError:
-                            pass
-
-            # Nuclear, CCGT, OCGT, wind and unmet generation levels
-            for tech in ['nuclear', 'ccgt', 'ocgt', 'wind', 'unmet']:
-                try:
-                    outputs.loc['gen_{}_{}'.format(tech, region)] = (
-                        corrfac * float(
-                            (self.results.carrier_prod.loc[
-                                '{}::{}_{}::power'.format(region,
-                                                          tech,
-                                                          region)]
-                             *self.inputs.timestep_weights).sum()
-                        )
-                    )
-                except KeyError:
-                    pass
-
-            # Demand levels
-            try:
-                outputs.loc['demand_{}'.format(region)] = -corrfac * float(
-                    (self.results.carrier_con.loc[
-                        '{}::demand_power::power'.format(region)]
-                     * self.inputs.timestep_weights).sum()
-                )
-            except KeyError:
-                pass
-
-        # Insert total capacities
-        for tech in ['nuclear', 'ccgt', 'ocgt', 'wind', 'transmission']:
-            outputs.loc['cap_{}_total'.format(tech)] = outputs.loc[
-                outputs.index.str.contains('cap_{}'.format(tech))
-            ].sum()
-
-        outputs.loc['peak_unmet_total'] = outputs.loc[
-            outputs.index.str.contains('peak_unmet')
-        ].sum()
-
-        # Insert total peak unmet demand -- not necessarily equal to
-        # peak_unmet_total. Total unmet capacity sums peak unmet demand
-        # across regions, whereas this is the systemwide peak unmet demand
-        outputs.loc['peak_unmet_systemwide'] = float(self.results.carrier_prod.loc[
-            self.results.carrier_prod.loc_tech_carriers_prod.str.contains(
-                'unmet')].sum(axis=0).max())
-
-        # Insert total annualised generation and unmet demand levels
-        for tech in ['nuclear', 'ccgt', 'ocgt', 'wind', 'unmet']:
-            outputs.loc['gen_{}_total'.format(tech)] = outputs.loc[
-                outputs.index.str.contains('gen_{}'.format(tech))
-            ].sum()
+        if getattr(self, '_summary_outputs', None) is None:
+            with self.timer.phase('output_extraction'):
+                self._summary_outputs = self._calculate_summary_outputs()
 
-        # Insert total annualised demand levels
-        outputs.loc['demand_total'] = (
-            outputs.loc[outputs.index.str.contains('demand')].sum()
-        )
+        return self._summary_outputs.copy()
 
-        # Insert annualised total system cost
-        # In operate mode, calliope behaves strangely, so don't insert costs.
-        # Instead calculate them manually
-        if self.run_mode != 'operate':
-            outputs.loc['cost_total'] = (
-                corrfac * float(self.results.cost.sum())
-            )
-
-        # Insert annualised carbon emissions
-        outputs.loc['emissions_total'] = calculate_carbon_emissions(
-            generation_levels={
-                'nuclear': outputs.loc['gen_nuclear_total'],
-                'ccgt': outputs.loc['gen_ccgt_total'],
-                'ocgt': outputs.loc['gen_ocgt_total'],
-                'wind': outputs.loc['gen_wind_total'],
-                'unmet': outputs.loc['gen_unmet_total']
-            }
+    def _calculate_summary_outputs(self):
+        """Calculate summary outputs from the Calliope results, using
+        reductions over whole results arrays.
+        """
+        return calculate_summary_outputs_6_region(
+            energy_cap=self.results.energy_cap.to_pandas(),
+            resource_area=self.results.resource_area.to_pandas(),
+            carrier_prod=self.results.carrier_prod.to_pandas(),
+            carrier_con=self.results.carrier_con.to_pandas(),
+            weights=self.inputs.timestep_weights.to_pandas(),
+            num_timesteps=self.num_represented_timesteps,
+            cost=(float(self.results.cost.sum())
+                  if self.run_mode != 'operate' else None)
         )
 
-        return outputs
-
 
 if __name__ == '__main__':
     raise NotImplementedError()
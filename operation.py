@@ -0,0 +1,586 @@
+"""Faster ways of running the 'operation' model, which approximate a
+single solve of the model across the whole time series.
+
+These are standalone tools: the BUQ algorithm in buq.py, e.g.
+buq.calculate_point_estimate_and_stdev, always solves the operation model
+on each whole sample. Call them directly, after checking their accuracy
+with check_block_accuracy or compare_with_sequential.
+"""
+
+
+import os
+import time
+import hashlib
+import logging
+import tempfile
+import concurrent.futures
+import numpy as np
+import pandas as pd
+import buq
+import models
+import storage
+
+
+# Dispatch and capacities in the solution of a block, see _solve_block
+SOLUTION_NAMES = ['carrier_prod', 'carrier_con', 'energy_cap',
+                  'resource_area']
+
+
+class BlockSolutionCache:
+    """Solutions of the 'operation' model on the individual weeks (blocks)
+    from which 'weeks' scheme bootstrap samples are made.
+
+    In operate mode, capacities are fixed, so the dispatch in each week
+    depends only on that week's demand and wind, apart from the state at
+    the start of the week (e.g. nuclear ramping). Each block is therefore
+    solved once, preceded by a lead-in of the hours before it in the data
+    to approximate its starting state. The outputs of a bootstrap sample
+    are then assembled from the dispatch of its blocks, without solving.
+
+    Accuracy: the assembled outputs differ from a solve across the whole
+    sample in two ways. The starting state of each week comes from the
+    data instead of from the previous week in the sample, and there are
+    no ramping constraints between consecutive weeks of a sample. Both
+    only affect the first hours of each week, so the differences are
+    usually small, but they depend on the capacities and the lead-in. Use
+    check_block_accuracy to measure them before relying on the cache.
+    """
+
+    def __init__(self, fixed_caps=None, lead_in_hours=24, cache_dir=None,
+                 ts_data_path=None):
+        """Create cache of block solutions.
+
+        Parameters:
+        -----------
+        fixed_caps (pandas DataFrame or Series) : capacities of the
+            operation model, see buq.run_simulation. If None, the
+            capacities in model.yaml are used
+        lead_in_hours (int) : number of hours before each block included
+            in its solve, and discarded afterwards
+        cache_dir (str) : if given, block solutions are also stored in this
+            directory, so that they can be reused in later runs
+        ts_data_path (str) : CSV file with the time series data. Defaults
+            to buq.TS_DATA_PATH
+        """
+
+        # Not a default argument, since buq may not be fully imported yet
+        # when this module is (tests imports both)
+        if ts_data_path is None:
+            ts_data_path = buq.TS_DATA_PATH
+        self.fixed_caps = fixed_caps
+        self.lead_in_hours = lead_in_hours
+        self.cache_dir = cache_dir
+        self.ts_data_path = ts_data_path
+        self.ts_data = buq.import_time_series_data(ts_data_path)
+        self.block_index = buq.get_season_block_index(self.ts_data)
+        self._blocks = {}
+
+        # Stored block solutions are only valid for the same inputs
+        self._inputs_hash = hashlib.sha256('{}_{}'.format(
+            buq.get_simulation_key('operation', self.ts_data,
+                                   fixed_caps=fixed_caps),
+            lead_in_hours
+        ).encode()).hexdigest()[:16]
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _get_block_rows(self, year_num, season, startday):
+        """Data row numbers of the lead-in and the block, and the length
+        of the lead-in (shorter at the start of the data)."""
+        block_start = (self.block_index['offsets'][year_num, season]
+                       + 24*startday)
+        rows = self.block_index['rows'][block_start + np.arange(7*24)]
+        lead_in = np.arange(max(rows[0] - self.lead_in_hours, 0), rows[0])
+        return np.concatenate([lead_in, rows]), len(lead_in)
+
+    def _get_block_path(self, block):
+        """Path of the file of a block solution in cache_dir."""
+        return os.path.join(self.cache_dir, '{}_{}_{}_{}.npz'.format(
+            self._inputs_hash, *block
+        ))
+
+    def _load_block(self, block):
+        """Load a block solution from cache_dir, or None if not stored."""
+        if self.cache_dir is None:
+            return None
+        path = self._get_block_path(block)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as arrays:
+            if 'status' not in arrays:
+                return None    # Stored before solve statuses were kept
+            solution = {name: pd.Series(arrays[name + '_values'],
+                                        index=arrays[name + '_index'])
+                        if arrays[name + '_values'].ndim == 1 else
+                        pd.DataFrame(arrays[name + '_values'],
+                                     index=arrays[name + '_index'])
+                        for name in SOLUTION_NAMES}
+            solution['status'] = str(arrays['status'])
+        return solution
+
+    def _save_block(self, block, solution):
+        """Store a block solution in cache_dir. Failed solves are not
+        stored, so that they are tried again in later runs."""
+        if self.cache_dir is None or solution['status'] == 'failed':
+            return
+        path = self._get_block_path(block)
+        arrays = {'status': np.array(solution['status'])}
+        for name in SOLUTION_NAMES:
+            values = solution[name]
+            arrays[name + '_values'] = values.values
+            arrays[name + '_index'] = np.array(values.index, dtype=str)
+        storage._save_npz_atomic(path, **arrays)
+
+    def solve_blocks(self, blocks, num_workers=1):
+        """Solve the blocks that are not in the cache yet.
+
+        Parameters:
+        -----------
+        blocks (iterable) : blocks, as (year_num, season, startday)
+        num_workers (int) : number of processes over which to solve the
+            blocks. 1 solves them one after another
+        """
+
+        missing = []
+        for block in sorted(set(blocks)):
+            if block in self._blocks:
+                continue
+            solution = self._load_block(block)
+            if solution is not None:
+                self._blocks[block] = solution
+            else:
+                missing.append(block)
+        if len(missing) == 0:
+            return
+        logging.info('Solving %s blocks of the operation model.',
+                     len(missing))
+
+        tasks = []
+        for block in missing:
+            rows, num_lead_in = self._get_block_rows(*block)
+            tasks.append((block,
+                          buq._sample_to_dataframe(self.ts_data.values[rows]),
+                          num_lead_in))
+        if num_workers == 1:
+            solutions = (_solve_block(block_data, num_lead_in,
+                                      self.fixed_caps)
+                         for _, block_data, num_lead_in in tasks)
+            for (block, _, _), solution in zip(tasks, solutions):
+                self._blocks[block] = solution
+                self._save_block(block, solution)
+            return
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=num_workers) as executor:
+            futures = {
+                executor.submit(_solve_block, block_data, num_lead_in,
+                                self.fixed_caps): block
+                for block, block_data, num_lead_in in tasks
+            }
+            for future in concurrent.futures.as_completed(futures):
+                block = futures[future]
+                self._blocks[block] = future.result()
+                self._save_block(block, self._blocks[block])
+
+    def get_sample_outputs(self, year_nums, startdays):
+        """Assemble the outputs of the operation model on a bootstrap
+        sample from the solutions of its blocks, solving any blocks that
+        are not in the cache yet.
+
+        Parameters:
+        -----------
+        year_nums, startdays (arrays, shape (num_weeks_per_season, 4)) :
+            the weeks of the sample, see buq.draw_weeks
+
+        Returns:
+        --------
+        results (pandas DataFrame) : model outputs, as from
+            buq.run_simulation. Consistency is not checked. The status of
+            the sample is the worst status of its blocks, and its model
+            outputs are NaN if any block failed
+        """
+
+        start = time.time()
+        blocks = [(int(year_nums[week, season]), season,
+                   int(startdays[week, season]))
+                  for week in range(year_nums.shape[0])
+                  for season in range(4)]    # Same order as in the sample
+        self.solve_blocks(blocks)
+        solutions = [self._blocks[block] for block in blocks]
+        status = _get_worst_status(solution['status']
+                                   for solution in solutions)
+
+        if status == 'failed':
+            results = pd.DataFrame(columns=['output'], dtype=float)
+        else:
+            carrier_prod, carrier_con = [
+                pd.concat([solution[name] for solution in solutions],
+                          axis=1, ignore_index=True)
+                for name in ['carrier_prod', 'carrier_con']
+            ]
+            num_timesteps = carrier_prod.shape[1]
+            results = models.calculate_summary_outputs_6_region(
+                energy_cap=solutions[0]['energy_cap'],
+                resource_area=solutions[0]['resource_area'],
+                carrier_prod=carrier_prod,
+                carrier_con=carrier_con,
+                weights=pd.Series(1., index=carrier_prod.columns),
+                num_timesteps=num_timesteps
+            )
+        results.loc['time'] = time.time() - start
+        results.loc['consistency_check'] = np.nan
+        results.loc['status'] = buq.RUN_STATUSES.index(status)
+
+        return results
+
+
+def _get_worst_status(statuses):
+    """Worst of several run statuses, in the order of buq.RUN_STATUSES."""
+    return buq.RUN_STATUSES[max(buq.RUN_STATUSES.index(status)
+                                for status in statuses)]
+
+
+def _solve_block(ts_data, num_lead_in, fixed_caps):
+    """Solve the operation model on consecutive hours (a block or chunk)
+    preceded by a lead-in, and return their dispatch without the lead-in.
+    ts_data (pandas DataFrame) may include time step weights ('weight').
+    If it is shorter than the operation horizon, it is solved in a single
+    window, as Calliope cannot run the operation model on it otherwise.
+
+    The solution has the status of the solve ('status', see
+    buq.RUN_STATUSES). Errors of the solver or the Calliope backend
+    (models.SOLVER_ERRORS) are logged, and give status 'failed' and no
+    dispatch or capacities.
+    """
+    try:
+        model = models.SixRegionModel(
+            ts_data=ts_data, fixed_caps=fixed_caps,
+            operation_window=models.get_operation_window(ts_data.shape[0]),
+            **buq.MODELS_IN_PAPER['operation']
+        )
+        model.run()
+        status = buq._get_run_status(model)
+    except models.SOLVER_ERRORS:
+        logging.exception('Operation model block failed.')
+        status = 'failed'
+    if status != 'optimal':
+        logging.warning('Operation model block was not solved to '
+                        'optimality: %s.', status)
+    if status == 'failed':
+        return {'status': status}
+    return {
+        'carrier_prod': model.results.carrier_prod.to_pandas().fillna(0)
+        .iloc[:, num_lead_in:],
+        'carrier_con': model.results.carrier_con.to_pandas().fillna(0)
+        .iloc[:, num_lead_in:],
+        'energy_cap': model.results.energy_cap.to_pandas(),
+        'resource_area': model.results.resource_area.to_pandas(),
+        'status': status
+    }
+
+
+def run_block_bootstrap_simulations(block_cache, num_weeks_per_season,
+                                    sample_nums, seed, num_workers=1):
+    """Calculate the outputs of the operation model on 'weeks' scheme
+    bootstrap samples from a BlockSolutionCache, yielding
+    (sample_num, outputs) for each sample.
+
+    The samples are the same as those of buq.run_bootstrap_simulation with
+    rng=buq.get_sample_rng(seed, sample_num). All blocks they need are
+    solved first, in parallel if num_workers > 1.
+    """
+
+    sample_nums = list(sample_nums)
+    weeks = {}
+    for sample_num in sample_nums:
+        year_nums, startdays = buq.draw_weeks(
+            block_cache.ts_data, num_weeks_per_season, num_samples=1,
+            rng=buq.get_sample_rng(seed, sample_num)
+        )
+        weeks[sample_num] = (year_nums[0], startdays[0])
+    block_cache.solve_blocks(
+        [(int(year_nums[week, season]), season,
+          int(startdays[week, season]))
+         for year_nums, startdays in weeks.values()
+         for week in range(num_weeks_per_season) for season in range(4)],
+        num_workers=num_workers
+    )
+    for sample_num in sample_nums:
+        yield sample_num, block_cache.get_sample_outputs(
+            *weeks[sample_num]
+        ).loc[:, 'output']
+
+
+def check_block_accuracy(block_cache, num_weeks_per_season, num_samples,
+                         seed=0):
+    """Compare the outputs assembled from a BlockSolutionCache against
+    full solves of the operation model on the same bootstrap samples.
+
+    Parameters:
+    -----------
+    block_cache (BlockSolutionCache) : cache to check
+    num_weeks_per_season (int) : number of weeks per season of samples
+    num_samples (int) : number of samples to compare
+    seed (int) : master seed of the samples
+
+    Returns:
+    --------
+    errors (pandas DataFrame) : for each output, the mean and maximum
+        absolute difference between the assembled and full outputs, and
+        the maximum difference relative to the full output
+    """
+
+    outputs = pd.DataFrame({
+        sample_num: outputs for sample_num, outputs in
+        run_block_bootstrap_simulations(block_cache, num_weeks_per_season,
+                                        range(num_samples), seed)
+    })
+    full_outputs = pd.DataFrame({
+        sample_num: buq.run_simulation(
+            'operation',
+            ts_data=buq.create_bootstrap_sample(
+                'weeks', num_weeks_per_season,
+                rng=buq.get_sample_rng(seed, sample_num),
+                ts_data_path=block_cache.ts_data_path
+            ),
+            run_id=sample_num,
+            check_consistency=False,
+            fixed_caps=block_cache.fixed_caps
+        ).loc[:, 'output']
+        for sample_num in range(num_samples)
+    })
+    errors = _compare_outputs(outputs, full_outputs)
+    logging.info('Block cache accuracy against full solves:\n%s', errors)
+
+    return errors
+
+
+def _compare_outputs(outputs, full_outputs):
+    """Differences between approximate and full outputs (pandas
+    DataFrames, one column per simulation), as in check_block_accuracy."""
+    outputs = outputs.drop(index=buq.RUN_INFO_OUTPUTS)
+    full_outputs = full_outputs.loc[outputs.index]
+    difference = (outputs - full_outputs).abs()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        relative = difference / full_outputs.abs()
+    return pd.DataFrame({
+        'mean_abs_error': difference.mean(axis=1),
+        'max_abs_error': difference.max(axis=1),
+        'max_rel_error': relative.where(full_outputs.abs() > 1e-6,
+                                        0.).max(axis=1)
+    })
+
+
+def get_operation_chunks(num_timesteps, num_chunks,
+                         window_hours=models.OPERATION_WINDOW_HOURS):
+    """Split the time steps of an operation run into consecutive chunks of
+    whole operation windows, as (start, end) time step numbers.
+
+    Parameters:
+    -----------
+    num_timesteps (int) : number of time steps of the run
+    num_chunks (int) : maximum number of chunks. There are fewer if the run
+        has fewer windows than this
+    window_hours (int) : length of an operation window, see
+        models/6_region/model.yaml
+
+    Returns:
+    --------
+    chunks (list) : (start, end) of each chunk, end excluded
+    """
+
+    num_windows = int(np.ceil(num_timesteps / window_hours))
+    num_chunks = max(min(num_chunks, num_windows), 1)
+    window_bounds = np.linspace(0, num_windows, num_chunks + 1).round()
+    bounds = np.minimum(window_bounds.astype(int) * window_hours,
+                        num_timesteps)
+    return [(int(start), int(end)) for start, end in
+            zip(bounds[:-1], bounds[1:])]
+
+
+def solve_operation_chunks(ts_data, num_chunks, lead_in_hours=168,
+                           num_workers=None, fixed_caps=None):
+    """Solve the operation model on a long time series as chunks solved
+    in parallel, and stitch their dispatch back together.
+
+    Calliope solves the operation model one window after another, each
+    starting from the state at the end of the previous one. Here, each
+    chunk is instead preceded by a lead-in of the hours before it, which
+    is solved and discarded, to approximate its starting state (e.g. the
+    nuclear ramping state). Use compare_with_sequential to measure how far
+    the result deviates from the sequential solve.
+
+    Parameters:
+    -----------
+    ts_data (pandas DataFrame) : time series data, optionally with time
+        step weights in a column 'weight' (see
+        aggregation.aggregate_time_series)
+    num_chunks (int) : number of chunks, see get_operation_chunks
+    lead_in_hours (int) : number of hours before each chunk included in
+        its solve
+    num_workers (int) : number of processes over which the chunks are
+        solved. If None, one per chunk
+    fixed_caps (pandas DataFrame or Series) : capacities of the operation
+        model, see buq.run_simulation
+
+    Returns:
+    --------
+    solution (dict) : dispatch ('carrier_prod', 'carrier_con', pandas
+        DataFrames with the time steps of ts_data as columns), capacities
+        ('energy_cap', 'resource_area', pandas Series) and the worst
+        status of the chunks ('status', see buq.RUN_STATUSES). If any
+        chunk failed, only the status
+    """
+
+    chunks = get_operation_chunks(ts_data.shape[0], num_chunks)
+    if num_workers is None:
+        num_workers = len(chunks)
+    tasks = []
+    for start, end in chunks:
+        lead_in_start = max(start - lead_in_hours, 0)
+        tasks.append((ts_data.iloc[lead_in_start:end],
+                      start - lead_in_start))
+    logging.info('Solving operation model as %s chunks over %s workers.',
+                 len(chunks), num_workers)
+    if num_workers == 1 or len(chunks) == 1:
+        solutions = [_solve_block(chunk_data, num_lead_in, fixed_caps)
+                     for chunk_data, num_lead_in in tasks]
+    else:
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=num_workers) as executor:
+            solutions = list(executor.map(
+                _solve_block, *zip(*tasks),
+                [fixed_caps] * len(tasks)
+            ))
+
+    status = _get_worst_status(chunk_solution['status']
+                               for chunk_solution in solutions)
+    if status == 'failed':
+        return {'status': status}
+    solution = {'energy_cap': solutions[0]['energy_cap'],
+                'resource_area': solutions[0]['resource_area'],
+                'status': status}
+    for name in ['carrier_prod', 'carrier_con']:
+        solution[name] = pd.concat([chunk_solution[name]
+                                    for chunk_solution in solutions],
+                                   axis=1, ignore_index=True)
+        solution[name].columns = ts_data.index
+
+    return solution
+
+
+def run_parallel_operation_simulation(ts_data, num_chunks,
+                                      lead_in_hours=168, num_workers=None,
+                                      fixed_caps=None):
+    """Run the operation model on a long time series with
+    solve_operation_chunks, as an approximation of buq.run_simulation.
+
+    Returns:
+    --------
+    results (pandas DataFrame) : model outputs, as from
+        buq.run_simulation. Consistency is not checked. The status of the
+        run is the worst status of its chunks, and its model outputs are
+        NaN if any chunk failed
+    solution (dict) : stitched dispatch, see solve_operation_chunks
+    """
+
+    start = time.time()
+    solution = solve_operation_chunks(ts_data, num_chunks,
+                                      lead_in_hours=lead_in_hours,
+                                      num_workers=num_workers,
+                                      fixed_caps=fixed_caps)
+    if solution['status'] == 'failed':
+        results = pd.DataFrame(columns=['output'], dtype=float)
+    else:
+        if 'weight' in ts_data.columns:
+            weights = ts_data.loc[:, 'weight']
+        else:
+            weights = pd.Series(1., index=ts_data.index)
+        results = models.calculate_summary_outputs_6_region(
+            energy_cap=solution['energy_cap'],
+            resource_area=solution['resource_area'],
+            carrier_prod=solution['carrier_prod'],
+            carrier_con=solution['carrier_con'],
+            weights=weights,
+            num_timesteps=float(weights.sum())
+        )
+    results.loc['time'] = time.time() - start
+    results.loc['consistency_check'] = np.nan
+    results.loc['status'] = buq.RUN_STATUSES.index(solution['status'])
+
+    return results, solution
+
+
+def compare_with_sequential(ts_data, num_chunks, lead_in_hours=168,
+                            num_workers=None, fixed_caps=None):
+    """Compare a parallel operation run (run_parallel_operation_simulation)
+    against the usual sequential solve of the operation model.
+
+    Returns:
+    --------
+    errors (pandas DataFrame) : for each summary output, the absolute and
+        relative difference between the parallel and sequential outputs
+        (see check_block_accuracy), and for each technology's hourly
+        production ('dispatch: <loc_tech_carrier>'), the mean and maximum
+        absolute difference (to float32 precision, as stored in a
+        storage.ResultStore). Empty if either run is not solved to
+        optimality
+    """
+
+    outputs, solution = run_parallel_operation_simulation(
+        ts_data, num_chunks, lead_in_hours=lead_in_hours,
+        num_workers=num_workers, fixed_caps=fixed_caps
+    )
+    with tempfile.TemporaryDirectory() as store_dir:
+        result_store = storage.ResultStore(store_dir, store_dispatch=True)
+        full_outputs = buq.run_simulation(
+            'operation', ts_data, check_consistency=False,
+            fixed_caps=fixed_caps, result_store=result_store
+        )
+        full_status = buq.RUN_STATUSES[
+            int(full_outputs.loc['status', 'output'])
+        ]
+        if full_status == 'optimal':
+            sim_id = result_store.load()['sim_id'].iloc[0]
+            full_dispatch = result_store.load_dispatch(sim_id).fillna(0)
+    if solution['status'] != 'optimal' or full_status != 'optimal':
+        logging.warning('Parallel operation run has status %s and '
+                        'sequential run status %s. Runs not compared.',
+                        solution['status'], full_status)
+        return pd.DataFrame(columns=['mean_abs_error', 'max_abs_error',
+                                     'max_rel_error'], dtype=float)
+
+    errors = _compare_outputs(outputs, full_outputs)
+    difference = np.abs(
+        solution['carrier_prod'].loc[full_dispatch.columns].values
+        - full_dispatch.values.T
+    )
+    dispatch_errors = pd.DataFrame({
+        'mean_abs_error': difference.mean(axis=1),
+        'max_abs_error': difference.max(axis=1),
+        'max_rel_error': np.nan
+    }, index=['dispatch: {}'.format(name)
+              for name in full_dispatch.columns])
+    errors = pd.concat([errors, dispatch_errors])
+    logging.info('Parallel operation run (%.1fs) against sequential run '
+                 '(%.1fs):\n%s', outputs.loc['time', 'output'],
+                 full_outputs.loc['time', 'output'], errors)
+
+    return errors
+
+
+def run_years_simulation_parallel(startyear, endyear, num_chunks,
+                                  lead_in_hours=168, num_workers=None,
+                                  fixed_caps=None,
+                                  ts_data_path=None):
+    """Run the operation model with certain years of data, as in
+    buq.run_years_simulation, using run_parallel_operation_simulation.
+    ts_data_path defaults to buq.TS_DATA_PATH."""
+    if ts_data_path is None:
+        ts_data_path = buq.TS_DATA_PATH
+    ts_data = buq.import_time_series_data(ts_data_path)
+    ts_data = ts_data.loc[str(startyear):str(endyear)]
+    results, _ = run_parallel_operation_simulation(
+        ts_data, num_chunks, lead_in_hours=lead_in_hours,
+        num_workers=num_workers, fixed_caps=fixed_caps
+    )
+    return results
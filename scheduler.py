@@ -0,0 +1,290 @@
+"""Scheduling of solver runs as concurrent jobs within a fixed budget of
+cores and memory."""
+
+
+import os
+import heapq
+import asyncio
+import logging
+import functools
+import itertools
+import threading
+import concurrent.futures
+
+
+# Solver threads given to each MILP_planning job. Branch and bound
+# parallelises well, whereas LP and operation solves gain little from extra
+# threads and are run as single-threaded jobs side by side instead
+MILP_SOLVER_THREADS = 4
+
+# Default rough memory use of a job, in MB, as (base, per time step) for each
+# model. The operation model is solved in windows of fixed length, so its
+# memory use hardly depends on the length of the time series. Pass other
+# estimates to JobScheduler if jobs run out of memory on your machine
+JOB_MEMORY_MB = {'LP_planning': (500, 0.25),
+                 'MILP_planning': (500, 0.4),
+                 'operation': (800, 0.02)}
+
+# Default relative cost (solve time) per time step of each model, used to
+# start the most expensive jobs first
+JOB_COST_PER_TIMESTEP = {'LP_planning': 1,
+                         'MILP_planning': 20,
+                         'operation': 2}
+
+
+def _get_available_memory_mb():
+    """Memory available for new processes, in MB, or None if it cannot be
+    determined (Linux only)."""
+    try:
+        with open('/proc/meminfo') as file:
+            for line in file:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) / 1024    # kB to MB
+    except OSError:
+        pass
+    return None
+
+
+def get_job_models(model_name_in_paper):
+    """Models a job solves: a single model (str), or a list of models that
+    are solved one after another."""
+    if isinstance(model_name_in_paper, str):
+        return [model_name_in_paper]
+    return list(model_name_in_paper)
+
+
+def get_job_cost(model_name_in_paper, num_timesteps,
+                 job_cost_per_timestep=JOB_COST_PER_TIMESTEP):
+    """Relative cost of a job that solves a model, or several models one
+    after another, on a time series of a certain length, from the cost
+    per time step of each model."""
+    return sum(job_cost_per_timestep[name] * num_timesteps
+               for name in get_job_models(model_name_in_paper))
+
+
+class JobScheduler:
+    """Runs solver jobs in worker processes with an asyncio scheduler,
+    keeping the total number of solver threads and the estimated memory of
+    the running jobs within a budget.
+
+    Each job gets a number of solver threads and a memory estimate from its
+    model and number of time steps (see get_job_resources), and starts once
+    both fit in what is left of the budget. Waiting jobs are started in
+    order of their estimated cost, most expensive first. Once the most
+    expensive waiting job does not fit, no cheaper jobs are started until
+    it does, so that a stream of small jobs cannot hold up a large one
+    indefinitely. A long point estimate solve submitted together with many
+    short bootstrap solves therefore starts straight away and runs
+    alongside them.
+
+    The event loop runs in a background thread, so jobs can be submitted
+    from ordinary (synchronous) code. Use as a context manager, or call
+    shutdown when done.
+    """
+
+    def __init__(self, num_cores=None, memory_mb=None, solver='cbc',
+                 milp_solver_threads=MILP_SOLVER_THREADS,
+                 job_memory_mb=None, job_cost_per_timestep=None):
+        """Create scheduler and start its worker processes.
+
+        Parameters:
+        -----------
+        num_cores (int) : number of cores that jobs may use in total. If
+            None, all cores of the machine
+        memory_mb (float) : memory that jobs may use in total, in MB. If
+            None, the memory available on the machine when the scheduler
+            is created (or no limit if that cannot be determined). This is
+            not updated later, since the running jobs themselves use part
+            of the available memory. If other programs may start or stop
+            during a long run, give a fixed budget instead
+        solver (str) : 'cbc' or 'gurobi', see buq.run_simulation
+        milp_solver_threads (int) : solver threads of each MILP job
+        job_memory_mb (dict) : memory use of a job of each model, in MB,
+            as (base, per time step). Defaults to JOB_MEMORY_MB
+        job_cost_per_timestep (dict) : relative cost per time step of a
+            job of each model. Defaults to JOB_COST_PER_TIMESTEP
+        """
+
+        self.num_cores = num_cores or os.cpu_count()
+        if memory_mb is None:
+            memory_mb = _get_available_memory_mb()
+        self.memory_mb = memory_mb if memory_mb is not None else float('inf')
+        self.solver = solver
+        self.milp_solver_threads = milp_solver_threads
+        self.job_memory_mb = dict(job_memory_mb or JOB_MEMORY_MB)
+        self.job_cost_per_timestep = dict(job_cost_per_timestep
+                                          or JOB_COST_PER_TIMESTEP)
+
+        self._free_cores = self.num_cores
+        self._free_memory_mb = self.memory_mb
+        self._waiting = []    # Heap of (-cost, job number, ...) entries
+        self._running = set()    # Jobs running in the worker processes
+        self._job_nums = itertools.count()
+        self._executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=self.num_cores
+        )
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever,
+                                        daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    def shutdown(self):
+        """Cancel the jobs that have not started, wait for the running jobs
+        to finish, and then stop the event loop and the worker processes.
+        """
+        asyncio.run_coroutine_threadsafe(self._finish_jobs(),
+                                         self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+        self._loop.close()
+
+    async def _finish_jobs(self):
+        """Cancel the waiting jobs, and wait for the running jobs and the
+        tasks of all jobs to finish, so that none are left pending when the
+        event loop is stopped."""
+        for _, _, _, _, ready in self._waiting:
+            ready.cancel()
+        tasks = [task for task in asyncio.all_tasks(self._loop)
+                 if task is not asyncio.current_task()]
+        await asyncio.gather(*tasks, *self._running, return_exceptions=True)
+
+    def get_job_resources(self, model_name_in_paper, num_timesteps):
+        """Solver threads, memory estimate (in MB) and relative cost of a
+        job that solves a model, or several models one after another, on a
+        time series of a certain length."""
+        model_names = get_job_models(model_name_in_paper)
+        if 'MILP_planning' in model_names:
+            threads = self.milp_solver_threads
+        else:
+            threads = 1
+        memory_mb = max(self.job_memory_mb[name][0]
+                        + self.job_memory_mb[name][1] * num_timesteps
+                        for name in model_names)
+        cost = get_job_cost(model_names, num_timesteps,
+                            self.job_cost_per_timestep)
+
+        # A job larger than the whole budget would never start
+        return (min(threads, self.num_cores),
+                min(memory_mb, self.memory_mb), cost)
+
+    def _start_waiting_jobs(self):
+        """Start waiting jobs, most expensive first, until the next one
+        does not fit in the budget. Must be called in the event loop."""
+        while self._waiting:
+            _, _, threads, memory_mb, ready = self._waiting[0]
+            if ready.cancelled():
+                heapq.heappop(self._waiting)
+                continue
+            if (threads > self._free_cores
+                    or memory_mb > self._free_memory_mb):
+                break    # Keep the freed resources for this job
+            heapq.heappop(self._waiting)
+            self._free_cores -= threads
+            self._free_memory_mb -= memory_mb
+            ready.set_result(None)
+
+    async def _run_job(self, function, model_name_in_paper, num_timesteps,
+                       kwargs):
+        """Wait for resources, then run function in a worker process."""
+        threads, memory_mb, cost = self.get_job_resources(
+            model_name_in_paper, num_timesteps
+        )
+        ready = self._loop.create_future()
+        heapq.heappush(self._waiting, (-cost, next(self._job_nums),
+                                       threads, memory_mb, ready))
+        self._start_waiting_jobs()
+        try:
+            await ready
+        except asyncio.CancelledError:
+            if ready.done() and not ready.cancelled():
+                self._release(threads, memory_mb)    # Started meanwhile
+            raise
+        job = self._loop.run_in_executor(
+            self._executor,
+            functools.partial(function,
+                              model_name_in_paper=model_name_in_paper,
+                              solver=self.solver, solver_threads=threads,
+                              **kwargs)
+        )
+        # A running job cannot be stopped, so keep its resources until it
+        # has finished, even if it is cancelled
+        self._running.add(job)
+        job.add_done_callback(self._running.discard)
+        job.add_done_callback(lambda _: self._release(threads, memory_mb))
+        return await asyncio.shield(job)
+
+    def _release(self, threads, memory_mb):
+        """Return the resources of a finished job to the budget."""
+        self._free_cores += threads
+        self._free_memory_mb += memory_mb
+        self._start_waiting_jobs()
+
+    def submit(self, function, model_name_in_paper, num_timesteps,
+               **kwargs):
+        """Submit a job that calls function(model_name_in_paper, solver=...,
+        solver_threads=..., **kwargs) in a worker process.
+
+        Parameters:
+        -----------
+        function (callable) : function at module level that accepts the
+            keyword arguments model_name_in_paper, solver and
+            solver_threads, such as buq.run_years_simulation
+        model_name_in_paper (str or list) : model, or models, the
+            function solves, which also determine the resources of the job
+        num_timesteps (int) : length of the time series of the job
+
+        Returns:
+        --------
+        future (concurrent.futures.Future) : result of the function.
+            Cancelling it before the job has started removes the job
+        """
+        return asyncio.run_coroutine_threadsafe(
+            self._run_job(function, model_name_in_paper, num_timesteps,
+                          kwargs),
+            self._loop
+        )
+
+    def map_samples(self, function, sample_nums, model_name_in_paper,
+                    num_timesteps, **kwargs):
+        """Call function(sample_num=sample_num, **kwargs) as a job for each
+        sample number, yielding (sample_num, result) as each job finishes,
+        like buq._map_samples.
+
+        All sample numbers are submitted at once, and the scheduler decides
+        when each job starts. Sample numbers added to sample_nums (a
+        buq._SampleQueue) while results come in are submitted too. Closing
+        the generator early cancels the jobs that have not started.
+        """
+
+        sample_nums = iter(sample_nums)
+        futures = {}
+
+        def submit_available():
+            for sample_num in sample_nums:
+                future = self.submit(function, model_name_in_paper,
+                                     num_timesteps, sample_num=sample_num,
+                                     **kwargs)
+                futures[future] = sample_num
+
+        submit_available()
+        try:
+            while futures:
+                done, _ = concurrent.futures.wait(
+                    futures, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    sample_num = futures.pop(future)
+                    logging.info('Done with bootstrap sample %s.',
+                                 sample_num+1)
+                    yield sample_num, future.result()
+                    submit_available()
+        finally:
+            for future in futures:
+                future.cancel()
@@ -0,0 +1,486 @@
+"""On-disk storage of simulation outputs."""
+
+
+import os
+import json
+import uuid
+import logging
+import numpy as np
+import pandas as pd
+
+
+# Default size cap of a ResultCache, in MB
+RESULT_CACHE_MAX_SIZE_MB = 1024
+# Fraction of its size cap to which a full ResultCache is reduced, so that
+# it is not scanned again on every following put
+RESULT_CACHE_EVICT_FRACTION = 0.9
+
+
+def _write_atomic(path, text):
+    """Write text to a file, replacing it only once writing has finished."""
+    tmp_path = path + '.tmp{}'.format(os.getpid())
+    with open(tmp_path, 'w') as file:
+        file.write(text)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+class RunStore:
+    """Store of the completed simulations of a single BUQ run, so that a
+    run can be resumed after a crash.
+
+    The store is a directory containing:
+    - config.json : the configuration of the run. Reopening the store with
+      a different configuration raises an error.
+    - seed.json : the master seed of the bootstrap samples
+    - point_estimate.csv : outputs of the point estimate simulation
+    - samples.jsonl : outputs of each bootstrap simulation, one line per
+      simulation, appended as soon as it has finished
+    """
+
+    def __init__(self, path, config):
+        """Open the store in directory path, creating it if required.
+
+        Parameters:
+        -----------
+        path (str) : directory of the store
+        config (dict) : configuration of the run, as JSON-serialisable
+            values. Must match the configuration the store was created with
+        """
+
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        config_path = os.path.join(path, 'config.json')
+        config = json.loads(json.dumps(config))    # Match JSON types
+        if os.path.exists(config_path):
+            with open(config_path) as file:
+                stored_config = json.load(file)
+            if stored_config != config:
+                raise ValueError(
+                    'Run store {} was created with a different '
+                    'configuration:\n{}'.format(path, stored_config)
+                )
+        else:
+            _write_atomic(config_path, json.dumps(config, indent=4))
+        self.config = config
+
+    def get_seed(self, seed=None):
+        """Get the master seed of the bootstrap samples.
+
+        If the store does not have a seed yet, the given seed is stored, or
+        one is drawn from the global random state if seed is None. Resumed
+        runs then use the same samples.
+        """
+
+        seed_path = os.path.join(self.path, 'seed.json')
+        if os.path.exists(seed_path):
+            with open(seed_path) as file:
+                stored_seed = json.load(file)
+            if seed is not None and seed != stored_seed:
+                raise ValueError('Run store {} was created with seed {}.'.
+                                 format(self.path, stored_seed))
+            return stored_seed
+        if seed is None:
+            seed = int(np.random.randint(2**32 - 1))
+        _write_atomic(seed_path, json.dumps(seed))
+
+        return seed
+
+    def load_point_estimate(self):
+        """Load the point estimate outputs, or None if not stored yet."""
+        pe_path = os.path.join(self.path, 'point_estimate.csv')
+        if not os.path.exists(pe_path):
+            return None
+        return pd.read_csv(pe_path, index_col=0)
+
+    def save_point_estimate(self, results):
+        """Store the point estimate outputs (pandas DataFrame)."""
+        _write_atomic(os.path.join(self.path, 'point_estimate.csv'),
+                      results.to_csv(float_format='%.17g'))
+
+    def load_samples(self):
+        """Load the outputs of the completed bootstrap simulations.
+
+        Returns:
+        --------
+        samples (dict) : keyed by sample number, with values (seed, outputs)
+            where seed is the master seed and outputs is a pandas Series,
+            or a pandas DataFrame for simulations of several models
+        """
+
+        samples = {}
+        samples_path = os.path.join(self.path, 'samples.jsonl')
+        if not os.path.exists(samples_path):
+            return samples
+        with open(samples_path) as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # Incomplete last line, e.g. after a crash while writing
+                    logging.warning('Skipping incomplete record in %s',
+                                    samples_path)
+                    continue
+                outputs = record['outputs']
+                if any(isinstance(value, dict)
+                       for value in outputs.values()):
+                    outputs = pd.DataFrame(outputs)
+                else:
+                    outputs = pd.Series(outputs)
+                samples[record['sample_num']] = (record['seed'], outputs)
+
+        return samples
+
+    def append_sample(self, sample_num, seed, outputs):
+        """Store the outputs (pandas Series, or DataFrame with a column for
+        each model) of a bootstrap simulation, created with a certain
+        master seed.
+        """
+        if isinstance(outputs, pd.DataFrame):
+            outputs = {column: {name: float(value)
+                                for name, value in outputs[column].items()}
+                       for column in outputs.columns}
+        else:
+            outputs = {name: float(value) for name, value in outputs.items()}
+        record = {'sample_num': int(sample_num),
+                  'seed': int(seed),
+                  'outputs': outputs}
+        samples_path = os.path.join(self.path, 'samples.jsonl')
+        with open(samples_path, 'a+b') as file:
+            # Start a new line if the last write was interrupted
+            if file.seek(0, os.SEEK_END) > 0:
+                file.seek(-1, os.SEEK_END)
+                if file.read(1) != b'\n':
+                    file.write(b'\n')
+            file.write((json.dumps(record) + '\n').encode())
+            file.flush()
+            os.fsync(file.fileno())
+
+
+def _save_npz_atomic(path, **arrays):
+    """Save arrays to an NPZ file, replacing it only once writing has
+    finished."""
+    tmp_path = path + '.tmp{}.npz'.format(os.getpid())
+    np.savez(tmp_path, **arrays)
+    os.replace(tmp_path, path)
+
+
+class SampleIndexStore:
+    """Row numbers of the bootstrap samples of a run in the time series
+    data, so that each sample is created from the data only when its
+    simulation starts, and the exact samples can be audited and replayed.
+
+    The store is a directory containing:
+    - config.json : the bootstrap scheme, number of blocks per bin, master
+      seed and time series data (path and sha256 hash) of the samples.
+      Reopening the store with a different configuration raises an error.
+    - sample_<sample_num>.npz : row numbers of each sample, created with
+      the random number generator buq.get_sample_rng(seed, sample_num)
+    """
+
+    def __init__(self, path, config=None):
+        """Open the store in directory path, creating it if required.
+
+        Parameters:
+        -----------
+        path (str) : directory of the store
+        config (dict) : configuration of the samples, as JSON-serialisable
+            values. Must match the configuration the store was created
+            with. If None, the store must exist already
+        """
+
+        self.path = path
+        config_path = os.path.join(path, 'config.json')
+        if config is None:
+            with open(config_path) as file:
+                self.config = json.load(file)
+            return
+        os.makedirs(path, exist_ok=True)
+        config = json.loads(json.dumps(config))    # Match JSON types
+        if os.path.exists(config_path):
+            with open(config_path) as file:
+                stored_config = json.load(file)
+            if stored_config != config:
+                raise ValueError(
+                    'Sample index {} was created with a different '
+                    'configuration:\n{}'.format(path, stored_config)
+                )
+        else:
+            _write_atomic(config_path, json.dumps(config, indent=4))
+        self.config = config
+
+    def _get_sample_path(self, sample_num):
+        return os.path.join(self.path,
+                            'sample_{}.npz'.format(int(sample_num)))
+
+    def has_sample(self, sample_num):
+        """Check if the rows of a sample are stored."""
+        return os.path.exists(self._get_sample_path(sample_num))
+
+    def save_rows(self, sample_num, rows):
+        """Store the row numbers (numpy array) of a sample."""
+        _save_npz_atomic(self._get_sample_path(sample_num),
+                         rows=rows.astype(np.int32))
+
+    def load_rows(self, sample_num):
+        """Load the row numbers of a sample."""
+        with np.load(self._get_sample_path(sample_num)) as arrays:
+            return arrays['rows']
+
+
+class ResultStore:
+    """Columnar store of the outputs of individual simulations, so that
+    analyses after a run (e.g. percentiles or new aggregate outputs) do not
+    require any simulations to be run again.
+
+    Each simulation is one row, with a float64 column for every summary
+    output and columns describing the run (e.g. model, scheme, seed and the
+    time of each phase). The store is a directory containing:
+    - rows/ : one NPZ file per simulation, written as soon as it has
+      finished. Several processes can add rows at the same time
+    - results_<n>.npz : columnar chunks of many rows, created from the
+      files in rows/ by compact()
+    - dispatch/ : if store_dispatch is True, one NPZ file per simulation
+      with its hourly production of each technology (as float32)
+    """
+
+    def __init__(self, path, store_dispatch=False):
+        """Open the store in directory path, creating it if required.
+
+        Parameters:
+        -----------
+        path (str) : directory of the store
+        store_dispatch (bool) : also store the hourly production of each
+            technology of each simulation
+        """
+        self.path = path
+        self.store_dispatch = store_dispatch
+        os.makedirs(os.path.join(path, 'rows'), exist_ok=True)
+        if store_dispatch:
+            os.makedirs(os.path.join(path, 'dispatch'), exist_ok=True)
+
+    def append(self, outputs, info, timer=None, model=None):
+        """Add the outputs of a simulation.
+
+        Parameters:
+        -----------
+        outputs (pandas Series) : summary outputs of the simulation
+        info (dict) : information about the simulation, as numbers or
+            strings, e.g. model name, scheme and seed
+        timer (timing.PhaseTimer) : if given, the time of each phase is
+            stored in columns 'time_<phase>'
+        model (calliope.Model) : the solved model, from which the hourly
+            dispatch is stored if store_dispatch is True
+
+        Returns:
+        --------
+        sim_id (str) : unique id of the simulation in the store
+        """
+
+        sim_id = uuid.uuid4().hex
+        info = dict(info, sim_id=sim_id)
+        if timer is not None:
+            for name, phase in timer.phases.items():
+                info['time_{}'.format(name)] = phase['time']
+        if self.store_dispatch and model is not None:
+            carrier_prod = model.results.carrier_prod
+            _save_npz_atomic(
+                os.path.join(self.path, 'dispatch', sim_id + '.npz'),
+                values=carrier_prod.values.T.astype(np.float32),
+                columns=np.array(carrier_prod.coords[
+                    carrier_prod.dims[0]
+                ].values, dtype=str),
+                timesteps=carrier_prod.coords['timesteps'].values.astype(
+                    'datetime64[ns]'
+                ).astype(np.int64)
+            )
+        self._save_rows(
+            os.path.join(self.path, 'rows', sim_id + '.npz'),
+            pd.DataFrame([outputs.astype(float).values],
+                         columns=outputs.index),
+            pd.DataFrame([info])
+        )
+
+        return sim_id
+
+    @staticmethod
+    def _save_rows(path, outputs, info):
+        """Save rows of outputs and info (pandas DataFrames) as NPZ."""
+        arrays = {'output_names': np.array(outputs.columns, dtype=str),
+                  'outputs': outputs.values.astype(np.float64),
+                  'info_names': np.array(info.columns, dtype=str)}
+        for i, name in enumerate(info.columns):
+            column = info[name]
+            arrays['info_{}'.format(i)] = (
+                column.to_numpy() if pd.api.types.is_numeric_dtype(column)
+                else np.array(column.astype(str).tolist(), dtype=str)
+            )
+        _save_npz_atomic(path, **arrays)
+
+    @staticmethod
+    def _load_rows(path):
+        """Load rows saved by _save_rows, as (outputs, info) DataFrames."""
+        with np.load(path) as arrays:
+            outputs = pd.DataFrame(arrays['outputs'],
+                                   columns=arrays['output_names'])
+            info = pd.DataFrame({
+                name: arrays['info_{}'.format(i)]
+                for i, name in enumerate(arrays['info_names'])
+            })
+        return outputs, info
+
+    def _load_files(self, paths):
+        """Load the rows of several files, as (outputs, info) DataFrames.
+        Columns missing from some files are filled with NaN."""
+        outputs, info = zip(*[self._load_rows(path) for path in paths])
+        return (pd.concat(outputs, ignore_index=True, sort=False),
+                pd.concat(info, ignore_index=True, sort=False))
+
+    def _get_files(self):
+        """Paths of the chunk files and row files in the store."""
+        chunk_paths = sorted(
+            os.path.join(self.path, name) for name in os.listdir(self.path)
+            if name.startswith('results_') and name.endswith('.npz')
+        )
+        rows_dir = os.path.join(self.path, 'rows')
+        row_paths = sorted(
+            os.path.join(rows_dir, name) for name in os.listdir(rows_dir)
+            if name.endswith('.npz') and '.tmp' not in name
+        )
+        return chunk_paths, row_paths
+
+    def load(self):
+        """Load all stored simulations.
+
+        Returns:
+        --------
+        results (pandas DataFrame) : one row per simulation, with the
+            information columns first and then the summary outputs. Outputs
+            that a simulation does not have are NaN
+        """
+        chunk_paths, row_paths = self._get_files()
+        if len(chunk_paths + row_paths) == 0:
+            return pd.DataFrame()
+        outputs, info = self._load_files(chunk_paths + row_paths)
+        return pd.concat([info, outputs], axis=1)
+
+    def compact(self):
+        """Merge the files of individual simulations into a single columnar
+        chunk, for faster loading. Should not be called by more than one
+        process at a time."""
+        chunk_paths, row_paths = self._get_files()
+        if len(row_paths) == 0:
+            return
+        outputs, info = self._load_files(row_paths)
+        self._save_rows(os.path.join(
+            self.path, 'results_{:05d}.npz'.format(len(chunk_paths))
+        ), outputs, info)
+        for path in row_paths:
+            os.remove(path)
+
+    def load_dispatch(self, sim_id):
+        """Load the hourly production of each technology of a simulation.
+
+        Returns:
+        --------
+        dispatch (pandas DataFrame) : indexed by time step, with a column
+            for each location, technology and carrier
+        """
+        path = os.path.join(self.path, 'dispatch', sim_id + '.npz')
+        with np.load(path) as arrays:
+            return pd.DataFrame(
+                arrays['values'], columns=arrays['columns'],
+                index=pd.to_datetime(arrays['timesteps'])
+            )
+
+
+class ResultCache:
+    """Persistent cache of the outputs of simulations, keyed by a hash of
+    all their inputs (see buq.get_simulation_key), so that a simulation
+    that has been run before does not need to be solved again.
+
+    Each entry is a small JSON file in the cache directory. An entry's
+    modification time is its last use time. The cache keeps a running
+    total of its size, and when this exceeds the size cap, the least
+    recently used entries are removed until the cache is no larger than
+    RESULT_CACHE_EVICT_FRACTION of the cap. Several processes can use the
+    same cache at the same time; entries added by other processes are
+    counted at the next eviction.
+    """
+
+    def __init__(self, path, max_size_mb=RESULT_CACHE_MAX_SIZE_MB):
+        """Open the cache in directory path, creating it if required.
+
+        Parameters:
+        -----------
+        path (str) : directory of the cache
+        max_size_mb (float) : size cap of the cache, in MB
+        """
+        self.path = path
+        self.max_size_mb = max_size_mb
+        os.makedirs(path, exist_ok=True)
+        self._size = sum(size for _, size, _ in self._get_entries())
+
+    def _get_entry_path(self, key):
+        """Path of the file of a cache entry."""
+        return os.path.join(self.path, key + '.json')
+
+    def _get_entries(self):
+        """Last use time, size and path of each entry in the cache."""
+        entries = []
+        with os.scandir(self.path) as dir_entries:
+            for entry in dir_entries:
+                if entry.name.endswith('.json'):
+                    try:
+                        stat = entry.stat()
+                    except OSError:    # Removed by another process
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def get(self, key):
+        """Get the outputs (pandas DataFrame) stored under key, or None if
+        there are none."""
+        entry_path = self._get_entry_path(key)
+        try:
+            with open(entry_path) as file:
+                outputs = json.load(file)
+            os.utime(entry_path)    # Mark as recently used
+        except (OSError, ValueError):
+            return None
+        return pd.DataFrame({'output': pd.Series(outputs, dtype=float)})
+
+    def put(self, key, results):
+        """Store outputs (pandas DataFrame, first column) under key, then
+        remove the least recently used entries if the cache is too large.
+        """
+        outputs = results.iloc[:, 0]
+        entry_path = self._get_entry_path(key)
+        text = json.dumps(
+            {name: float(value) for name, value in outputs.items()}
+        )
+        try:
+            self._size -= os.path.getsize(entry_path)    # Replaced
+        except OSError:
+            pass
+        _write_atomic(entry_path, text)
+        self._size += len(text.encode())
+        if self._size > self.max_size_mb * 2**20:
+            self._evict()
+
+    def _evict(self):
+        """Remove least recently used entries until the cache is no larger
+        than RESULT_CACHE_EVICT_FRACTION of its size cap."""
+        entries = self._get_entries()
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, entry_path in sorted(entries):
+            if (total_size
+                    <= RESULT_CACHE_EVICT_FRACTION * self.max_size_mb * 2**20):
+                break
+            try:
+                os.remove(entry_path)
+            except OSError:
+                pass
+            total_size -= size
+        self._size = total_size
@@ -1,10 +1,23 @@
 """Tests to check whether the models behave as required."""
 
 
+import os
+import json
+import time
 import logging
+import argparse
+import tempfile
+import concurrent.futures
 import numpy as np
 import pandas as pd
 import buq
+import models
+import storage
+import aggregation
+import scheduler
+import timing
+import work_queue
+import operation
 
 
 # Install costs and generation costs. These should match the information
@@ -32,29 +45,81 @@ COSTS.loc['transmission_region4_region5'] = [100.45, 0]
 COSTS.loc['transmission_region5_region6'] = [100.56, 0]
 
 
-# Topology of 6 region model. These should match the information provided
-# in the locations.yaml files in the model definition
-NUCLEAR_TOP, CCGT_TOP, OCGT_TOP, WIND_TOP, UNMET_TOP, DEMAND_TOP = (
-    [('nuclear', i) for i in ['region3']],
-    [('ccgt', i) for i in ['region1', 'region3']],
-    [('ocgt', i) for i in ['region1', 'region6']],
-    [('wind', i) for i in ['region2', 'region5', 'region6']],
-    [('unmet', i) for i in ['region2', 'region4', 'region5']],
-    [('demand', i) for i in ['region2', 'region4', 'region5']]
-)
-TRANSMISSION_TOP = [('transmission', *i)
-                    for i in [('region1', 'region2'),
-                              ('region1', 'region5'),
-                              ('region1', 'region6'),
-                              ('region2', 'region3'),
-                              ('region3', 'region4'),
-                              ('region4', 'region5'),
-                              ('region5', 'region6')]]
+# Technologies of 6 region model whose costs are checked, as technology
+# names, Calliope loc_techs and summary output suffixes. The topology is
+# taken from models.TOPOLOGY_6_REGION
+GENERATION_TECHS, GENERATION_LOC_TECHS, GENERATION_OUTPUTS = zip(*[
+    ('{}_{}'.format(tech, region),
+     '{}::{}_{}'.format(region, tech, region),
+     '{}_{}'.format(tech, region))
+    for tech in ['nuclear', 'ccgt', 'ocgt', 'wind', 'unmet']
+    for region in models.TOPOLOGY_6_REGION[tech]
+])
+TRANSMISSION_TECHS, TRANSMISSION_LOC_TECHS, TRANSMISSION_OUTPUTS = zip(*[
+    ('transmission_{}_{}'.format(region_a, region_b),
+     '{}::transmission_{}_{}:{}'.format(region_a, region_a, region_b,
+                                        region_b),
+     'transmission_{}_{}'.format(region_a, region_b))
+    for region_a, region_b in models.TOPOLOGY_6_REGION['transmission']
+])
+INSTALLED = [not tech.startswith('unmet') for tech in GENERATION_TECHS]
+
+
+def make_synthetic_time_series(index, seed=0):
+    """Create synthetic demand and wind data for the 6 region model, with
+    daily and yearly cycles plus noise. Used by tests and benchmarks that
+    should not depend on the full data set.
+
+    Parameters:
+    -----------
+    index (pandas DatetimeIndex) : hourly time steps
+    seed (int) : seed of the noise
+
+    Returns:
+    --------
+    ts_data (pandas DataFrame) : with the same columns as the full data
+    """
+
+    rng = np.random.RandomState(seed)
+    hour_of_day = np.asarray(index.hour)
+    day_of_year = np.asarray(index.dayofyear)
+    daily = np.sin(2*np.pi*(hour_of_day - 6)/24)
+    yearly = np.cos(2*np.pi*day_of_year/365)
+    ts_data = pd.DataFrame(index=index)
+    for region, level in [('region2', 35), ('region4', 45), ('region5', 30)]:
+        ts_data['demand_{}'.format(region)] = (
+            level * (1 + 0.1*daily + 0.15*yearly)
+            + rng.normal(scale=1., size=len(index))
+        )
+    for region in ['region2', 'region5', 'region6']:
+        # Wind capacity factors, as an AR(1) process mapped to [0, 1]
+        noise = rng.normal(size=len(index))
+        process = np.zeros(len(index))
+        for i in range(1, len(index)):
+            process[i] = 0.97*process[i-1] + 0.25*noise[i]
+        ts_data['wind_{}'.format(region)] = 1/(1 + np.exp(-process
+                                                          - 0.3*yearly))
+
+    return ts_data
+
+
+def _compare_costs(description, techs, cost_method1, cost_method2):
+    """Log an error for each technology whose costs calculated in two
+    different ways do not match, and return whether they all match.
+    """
+    mismatch = ~(np.abs(cost_method1 - cost_method2) <= 0.1)  # Catch NaN
+    for i in np.flatnonzero(mismatch):
+        logging.error('FAIL: %s %s costs do not match!\n'
+                      '    manual: %s, model: %s',
+                      techs[i], description, cost_method1[i], cost_method2[i])
+    return not mismatch.any()
 
 
 def test_output_consistency_6_region(model, run_mode):
     """Check if model outputs are internally consistent for 6 region model.
 
+    All technologies are checked at once, using whole-array operations.
+
     Parameters:
     -----------
     model (calliope.Model) : instance of OneRegionModel or SixRegionModel
@@ -68,70 +133,43 @@ def test_output_consistency_6_region(model, run_mode):
     passing = True
     cost_total_method1 = 0
 
-    out = model.get_summary_outputs()
+    out = model.get_summary_outputs().loc[:, 'output'].astype(float)
     res = model.results
-    corrfac = 8760/model.num_timesteps    # For annualisation
+    corrfac = 8760/model.num_represented_timesteps    # Annualisation
 
-    # Test if generation technology installation costs are consistent
-    if run_mode == 'plan':
-        for tech, region in NUCLEAR_TOP + CCGT_TOP + OCGT_TOP + WIND_TOP:
-            cost_method1 = float(
-                COSTS.loc['{}_{}'.format(tech, region), 'install'] *
-                out.loc['cap_{}_{}'.format(tech, region)]
-            )
-            cost_method2 = corrfac * float(
-                res.cost_investment[0].loc['{}::{}_{}'.format(region,
-                                                              tech,
-                                                              region)]
-            )
-            if abs(cost_method1 - cost_method2) > 0.1:
-                logging.error('FAIL: %s install costs in %s do not match!\n'
-                              '    manual: %s, model: %s',
-                              tech, region, cost_method1, cost_method2)
-                passing = False
-            cost_total_method1 += cost_method1
-
-    # Test if transmission installation costs are consistent
+    # Test if generation and transmission installation costs are consistent
     if run_mode == 'plan':
-        for tech, region_a, region_b in TRANSMISSION_TOP:
-            cost_method1 = float(
-                COSTS.loc[
-                    '{}_{}_{}'.format(tech, region_a, region_b), 'install'
-                ] * out.loc[
-                    'cap_transmission_{}_{}'.format(region_a, region_b)
-                ]
-            )
-            cost_method2 = 2 * corrfac * \
-                float(res.cost_investment[0].loc[
-                    '{}::{}_{}_{}:{}'.format(region_a,
-                                             tech,
-                                             region_a,
-                                             region_b,
-                                             region_b)
-                ])
-            if abs(cost_method1 - cost_method2) > 0.1:
-                logging.error('FAIL: %s install costs from %s to %s do '
-                              'not match!\n    manual: %s, model: %s',
-                              tech, region_a, region_b,
-                              cost_method1, cost_method2)
-                passing = False
-            cost_total_method1 += cost_method1
+        techs = (np.array(GENERATION_TECHS)[INSTALLED].tolist()
+                 + list(TRANSMISSION_TECHS))
+        cap_outputs = ['cap_' + output for output in
+                       np.array(GENERATION_OUTPUTS)[INSTALLED].tolist()
+                       + list(TRANSMISSION_OUTPUTS)]
+        loc_techs = (np.array(GENERATION_LOC_TECHS)[INSTALLED].tolist()
+                     + list(TRANSMISSION_LOC_TECHS))
+        # Transmission costs are split over both directions of each link
+        link_factor = np.array([1]*sum(INSTALLED)
+                               + [2]*len(TRANSMISSION_TECHS))
+        cost_method1 = (COSTS.loc[techs, 'install'].values.astype(float)
+                        * out.loc[cap_outputs].values)
+        cost_method2 = link_factor * corrfac * (
+            res.cost_investment[0].to_pandas().reindex(loc_techs).values
+        )
+        passing = _compare_costs('install', techs,
+                                 cost_method1, cost_method2) and passing
+        cost_total_method1 += cost_method1.sum()
 
     # Test if generation costs are consistent
-    for tech, region in NUCLEAR_TOP + CCGT_TOP + OCGT_TOP + WIND_TOP + UNMET_TOP:
-        cost_method1 = float(
-            COSTS.loc['{}_{}'.format(tech, region), 'generation']
-            * out.loc['gen_{}_{}'.format(tech, region)]
-        )
-        cost_method2 = corrfac * float(
-            res.cost_var[0].loc['{}::{}_{}'.format(region, tech, region)].sum()
-        )
-        if abs(cost_method1 - cost_method2) > 0.1:
-            logging.error('FAIL: %s generation costs in %s do not match!\n'
-                          '    manual: %s, model: %s',
-                          tech, region, cost_method1, cost_method2)
-            passing = False
-        cost_total_method1 += cost_method1
+    cost_method1 = (
+        COSTS.loc[list(GENERATION_TECHS), 'generation'].values.astype(float)
+        * out.loc[['gen_' + output for output in GENERATION_OUTPUTS]].values
+    )
+    cost_method2 = corrfac * (
+        res.cost_var[0].to_pandas().reindex(GENERATION_LOC_TECHS)
+        .sum(axis=1).values
+    )
+    passing = _compare_costs('generation', GENERATION_TECHS,
+                             cost_method1, cost_method2) and passing
+    cost_total_method1 += cost_method1.sum()
 
     # Test if total costs are consistent
     if run_mode == 'plan':
@@ -158,42 +196,136 @@ def test_output_consistency_6_region(model, run_mode):
     return passing
 
 
-def test_outputs_against_benchmarks():
-    """Test model outputs against benchmarks."""
+# Settings of the benchmark tiers. The 'full' tier runs the examples in the
+# paper on the full data set. The 'fast' tier runs the same models on a few
+# weeks of synthetic data (see make_fast_time_series), so that it can be
+# run on every change. Its bootstrap samples of one week per season are
+# shorter than the operation model's horizon, so the operation model solves
+# them in a single window (see models.get_operation_window). The models of
+# a tier are run at the same time, in separate processes
+BENCHMARK_TIERS = {
+    'full': {'benchmark_dir': 'test_benchmarks',
+             'models': ['LP_planning', 'operation'],
+             'num_blocks_per_bin': 1,
+             'num_bootstrap_samples': 10},
+    'fast': {'benchmark_dir': 'test_benchmarks/fast',
+             'models': ['LP_planning', 'operation'],
+             'num_blocks_per_bin': 1,
+             'num_bootstrap_samples': 2}
+}
 
-    logging.basicConfig(
-        format='[%(asctime)s] %(levelname)s: %(message)s',
-        level=getattr(logging, 'INFO'),
-        datefmt='%Y-%m-%d,%H:%M:%S'
+# Name of the synthetic data file of the fast tier. It differs from the
+# full data set's name, so that their binary copies in buq.TS_CACHE_DIR
+# are kept apart
+FAST_TS_DATA_FILENAME = 'demand_wind_fast.csv'
+
+
+def make_fast_time_series():
+    """Create the synthetic data of the fast benchmark tier: the first ten
+    days of January, April, July and October 2017, so that each season has
+    a complete week, with a few possible start days, for the 'weeks'
+    scheme.
+    """
+    index = pd.DatetimeIndex(np.concatenate([
+        pd.date_range('2017-{:02d}-01'.format(month), periods=10*24,
+                      freq='h').values
+        for month in [1, 4, 7, 10]
+    ]))
+    return make_synthetic_time_series(index, seed=0)
+
+
+def _run_benchmark_simulation(benchmark_name, tier, ts_data_path):
+    """Run the BUQ algorithm for one benchmark model, with the settings of
+    a benchmark tier, and return the outputs compared with the benchmark.
+    """
+    if tier == 'full':
+        # The full benchmarks were created with samples drawn from the
+        # global random state in order
+        np.random.seed(42)
+        seed = None
+    else:
+        seed = 42
+    estimate_with_stdev = buq.calculate_point_estimate_and_stdev(
+        model_name_in_paper=benchmark_name,
+        point_estimate_range=[2017, 2017],
+        bootstrap_scheme='weeks',
+        num_blocks_per_bin=BENCHMARK_TIERS[tier]['num_blocks_per_bin'],
+        num_bootstrap_samples=(
+            BENCHMARK_TIERS[tier]['num_bootstrap_samples']
+        ),
+        reuse_backend=(tier == 'fast' and buq.MODELS_IN_PAPER[
+            benchmark_name]['run_mode'] == 'plan'),
+        seed=seed,
+        ts_data_path=ts_data_path
+    )
+    return estimate_with_stdev.loc[:, ['point_estimate', 'stdev']].drop(
+        index=buq.RUN_INFO_OUTPUTS, errors='ignore'
     )
 
+
+def _run_benchmark_simulations(tier):
+    """Run the simulations of all benchmark models of a tier, each in its
+    own process.
+
+    Returns:
+    --------
+    estimates (dict) : outputs of each benchmark model
+    """
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if tier == 'fast':
+            ts_data_path = _write_fast_time_series(tmp_dir)
+        else:
+            ts_data_path = buq.TS_DATA_PATH
+        benchmark_names = BENCHMARK_TIERS[tier]['models']
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=len(benchmark_names)) as executor:
+            futures = {benchmark_name: executor.submit(
+                _run_benchmark_simulation, benchmark_name, tier, ts_data_path
+            ) for benchmark_name in benchmark_names}
+            return {benchmark_name: future.result()
+                    for benchmark_name, future in futures.items()}
+
+
+def test_outputs_against_benchmarks(tier='full'):
+    """Test model outputs against benchmarks.
+
+    Parameters:
+    -----------
+    tier (str) : 'full' (10-15 minutes) or 'fast' (about 2 minutes on a
+        single core, less with a core for each model), see BENCHMARK_TIERS
+    """
+
     # Run each test simulation and see if results match benchmarks
-    benchmarks = {'LP_planning': 'test_benchmarks/LP_planning.csv',
-                  'operation': 'test_benchmarks/operation.csv'}
+    benchmark_dir = BENCHMARK_TIERS[tier]['benchmark_dir']
     passing_all_benchmarks = []
-    for benchmark_name in benchmarks:
-        logging.info('\n\n\n\n\nStarting bechmark comparison for %s model',
-                     benchmark_name)
+    logging.info('\n\n\n\n\nStarting %s benchmark comparison for models %s',
+                 tier, BENCHMARK_TIERS[tier]['models'])
+    estimates = _run_benchmark_simulations(tier)
+    for benchmark_name in BENCHMARK_TIERS[tier]['models']:
         passing = True
-        np.random.seed(42)
-        estimate_with_stdev = buq.calculate_point_estimate_and_stdev(
-            model_name_in_paper=benchmark_name,
-            point_estimate_range=[2017, 2017],
-            bootstrap_scheme='weeks',
-            num_blocks_per_bin=1,
-            num_bootstrap_samples=10
-        )[:-1]
-        benchmark_values = pd.read_csv(benchmarks[benchmark_name],
-                                       index_col=0)[:-1]
+        benchmark_path = os.path.join(benchmark_dir,
+                                      '{}.csv'.format(benchmark_name))
+        if not os.path.exists(benchmark_path):
+            logging.error('FAIL: No benchmark found at %s. Fast '
+                          'benchmarks are created with `python3 tests.py '
+                          '--update-fast-benchmarks`.', benchmark_path)
+            passing_all_benchmarks.append(False)
+            continue
+        estimate_with_stdev = estimates[benchmark_name]
+        benchmark_values = pd.read_csv(benchmark_path, index_col=0)
+        benchmark_values = benchmark_values.drop(index=buq.RUN_INFO_OUTPUTS,
+                                                 errors='ignore')
+        estimate_with_stdev = estimate_with_stdev.loc[benchmark_values.index]
         if not np.allclose(estimate_with_stdev, benchmark_values):
             logging.error(
-                'FAIL: Model outputs do not match benchmark outputs!\n'
+                'FAIL: %s model outputs do not match benchmark outputs!\n'
                 'Model outputs: \n%s\n \nBenchmark outputs:\n%s\n',
-                estimate_with_stdev, benchmark_values
+                benchmark_name, estimate_with_stdev, benchmark_values
             )
             passing = False
         else:
-            logging.info('Outputs match benchmark.')
+            logging.info('%s outputs match benchmark.', benchmark_name)
         passing_all_benchmarks.append(passing)
 
     passing = all(passing_all_benchmarks)
@@ -206,5 +338,1195 @@ def test_outputs_against_benchmarks():
     return passing
 
 
+def _write_fast_time_series(tmp_dir):
+    """Write the synthetic data of the fast tier to a CSV file in tmp_dir,
+    and return its path."""
+    ts_data_path = os.path.join(tmp_dir, FAST_TS_DATA_FILENAME)
+    make_fast_time_series().to_csv(ts_data_path)
+    return ts_data_path
+
+
+def test_reuse_backend():
+    """Test that re-solving a planning model's optimisation problem with a
+    new time series gives the same outputs as building the model from
+    scratch on that time series."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ts_data = buq.import_time_series_data(
+            _write_fast_time_series(tmp_dir)
+        )
+        samples = [buq.bootstrap_sample_weeks(
+            ts_data, 1, rng=np.random.default_rng(seed)
+        ) for seed in range(2)]
+    buq._BACKEND_MODELS.clear()
+    for sample in samples:    # The second sample re-solves the first
+        reused = buq.run_simulation('LP_planning', sample,
+                                    reuse_backend=True,
+                                    check_consistency=False)
+    assert len(buq._BACKEND_MODELS) == 1, \
+        'samples of the same length did not share an optimisation problem'
+    buq._BACKEND_MODELS.clear()
+    fresh = buq.run_simulation('LP_planning', samples[1],
+                               check_consistency=False)
+    reused, fresh = (reused.drop(index=buq.RUN_INFO_OUTPUTS),
+                     fresh.drop(index=buq.RUN_INFO_OUTPUTS))
+    assert np.allclose(reused, fresh, rtol=1e-4, atol=1e-4), \
+        'outputs of re-solved optimisation problem differ from those of a ' \
+        'new model:\n{}'.format(pd.concat([reused, fresh], axis=1,
+                                          keys=['reused', 'fresh']))
+
+
+def test_online_moments():
+    """Test that the running moments of buq.OnlineMoments match those
+    calculated from all values at once, also for values with a large
+    offset and with missing values skipped, and that the standard error of
+    the stdev estimate matches its known value for normal values."""
+    rng = np.random.default_rng(0)
+    values = pd.DataFrame(rng.normal(size=(2000, 3)),
+                          columns=['a', 'b', 'c'])
+    values['c'] += 1e8    # Loses all precision with sums of squares
+    values.loc[::7, 'b'] = np.nan
+    moments = buq.OnlineMoments(values.columns)
+    for _, row in values.iterrows():
+        moments.update(row)
+    assert np.array_equal(moments.count, values.count()), \
+        'counts {} instead of {}'.format(moments.count, values.count().values)
+    assert np.allclose(moments.mean, values.mean(), rtol=1e-12), \
+        'means {} instead of {}'.format(moments.mean, values.mean().values)
+    assert np.allclose(moments.variance(), values.var(ddof=1), rtol=1e-6), \
+        'variances {} instead of {}'.format(moments.variance().values,
+                                            values.var(ddof=1).values)
+
+    # The sample stdev of n normal values has a relative standard error of
+    # about 1/sqrt(2n)
+    relative_error = moments.stdev_relative_standard_error()
+    expected = 1 / np.sqrt(2 * values.count())
+    assert np.allclose(relative_error, expected, rtol=0.15), \
+        'relative standard errors of stdev {} instead of about {}'.format(
+            relative_error.values, expected.values
+        )
+    assert np.isinf(
+        buq.OnlineMoments(['a']).stdev_relative_standard_error()
+    ).all(), 'stdev without samples has a finite standard error'
+
+
+def test_run_store_resume():
+    """Test that a BUQ run that crashed while storing a simulation in its
+    run store is resumed by running only that simulation again, with the
+    same estimates as if it had not crashed, and that the store cannot be
+    reopened with another configuration."""
+    config = {'model_name_in_paper': 'LP_planning'}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ts_data_path = _write_fast_time_series(tmp_dir)
+        run_store_dir = os.path.join(tmp_dir, 'run_store')
+
+        def run_with_store():
+            return buq.run_buq_algorithm(
+                model_name_in_paper='LP_planning',
+                point_sample_length=8760,
+                bootstrap_scheme='weeks',
+                num_blocks_per_bin=1,
+                num_bootstrap_samples=3,
+                consistency_check='off',
+                run_store=storage.RunStore(run_store_dir, config),
+                ts_data_path=ts_data_path
+            )
+
+        finished = run_with_store()
+        # Cut the last record short, as in a crash while writing it
+        samples_path = os.path.join(run_store_dir, 'samples.jsonl')
+        with open(samples_path) as file:
+            lines = file.readlines()
+        with open(samples_path, 'w') as file:
+            file.writelines(lines[:-1] + [lines[-1][:20]])
+        resumed = run_with_store()
+        with open(samples_path) as file:
+            num_records = sum(line.rstrip().endswith('}}') for line in file)
+        assert num_records == 3, \
+            'resumed run stored {} simulations in total instead of ' \
+            'running only the one cut short again'.format(num_records)
+        assert np.allclose(resumed, finished, equal_nan=True), \
+            'resumed run gave other estimates:\n{}'.format(
+                pd.concat([resumed, finished], axis=1,
+                          keys=['resumed', 'finished'])
+            )
+
+        try:
+            storage.RunStore(run_store_dir,
+                             dict(config, num_blocks_per_bin=2))
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('run store reopened with another '
+                                 'configuration')
+
+
+def test_result_store():
+    """Test that a result store keeps the outputs of every bootstrap
+    simulation of a parallel BUQ run, from which its stdev estimates can be
+    calculated again, before and after compacting, and their dispatch."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        result_store = storage.ResultStore(os.path.join(tmp_dir, 'results'),
+                                           store_dispatch=True)
+        point_estimate_stdev = buq.run_buq_algorithm(
+            model_name_in_paper='LP_planning',
+            point_sample_length=8760,
+            bootstrap_scheme='weeks',
+            num_blocks_per_bin=1,
+            num_bootstrap_samples=3,
+            num_workers=2,
+            consistency_check='off',
+            seed=0,
+            ts_data_path=_write_fast_time_series(tmp_dir),
+            result_store=result_store
+        )
+        stored = result_store.load()
+        result_store.compact()
+        compacted = result_store.load()
+        dispatch = result_store.load_dispatch(stored['sim_id'].iloc[0])
+
+    assert sorted(stored['sample_num']) == [0, 1, 2], \
+        'result store has samples {}'.format(list(stored['sample_num']))
+    assert (stored['seed'] == 0).all(), 'result store has wrong seeds'
+    assert compacted.equals(stored), \
+        'result store changed on compacting:\n{}\n{}'.format(stored,
+                                                            compacted)
+    outputs = point_estimate_stdev.index
+    stdev = np.sqrt(4*7*24/8760) * stored[outputs].std(ddof=1)
+    assert np.allclose(stdev, point_estimate_stdev.loc[outputs, 'stdev']), \
+        'stdev of stored outputs does not match the stdev estimates'
+    assert dispatch.shape[0] == stored['num_timesteps'].iloc[0], \
+        'stored dispatch has {} instead of {} time steps'.format(
+            dispatch.shape[0], stored['num_timesteps'].iloc[0]
+        )
+
+
+def test_result_cache():
+    """Test that a simulation that is run again with a result cache is
+    loaded from the cache, whereas one on other data is solved, and that a
+    full cache removes its least recently used entries, where reading an
+    entry counts as using it, until it is within 90% of its size cap."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ts_data = buq.import_time_series_data(
+            _write_fast_time_series(tmp_dir)
+        )
+        samples = [ts_data.iloc[:4*7*24], ts_data.iloc[-4*7*24:]]
+        result_cache = storage.ResultCache(os.path.join(tmp_dir, 'cache'))
+        results = buq.run_simulation('LP_planning', samples[0],
+                                     check_consistency=False,
+                                     result_cache=result_cache)
+        # Mark the cached outputs, to tell them apart from a new solve
+        marked = results.copy()
+        marked.loc['cost_total'] = -1.
+        result_cache.put(buq.get_simulation_key('LP_planning', samples[0]),
+                         marked)
+        rerun = buq.run_simulation('LP_planning', samples[0],
+                                   check_consistency=False,
+                                   result_cache=result_cache)
+        other = buq.run_simulation('LP_planning', samples[1],
+                                   check_consistency=False,
+                                   result_cache=result_cache)
+    assert rerun.loc['cost_total', 'output'] == -1., \
+        'simulation run again was not loaded from the result cache'
+    assert other.loc['cost_total', 'output'] > 0, \
+        'simulation on other data was loaded from the result cache'
+
+    results = pd.DataFrame({'output': [1., 2.]}, index=['cost', 'status'])
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        entry_size = len('{"cost": 1.0, "status": 2.0}')
+        result_cache = storage.ResultCache(
+            tmp_dir, max_size_mb=3.5 * entry_size / 2**20
+        )
+        for i, key in enumerate(['a', 'b', 'c']):
+            result_cache.put(key, results)
+            # Distinct use times, whatever the file system's resolution
+            os.utime(os.path.join(tmp_dir, key + '.json'), (i, i))
+        result_cache.get('a')
+        result_cache.put('d', results)
+        keys = [key for key in 'abcd' if os.path.exists(
+            os.path.join(tmp_dir, key + '.json')
+        )]
+    assert keys == ['a', 'c', 'd'], \
+        "result cache kept entries {} instead of ['a', 'c', 'd']".format(
+            keys
+        )
+
+    # A full cache is reduced to RESULT_CACHE_EVICT_FRACTION of its cap, so
+    # that it is not scanned again on every new entry
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        max_size = 10.5 * entry_size
+        result_cache = storage.ResultCache(tmp_dir,
+                                           max_size_mb=max_size / 2**20)
+        for i in range(11):
+            result_cache.put('key{:02d}'.format(i), results)
+            os.utime(os.path.join(tmp_dir, 'key{:02d}.json'.format(i)),
+                     (i, i))
+        keys = sorted(os.listdir(tmp_dir))
+        size = sum(os.path.getsize(os.path.join(tmp_dir, key))
+                   for key in keys)
+        running_size = result_cache._size
+    assert keys == ['key{:02d}.json'.format(i) for i in range(2, 11)], \
+        'result cache kept entries {} instead of the 9 most recent'.format(
+            keys
+        )
+    assert size <= storage.RESULT_CACHE_EVICT_FRACTION * max_size, \
+        'result cache of {} bytes after eviction, above {} of its cap ' \
+        'of {} bytes'.format(size, storage.RESULT_CACHE_EVICT_FRACTION,
+                             max_size)
+    assert running_size == size, \
+        'running result cache size {} instead of {}'.format(running_size,
+                                                            size)
+
+
+def test_aggregation_weights():
+    """Test that aggregated time series keep the total weight of the
+    original one, that k-means keeps the mean of each column and k-medoids
+    picks periods of the original data, and that solving a model on a week
+    repeated twice gives the same outputs with the repeated days
+    aggregated away."""
+    ts_data = make_fast_time_series()
+    periods = ts_data.values.reshape(-1, 24*ts_data.shape[1])
+    for method in aggregation.AGGREGATION_METHODS:
+        aggregated = aggregation.aggregate_time_series(ts_data, 10,
+                                                       method=method)
+        weights = aggregated.pop('weight')
+        assert aggregated.shape == (10*24, ts_data.shape[1]), \
+            '{}: aggregated time series has shape {}'.format(
+                method, aggregated.shape
+            )
+        assert weights.sum() == ts_data.shape[0], \
+            '{}: weights add up to {} instead of {}'.format(
+                method, weights.sum(), ts_data.shape[0]
+            )
+        if method == 'kmeans':
+            means = aggregated.mul(weights, axis=0).sum() / weights.sum()
+            assert np.allclose(means, ts_data.mean()), \
+                'kmeans: weighted means {} differ from means {}'.format(
+                    means.values, ts_data.mean().values
+                )
+        else:
+            rep_periods = aggregated.values.reshape(10, -1)
+            assert all((periods == rep_period).all(axis=1).any()
+                       for rep_period in rep_periods), \
+                'kmedoids: representative days are not days of the data'
+
+    week = ts_data.iloc[:7*24]
+    two_weeks = pd.DataFrame(
+        np.tile(week.values, (2, 1)), columns=week.columns,
+        index=pd.date_range(week.index[0], periods=2*7*24, freq='h')
+    )
+    full = buq.run_simulation('LP_planning', two_weeks,
+                              check_consistency=False)
+    aggregated = buq.run_simulation('LP_planning', two_weeks,
+                                    check_consistency=False,
+                                    aggregation_settings={'num_periods': 7})
+    full = full.loc[:, 'output'].drop(buq.RUN_INFO_OUTPUTS)
+    aggregated = aggregated.loc[:, 'output'].drop(buq.RUN_INFO_OUTPUTS)
+    assert np.allclose(aggregated, full, rtol=1e-4), \
+        'aggregated outputs differ from full resolution:\n{}'.format(
+            pd.concat([full, aggregated], axis=1,
+                      keys=['full', 'aggregated'])
+        )
+
+
+def _timed_sleep_job(model_name_in_paper, solver, solver_threads,
+                     duration):
+    """Scheduler job that sleeps, and returns when it ran and with how
+    many solver threads."""
+    start = time.time()
+    time.sleep(duration)
+    return start, time.time(), solver_threads
+
+
+def _get_max_concurrent_jobs(jobs):
+    """Largest number of jobs, given as (start, end, ...), that ran at the
+    same time."""
+    return max(sum(other[0] <= job[0] < other[1] for other in jobs)
+               for job in jobs)
+
+
+def test_scheduler_budget():
+    """Test that the job scheduler never runs more jobs at once than fit in
+    its core and memory budgets, with its own memory and cost estimates if
+    given, that waiting jobs start most expensive first, and that shutting
+    down cancels the waiting jobs after the running ones have finished."""
+    with scheduler.JobScheduler(num_cores=2, memory_mb=10000) as sched:
+        futures = [sched.submit(_timed_sleep_job, 'LP_planning', 100,
+                                duration=0.5) for _ in range(4)]
+        futures.append(sched.submit(_timed_sleep_job, 'MILP_planning', 100,
+                                    duration=0.5))
+        jobs = [future.result() for future in futures]
+    assert _get_max_concurrent_jobs(jobs[:4]) == 2, \
+        '{} LP jobs ran at once on 2 cores'.format(
+            _get_max_concurrent_jobs(jobs[:4])
+        )
+    assert jobs[4][2] == 2 and _get_max_concurrent_jobs(jobs) == 2, \
+        'MILP job did not get both cores to itself'
+
+    # LP jobs on 100 time steps need 525 MB each, so 2 fit in 1200 MB
+    with scheduler.JobScheduler(num_cores=4, memory_mb=1200) as sched:
+        futures = [sched.submit(_timed_sleep_job, 'LP_planning', 100,
+                                duration=0.5) for _ in range(4)]
+        jobs = [future.result() for future in futures]
+    assert _get_max_concurrent_jobs(jobs) == 2, \
+        '{} LP jobs ran at once within the memory budget of 2'.format(
+            _get_max_concurrent_jobs(jobs)
+        )
+
+    with scheduler.JobScheduler(num_cores=1, memory_mb=10000) as sched:
+        first = sched.submit(_timed_sleep_job, 'LP_planning', 100,
+                             duration=1)
+        cheap = sched.submit(_timed_sleep_job, 'LP_planning', 100,
+                             duration=0)
+        costly = sched.submit(_timed_sleep_job, 'LP_planning', 1000,
+                              duration=0)
+        first, cheap, costly = (first.result(), cheap.result(),
+                                costly.result())
+    assert first[1] <= costly[0] <= cheap[0], \
+        'waiting jobs did not start in order of cost'
+
+    # LP jobs on 100 time steps now need 200 MB each, so 3 fit in 600 MB
+    with scheduler.JobScheduler(
+            num_cores=4, memory_mb=600,
+            job_memory_mb=dict(scheduler.JOB_MEMORY_MB,
+                               LP_planning=(100, 1))
+    ) as sched:
+        futures = [sched.submit(_timed_sleep_job, 'LP_planning', 100,
+                                duration=0.5) for _ in range(4)]
+        jobs = [future.result() for future in futures]
+    assert _get_max_concurrent_jobs(jobs) == 3, \
+        '{} LP jobs ran at once with a memory estimate for 3'.format(
+            _get_max_concurrent_jobs(jobs)
+        )
+
+    with scheduler.JobScheduler(
+            num_cores=1, memory_mb=10000,
+            job_cost_per_timestep=dict(scheduler.JOB_COST_PER_TIMESTEP,
+                                       LP_planning=100)
+    ) as sched:
+        first = sched.submit(_timed_sleep_job, 'LP_planning', 100,
+                             duration=1)
+        milp = sched.submit(_timed_sleep_job, 'MILP_planning', 100,
+                            duration=0)
+        lp = sched.submit(_timed_sleep_job, 'LP_planning', 100, duration=0)
+        milp, lp = milp.result(), lp.result()
+    assert lp[0] <= milp[0], \
+        'waiting jobs did not start in order of the given costs'
+
+    sched = scheduler.JobScheduler(num_cores=1, memory_mb=10000)
+    running = sched.submit(_timed_sleep_job, 'LP_planning', 100, duration=1)
+    waiting = sched.submit(_timed_sleep_job, 'LP_planning', 100, duration=0)
+    time.sleep(0.2)    # Let the first job start
+    sched.shutdown()
+    assert running.done() and not running.cancelled(), \
+        'running job did not finish before shutting down'
+    assert waiting.cancelled(), 'waiting job was not cancelled on shutdown'
+
+
+def _claim_all_jobs(queue_dir):
+    """Claim jobs from a work queue until none are left, and return their
+    names."""
+    with work_queue.WorkQueue(queue_dir) as queue:
+        job_names = []
+        job = queue.claim()
+        while job is not None:
+            job_names.append(job[0])
+            job = queue.claim()
+    return job_names
+
+
+def test_work_queue_claim():
+    """Test that each job in a work queue is claimed by exactly one of
+    several workers claiming at the same time, that submitting a job again
+    reuses it, that a claimed job whose worker stops sending heartbeats
+    is put back in the queue, and that jobs are named by the given cost
+    estimates."""
+    num_jobs, num_workers = 40, 4
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with work_queue.WorkQueue(tmp_dir) as queue:
+            job_names = [queue.put(buq.run_years_simulation, 'LP_planning',
+                                   8760, startyear=startyear,
+                                   endyear=startyear)
+                         for startyear in range(num_jobs)]
+            queue.put(buq.run_years_simulation, 'LP_planning', 8760,
+                      startyear=0, endyear=0)
+        num_pending = len(os.listdir(os.path.join(tmp_dir, 'pending')))
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=num_workers) as executor:
+            claimed = sum(executor.map(_claim_all_jobs,
+                                       [tmp_dir] * num_workers), [])
+    assert num_pending == num_jobs, \
+        'work queue has {} pending jobs instead of {}'.format(num_pending,
+                                                              num_jobs)
+    assert sorted(claimed) == sorted(job_names), \
+        '{} jobs claimed {} times in total'.format(num_jobs, len(claimed))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with work_queue.WorkQueue(tmp_dir, claim_timeout=0.5) as queue:
+            for startyear in range(2):
+                queue.put(buq.run_years_simulation, 'LP_planning', 8760,
+                          startyear=startyear, endyear=startyear)
+            running, _ = queue.claim()
+            silent, _ = queue.claim()
+            queue.requeue_stale_jobs()
+            time.sleep(1)
+            queue.heartbeat(running)
+            queue.requeue_stale_jobs()
+            pending = queue._list_jobs('pending')
+            claimed = queue._list_jobs('claimed')
+    assert pending == [silent] and claimed == [running], \
+        'requeued jobs {} instead of only the job without heartbeat'.format(
+            pending
+        )
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        with work_queue.WorkQueue(
+                tmp_dir, job_cost_per_timestep={'LP_planning': 3}
+        ) as queue:
+            job_name = queue.put(buq.run_years_simulation, 'LP_planning',
+                                 8760, startyear=0, endyear=0)
+    assert job_name.startswith('{:012d}-'.format(3*8760)), \
+        'work queue job {} not named by the given cost'.format(job_name)
+
+
+def test_sample_index():
+    """Test that a BUQ run that gathers its bootstrap samples from the rows
+    in a sample index gives the same estimates as one that creates them
+    directly with the same seed, that the rows give those samples, and
+    that the index cannot be reopened with another seed."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ts_data_path = _write_fast_time_series(tmp_dir)
+        sample_index_dir = os.path.join(tmp_dir, 'sample_index')
+
+        def run_buq(sample_index_dir=None):
+            return buq.run_buq_algorithm(
+                model_name_in_paper='LP_planning',
+                point_sample_length=8760,
+                bootstrap_scheme='weeks',
+                num_blocks_per_bin=1,
+                num_bootstrap_samples=3,
+                consistency_check='off',
+                seed=0,
+                ts_data_path=ts_data_path,
+                sample_index_dir=sample_index_dir
+            )
+
+        direct = run_buq()
+        indexed = run_buq(sample_index_dir)
+        ts_data = buq.import_time_series_data(ts_data_path)
+        sample_index = storage.SampleIndexStore(sample_index_dir)
+        for sample_num in range(3):
+            sample = buq.create_bootstrap_sample(
+                'weeks', 1, rng=buq.get_sample_rng(0, sample_num),
+                ts_data_path=ts_data_path
+            )
+            rows = sample_index.load_rows(sample_num)
+            assert np.array_equal(ts_data.values[rows], sample.values), \
+                'rows of sample {} in the sample index do not give its ' \
+                'bootstrap sample'.format(sample_num)
+
+        try:
+            buq.write_sample_index(sample_index_dir, 'weeks', 1, seed=1,
+                                   sample_nums=range(3),
+                                   ts_data_path=ts_data_path)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('sample index reopened with another seed')
+    assert np.allclose(indexed, direct, equal_nan=True), \
+        'run with a sample index gave other estimates:\n{}'.format(
+            pd.concat([indexed, direct], axis=1, keys=['indexed', 'direct'])
+        )
+
+
+def test_adaptive_stopping():
+    """Test that the BUQ algorithm stops running bootstrap simulations
+    once the stdev estimates have converged, and not before the minimum
+    number of samples."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        point_estimate_stdev = buq.run_buq_algorithm(
+            model_name_in_paper='LP_planning',
+            point_sample_length=8760,
+            bootstrap_scheme='weeks',
+            num_blocks_per_bin=1,
+            num_bootstrap_samples=20,
+            consistency_check='off',
+            stdev_rel_tol=1e6,    # Converged as soon as possible
+            min_bootstrap_samples=3,
+            seed=0,
+            ts_data_path=_write_fast_time_series(tmp_dir)
+        )
+    num_samples = point_estimate_stdev['num_samples'].max()
+    assert num_samples == 3, \
+        'adaptive stopping used {} bootstrap samples instead of 3'.format(
+            num_samples
+        )
+    run_info = point_estimate_stdev.index.intersection(buq.RUN_INFO_OUTPUTS)
+    assert len(run_info) == 0, \
+        'stdev estimated for run information {}'.format(list(run_info))
+
+
+def _reference_sample_weeks(data, num_weeks_per_season):
+    """The original 'weeks' scheme sampler, one week at a time with the
+    global random state, against which buq.bootstrap_sample_weeks is
+    tested."""
+    samples = []
+    for _ in range(num_weeks_per_season):
+        for months in buq.SEASONS:
+            year = np.random.choice(list(data.index.year.unique()))
+            data_sel = data[(data.index.year == year)
+                            & (data.index.month.isin(months))]
+            possible_startdays = np.arange(data_sel.shape[0]/24 - 7 + 1)
+            rows = 24*np.random.choice(possible_startdays) + np.arange(7*24)
+            samples.append(data_sel.values[rows.astype(int)])
+    return np.concatenate(samples)
+
+
+def _reference_sample_months(data, num_years):
+    """The original 'months' scheme sampler, for data of complete non-leap
+    years, against which buq.bootstrap_sample_months is tested."""
+    num_data_years = data.shape[0] // 8760
+    month_ends = np.cumsum(buq.MONTH_HOURS)
+    samples = []
+    for _ in range(num_years):
+        month_years = [int(num_data_years*np.random.rand(1)[0])
+                       for _ in range(12)]
+        for month in range(12):
+            start = month_ends[month] - buq.MONTH_HOURS[month]
+            rows = 8760*month_years[month] + np.arange(start,
+                                                       month_ends[month])
+            samples.append(data.values[rows])
+    return np.concatenate(samples)
+
+
+def test_bootstrap_samplers():
+    """Test that the bootstrap samplers draw the same samples as the
+    original samplers with the same global random seed, and that the batch
+    samplers match the single-sample samplers where they should (see
+    their docstrings)."""
+    index = pd.date_range('2013-01-01', periods=3*8760, freq='h')
+    data = make_synthetic_time_series(index)    # Non-leap years
+    for scheme, sampler, reference_sampler in [
+            ('weeks', buq.bootstrap_sample_weeks, _reference_sample_weeks),
+            ('months', buq.bootstrap_sample_months,
+             _reference_sample_months)
+    ]:
+        np.random.seed(0)
+        sample = sampler(data, 2)
+        np.random.seed(0)
+        reference_sample = reference_sampler(data, 2)
+        assert np.array_equal(sample.values, reference_sample), \
+            '{} samples differ from those of the original sampler with ' \
+            'the same seed'.format(scheme)
+
+    for scheme, batch_sampler, sampler, num_samples in [
+            ('weeks', buq.bootstrap_sample_weeks_batch,
+             buq.bootstrap_sample_weeks, 1),
+            ('months', buq.bootstrap_sample_months_batch,
+             buq.bootstrap_sample_months, 3)
+    ]:
+        batch = batch_sampler(data, 2, num_samples,
+                              rng=np.random.default_rng(0))
+        sample = sampler(data, 2, rng=np.random.default_rng(0))
+        assert np.array_equal(batch[0], sample.values), \
+            'first {} batch sample differs from the single sample with ' \
+            'the same Generator'.format(scheme)
+
+
+def test_nested_phase_peak_memory():
+    """Test that the peak memory of a phase includes memory used before a
+    phase nested within it, which resets the peak memory."""
+    timer = timing.PhaseTimer()
+    with timer.phase('outer'):
+        array = np.ones(25_000_000)    # 200 MB
+        del array
+        with timer.phase('inner'):
+            pass
+    outer_peak = timer.phases['outer']['peak_rss_mb']
+    inner_peak = timer.phases['inner']['peak_rss_mb']
+    assert outer_peak is None or outer_peak >= inner_peak + 150, \
+        'peak memory of outer phase ({:.0f} MB) does not include memory ' \
+        'used before inner phase ({:.0f} MB)'.format(outer_peak, inner_peak)
+
+
+def test_time_series_cache_by_path():
+    """Test that CSVs with the same name in different directories get
+    separate binary copies, and that a changed CSV replaces its copy."""
+    ts_data = make_fast_time_series()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        paths = [os.path.join(tmp_dir, subdir, FAST_TS_DATA_FILENAME)
+                 for subdir in ['a', 'b']]
+        checks = [(paths[0], 1), (paths[1], 2), (paths[0], 1),
+                  (paths[1], 3)]
+        for path, scale in checks:
+            if not os.path.exists(path) or scale == 3:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                (scale * ts_data).to_csv(path)
+                # Distinct modification times, whatever the file system's
+                # resolution
+                os.utime(path, (scale, scale))
+            loaded = buq.import_time_series_data(path)
+            assert np.allclose(loaded.values, scale * ts_data.values), \
+                'data loaded from {} does not match the CSV'.format(path)
+
+
+def test_time_limit():
+    """Test that a MILP solve that reaches its time limit gives a failed
+    run instead of an error, and that the BUQ algorithm leaves failed
+    bootstrap simulations out of its stdev estimates."""
+    sample_length = 4*7*24
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ts_data_path = _write_fast_time_series(tmp_dir)
+        results = buq.run_simulation(
+            'MILP_planning',
+            buq.import_time_series_data(ts_data_path).iloc[:sample_length],
+            check_consistency=False, time_limit=0.01
+        )
+
+        # Two simulations that were solved to optimality before resuming
+        run_store = storage.RunStore(os.path.join(tmp_dir, 'run_store'),
+                                     {'model_name_in_paper': 'MILP_planning'})
+        for sample_num, cost in enumerate([1., 3.]):
+            run_store.append_sample(sample_num, run_store.get_seed(0),
+                                    pd.Series({'cost_total': cost,
+                                               'time': 1.,
+                                               'consistency_check': np.nan,
+                                               'status': 0.}))
+        point_estimate_stdev = buq.run_buq_algorithm(
+            model_name_in_paper='MILP_planning',
+            point_sample_length=8760,
+            bootstrap_scheme='weeks',
+            num_blocks_per_bin=1,
+            num_bootstrap_samples=3,
+            consistency_check='off',
+            run_store=run_store,
+            seed=0,
+            ts_data_path=ts_data_path,
+            time_limit=0.01,
+            straggler_policy='drop'
+        )
+    status = buq.RUN_STATUSES[int(results.loc['status', 'output'])]
+    assert status == 'failed', \
+        'time-limited run has status {} instead of failed'.format(status)
+    assert results.index.isin(buq.RUN_INFO_OUTPUTS).all(), \
+        'time-limited run has model outputs'
+    num_samples = point_estimate_stdev.loc['cost_total', 'num_samples']
+    assert num_samples == 2, \
+        'stdev estimated from {} samples instead of the 2 solved ' \
+        'ones'.format(num_samples)
+    stdev = np.sqrt(sample_length/8760) * np.std([1., 3.], ddof=1)
+    assert np.isclose(point_estimate_stdev.loc['cost_total', 'stdev'],
+                      stdev), 'stdev estimate includes the failed run'
+
+
+def _get_fixed_caps(nuclear_cap):
+    """Capacities of each technology in the 6 region model, with the given
+    nuclear capacity."""
+    fixed_caps = {'cap_{}_{}'.format(tech, region): 10.
+                  for tech in ['ccgt', 'ocgt', 'wind']
+                  for region in models.TOPOLOGY_6_REGION[tech]}
+    fixed_caps.update({
+        'cap_transmission_{}_{}'.format(region_from, region_to): 10.
+        for region_from, region_to in models.TOPOLOGY_6_REGION['transmission']
+    })
+    fixed_caps['cap_nuclear_region3'] = nuclear_cap
+    return fixed_caps
+
+
+def test_nuclear_units():
+    """Test that fixed nuclear capacities, whether or not they are a
+    multiple of 3GW, are split into the smallest number of equal units of
+    at most 3GW and are operated at that capacity, and that missing
+    capacities raise a KeyError."""
+    idx = 'locations.region3.techs.nuclear_region3.constraints.'
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ts_data = buq.import_time_series_data(
+            _write_fast_time_series(tmp_dir)
+        )
+    for nuclear_cap, num_units in [(0., 0), (6., 2), (7., 3)]:
+        fixed_caps = _get_fixed_caps(nuclear_cap)
+        o_dict = models.get_cap_override_dict('6_region', fixed_caps)
+        assert o_dict[idx + 'units_equals'] == num_units, \
+            '{}GW of nuclear split into {} units instead of {}'.format(
+                nuclear_cap, o_dict[idx + 'units_equals'], num_units
+            )
+        assert o_dict[idx + 'energy_cap_per_unit'] <= 3, \
+            'nuclear units larger than 3GW'
+    for nuclear_cap in [0., 7.]:    # Operate runs are slow: edge cases only
+        results = buq.run_simulation('operation', ts_data,
+                                     check_consistency=False,
+                                     fixed_caps=_get_fixed_caps(nuclear_cap))
+        operated_cap = results.loc['cap_nuclear_region3', 'output']
+        assert np.isclose(operated_cap, nuclear_cap), \
+            '{}GW of nuclear operated with capacity {}GW'.format(
+                nuclear_cap, operated_cap
+            )
+    fixed_caps = _get_fixed_caps(6.)
+    del fixed_caps['cap_ocgt_region6']
+    try:
+        models.get_cap_override_dict('6_region', fixed_caps)
+    except KeyError:
+        pass
+    else:
+        raise AssertionError('missing capacity did not raise a KeyError')
+
+
+def test_plan_operate_capacities():
+    """Test that the operation runs of the plan-operate pipeline use the
+    capacities of the planning point estimate, or of the planning run on
+    the same bootstrap sample."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        estimates = {
+            capacities: buq.calculate_plan_operate_estimates(
+                point_estimate_range=[2017, 2017],
+                bootstrap_scheme='weeks',
+                num_blocks_per_bin=2,    # Longer than the operate horizon
+                num_bootstrap_samples=2,
+                planning_model_name_in_paper='LP_planning',
+                capacities=capacities,
+                consistency_check='off',
+                seed=0,
+                ts_data_path=_write_fast_time_series(tmp_dir)
+            ) for capacities in ['point_estimate', 'bootstrap']
+        }
+    caps = [output for output in estimates['bootstrap'].index
+            if output.startswith('cap_')]
+    planning, operation = (estimates['bootstrap'].loc[caps, model_name]
+                           for model_name in ['LP_planning', 'operation'])
+    assert np.allclose(operation, planning, atol=1e-6), \
+        'operation runs do not use the capacities of the planning runs on ' \
+        'the same samples:\n{}'.format(pd.concat(
+            [planning, operation], axis=1, keys=['planning', 'operation']
+        ))
+    operation = estimates['point_estimate'].loc[caps, 'operation']
+    assert np.allclose(operation.loc[:, 'point_estimate'],
+                       planning.loc[:, 'point_estimate'], atol=1e-6), \
+        'operation point estimate does not use the planning point ' \
+        'estimate capacities'
+    assert np.allclose(operation.loc[:, 'stdev'], 0., atol=1e-6), \
+        'operation bootstrap runs do not use the planning point estimate ' \
+        'capacities'
+
+
+def test_block_rows():
+    """Test that the blocks of a BlockSolutionCache are the weeks of the
+    'weeks' scheme bootstrap samples with the same seed, and that each
+    lead-in is the hours just before its block, shortened at the start of
+    the data."""
+    num_weeks_per_season, lead_in_hours = 2, 24
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ts_data_path = _write_fast_time_series(tmp_dir)
+        block_cache = operation.BlockSolutionCache(
+            lead_in_hours=lead_in_hours, ts_data_path=ts_data_path
+        )
+        samples = [buq.create_bootstrap_sample(
+            'weeks', num_weeks_per_season,
+            rng=buq.get_sample_rng(0, sample_num), ts_data_path=ts_data_path
+        ) for sample_num in range(3)]
+    for sample_num, sample in enumerate(samples):
+        year_nums, startdays = buq.draw_weeks(
+            block_cache.ts_data, num_weeks_per_season, num_samples=1,
+            rng=buq.get_sample_rng(0, sample_num)
+        )
+        sample_rows = []
+        for week in range(num_weeks_per_season):
+            for season in range(4):
+                rows, num_lead_in = block_cache._get_block_rows(
+                    int(year_nums[0, week, season]), season,
+                    int(startdays[0, week, season])
+                )
+                block_start = rows[num_lead_in]
+                assert num_lead_in == min(lead_in_hours, block_start), \
+                    'lead-in of {} hours before row {}'.format(num_lead_in,
+                                                               block_start)
+                assert (rows == np.arange(block_start - num_lead_in,
+                                          block_start + 7*24)).all(), \
+                    'block and lead-in are not consecutive hours'
+                sample_rows.append(rows[num_lead_in:])
+        assert np.array_equal(
+            block_cache.ts_data.values[np.concatenate(sample_rows)],
+            sample.values
+        ), 'blocks of sample {} are not its weeks'.format(sample_num)
+    rows, num_lead_in = block_cache._get_block_rows(0, 0, 0)
+    assert rows[0] == 0 and num_lead_in == 0, \
+        'block at the start of the data has a lead-in'
+
+
+def _solve_block_again(*args):
+    """Stand-in for operation._solve_block, for blocks that should be
+    loaded from a cache instead of solved."""
+    raise AssertionError('stored block solution solved again')
+
+
+def test_block_solution_cache():
+    """Test that block solutions have the dispatch of their block without
+    the lead-in, that stored solutions are reused instead of solved again,
+    and that without nuclear, which links consecutive hours via its
+    ramping, the outputs assembled from blocks match a full solve."""
+    fixed_caps = _get_fixed_caps(0.)
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ts_data_path = _write_fast_time_series(tmp_dir)
+        cache_dir = os.path.join(tmp_dir, 'blocks')
+        block_cache = operation.BlockSolutionCache(
+            fixed_caps=fixed_caps, cache_dir=cache_dir,
+            ts_data_path=ts_data_path
+        )
+        errors = operation.check_block_accuracy(
+            block_cache, num_weeks_per_season=2, num_samples=1
+        )
+        reloaded = operation.BlockSolutionCache(
+            fixed_caps=fixed_caps, cache_dir=cache_dir,
+            ts_data_path=ts_data_path
+        )
+        solve_block = operation._solve_block
+        operation._solve_block = _solve_block_again
+        try:
+            outputs, reloaded_outputs = (
+                dict(operation.run_block_bootstrap_simulations(
+                    cache, 2, [0], seed=0
+                ))[0].drop(index=buq.RUN_INFO_OUTPUTS)
+                for cache in [block_cache, reloaded]
+            )
+        finally:
+            operation._solve_block = solve_block
+    for block, solution in block_cache._blocks.items():
+        rows, num_lead_in = block_cache._get_block_rows(*block)
+        demand = solution['carrier_con'].loc[
+            ['{}::demand_power::power'.format(region)
+             for region in models.TOPOLOGY_6_REGION['demand']]
+        ]
+        block_demand = block_cache.ts_data.iloc[rows[num_lead_in:]].loc[
+            :, ['demand_{}'.format(region)
+                for region in models.TOPOLOGY_6_REGION['demand']]
+        ]
+        assert np.allclose(-demand.values, block_demand.values.T), \
+            'dispatch of block {} is not that of its hours'.format(block)
+    assert np.allclose(outputs, reloaded_outputs), \
+        'outputs from stored block solutions differ'
+    worst = errors.loc[:, 'max_rel_error'].idxmax()
+    assert errors.loc[worst, 'max_rel_error'] < 1e-4, \
+        '{} from blocks differs from full solve by {:.2%}'.format(
+            worst, errors.loc[worst, 'max_rel_error']
+        )
+
+
+def test_operation_chunks():
+    """Test that operation runs are split into chunks of whole operation
+    windows, with a shorter last chunk if the run ends in the middle of a
+    window, and that there are never more chunks than windows."""
+    window = models.OPERATION_WINDOW_HOURS
+    checks = [((4*window, 2), [(0, 2*window), (2*window, 4*window)]),
+              ((3*window + 100, 2), [(0, 2*window),
+                                     (2*window, 3*window + 100)]),
+              ((window + 100, 5), [(0, window), (window, window + 100)]),
+              ((window - 100, 3), [(0, window - 100)]),
+              ((2*window, 0), [(0, 2*window)])]
+    for (num_timesteps, num_chunks), chunks in checks:
+        result = operation.get_operation_chunks(num_timesteps, num_chunks)
+        assert result == chunks, \
+            '{} time steps in {} chunks split as {} instead of {}'.format(
+                num_timesteps, num_chunks, result, chunks
+            )
+
+
+def test_stitched_operation_chunks():
+    """Test that the dispatch stitched together from chunks solved with
+    lead-ins covers each time step of the run exactly once, in order, with
+    the dispatch of that time step."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ts_data = buq.import_time_series_data(
+            _write_fast_time_series(tmp_dir)
+        )
+    solution = operation.solve_operation_chunks(
+        ts_data, num_chunks=2, lead_in_hours=168, num_workers=1,
+        fixed_caps=_get_fixed_caps(0.)    # Fast to solve
+    )
+    for name in ['carrier_prod', 'carrier_con']:
+        timesteps = solution[name].columns
+        assert timesteps.equals(ts_data.index) and timesteps.is_unique, \
+            '{} has time steps {} instead of those of the run'.format(
+                name, timesteps
+            )
+    demand = solution['carrier_con'].loc[
+        ['{}::demand_power::power'.format(region)
+         for region in models.TOPOLOGY_6_REGION['demand']]
+    ]
+    run_demand = ts_data.loc[:, ['demand_{}'.format(region) for region in
+                                 models.TOPOLOGY_6_REGION['demand']]]
+    assert np.allclose(-demand.values, run_demand.values.T), \
+        'stitched dispatch is not aligned with the time steps of the run'
+
+
+def test_paired_models():
+    """Test that the models of a multi-model BUQ run share their bootstrap
+    samples, and that the paired differences and their stdev estimates are
+    those of the differences between the models' outputs on each
+    sample."""
+    model_names = ['LP_planning', 'MILP_planning']
+    difference = 'LP_planning - MILP_planning'
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        run_store_dir = os.path.join(tmp_dir, 'run_store')
+        estimates = buq.calculate_point_estimates_and_stdevs(
+            model_names,
+            point_estimate_range=[2017, 2017],
+            bootstrap_scheme='weeks',
+            num_blocks_per_bin=1,
+            num_bootstrap_samples=3,
+            paired_differences=True,
+            consistency_check='off',
+            seed=0,
+            mip_gap=0.05,
+            run_store_dir=run_store_dir,
+            ts_data_path=_write_fast_time_series(tmp_dir)
+        )
+        # Reopen the run store with the configuration it was created with
+        with open(os.path.join(run_store_dir, 'config.json')) as file:
+            run_store = storage.RunStore(run_store_dir, json.load(file))
+        samples = [outputs.drop(index=buq.RUN_INFO_OUTPUTS) for _, outputs
+                   in run_store.load_samples().values()]
+
+    for outputs in samples:
+        assert np.isclose(outputs.loc['demand_total', 'LP_planning'],
+                          outputs.loc['demand_total', 'MILP_planning']), \
+            'models were run on different bootstrap samples'
+        expected_difference = (outputs['LP_planning']
+                               - outputs['MILP_planning'])
+        assert np.allclose(outputs[difference], expected_difference), \
+            'paired differences are not those of the model outputs'
+    assert not np.isclose(samples[0].loc['demand_total', 'LP_planning'],
+                          samples[1].loc['demand_total', 'LP_planning']), \
+        'bootstrap samples are the same'
+
+    point_estimates = estimates.xs('point_estimate', axis=1, level=1)
+    assert np.allclose(point_estimates[difference].dropna(),
+                       (point_estimates['LP_planning']
+                        - point_estimates['MILP_planning']).drop(
+                            index=buq.RUN_INFO_OUTPUTS
+                        )), \
+        'paired difference point estimate is not that of the models'
+    differences = pd.concat([outputs[difference] for outputs in samples],
+                            axis=1)
+    point_sample_length = make_fast_time_series().shape[0]
+    expected_stdev = np.sqrt(
+        672/point_sample_length * differences.var(axis=1, ddof=1)
+    )
+    stdev = estimates.loc[expected_stdev.index, (difference, 'stdev')]
+    assert np.allclose(stdev, expected_stdev, equal_nan=True), \
+        'paired difference stdev is not that of the sample differences:\n' \
+        '{}'.format(pd.concat([stdev, expected_stdev], axis=1,
+                              keys=['estimated', 'expected']))
+
+
+def test_month_blocks():
+    """Test that 'months' scheme samples of data with a leap year (2020)
+    and a partial final year consist of complete calendar months in order,
+    never include the leap day, and only take months from the years in
+    which they are complete."""
+    index = pd.date_range('2019-01-01', '2021-05-20 23:00', freq='h')
+    data = make_synthetic_time_series(index)
+    block_index = buq.get_month_block_index(data)
+    assert list(block_index['years']) == [2019, 2020, 2021], \
+        'years {} in block index'.format(list(block_index['years']))
+    assert index[block_index['month_starts'][1, 2]] == \
+        pd.Timestamp('2020-03-01'), \
+        'March 2020 does not start after the leap day'
+    expected_num_candidates = [3, 3, 3, 3] + [2]*8    # Only to April 2021
+    assert list(block_index['num_candidates']) == expected_num_candidates, \
+        'calendar months complete in {} years instead of {}'.format(
+            list(block_index['num_candidates']), expected_num_candidates
+        )
+
+    num_samples, num_years = 20, 2
+    batch = buq.bootstrap_sample_months_batch(
+        data, num_years, num_samples, rng=np.random.default_rng(0)
+    )
+    rng = np.random.default_rng(0)
+    month_hours = np.repeat(np.tile(np.arange(1, 13), num_years),
+                            np.tile(buq.MONTH_HOURS, num_years))
+    years_used = set()
+    for sample_num in range(num_samples):
+        rows = buq.get_months_sample_rows(data, num_years, rng=rng)
+        assert np.array_equal(batch[sample_num], data.values[rows]), \
+            'batch sample {} differs from its rows'.format(sample_num)
+        timestamps = index[rows]
+        assert np.array_equal(timestamps.month, month_hours), \
+            'sample {} months are not in calendar order'.format(sample_num)
+        assert not ((timestamps.month == 2) & (timestamps.day == 29)).any(), \
+            'sample {} includes the leap day'.format(sample_num)
+        assert (timestamps < pd.Timestamp('2021-05-01')).all(), \
+            'sample {} includes the incomplete May 2021'.format(sample_num)
+        within_month = np.diff(timestamps)[np.diff(month_hours) == 0]
+        assert (within_month == pd.Timedelta('1h')).all(), \
+            'sample {} months are not consecutive hours'.format(sample_num)
+        years_used.update(timestamps.year[timestamps.month == 2])
+    assert years_used == {2019, 2020, 2021}, \
+        'February taken only from {}'.format(sorted(years_used))
+
+
+def test_parallel_workers():
+    """Test that a BUQ run over several worker processes gives the same
+    bootstrap outputs and stdev estimates as a serial run with the same
+    seed."""
+    config = {'model_name_in_paper': 'LP_planning'}
+    samples, estimates = {}, {}
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ts_data_path = _write_fast_time_series(tmp_dir)
+        for num_workers in [1, 2]:
+            run_store = storage.RunStore(
+                os.path.join(tmp_dir, 'run_store_{}'.format(num_workers)),
+                config
+            )
+            estimates[num_workers] = buq.run_buq_algorithm(
+                model_name_in_paper='LP_planning',
+                point_sample_length=8760,
+                bootstrap_scheme='weeks',
+                num_blocks_per_bin=1,
+                num_bootstrap_samples=4,
+                num_workers=num_workers,
+                consistency_check='off',
+                run_store=run_store,
+                seed=0,
+                ts_data_path=ts_data_path
+            )
+            samples[num_workers] = pd.DataFrame({
+                sample_num: outputs.drop(index=buq.RUN_INFO_OUTPUTS)
+                for sample_num, (_, outputs)
+                in run_store.load_samples().items()
+            }).sort_index(axis=1)
+
+    assert list(samples[2].columns) == [0, 1, 2, 3], \
+        'parallel run has samples {}'.format(list(samples[2].columns))
+    assert np.allclose(samples[2], samples[1]), \
+        'parallel run gave other bootstrap outputs than the serial run'
+    assert np.allclose(estimates[2], estimates[1], equal_nan=True), \
+        'parallel run gave other estimates than the serial run:\n{}'.format(
+            pd.concat([estimates[2], estimates[1]], axis=1,
+                      keys=['parallel', 'serial'])
+        )
+
+
+def test_point_sample_length():
+    """Test that the point estimate length used to rescale the variance is
+    the number of hours of data in the point estimate years, including leap
+    days and partial years, and that years without data raise an error."""
+    index = pd.date_range('2016-01-01', '2018-03-31 23:00', freq='h')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        ts_data_path = os.path.join(tmp_dir, 'demand_wind_partial.csv')
+        make_synthetic_time_series(index).to_csv(ts_data_path)
+        for point_estimate_range, expected_length in [
+                ([2016, 2016], 8784), ([2017, 2017], 8760),
+                ([2016, 2017], 17544), ([2018, 2018], 90*24),
+                ([2015, 2016], 8784)
+        ]:
+            point_sample_length = buq._get_point_sample_length(
+                point_estimate_range, ts_data_path
+            )
+            assert point_sample_length == expected_length, \
+                'point estimate length of {} is {} instead of {}'.format(
+                    point_estimate_range, point_sample_length,
+                    expected_length
+                )
+        try:
+            buq._get_point_sample_length([2019, 2020], ts_data_path)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('years without data did not raise a '
+                                 'ValueError')
+
+
+# Tests of individual features that do not solve any models, which take a
+# few seconds in total. A test fails by raising an AssertionError
+UNIT_TESTS = [test_online_moments, test_scheduler_budget,
+              test_work_queue_claim, test_bootstrap_samplers,
+              test_nested_phase_peak_memory, test_time_series_cache_by_path,
+              test_block_rows, test_operation_chunks, test_month_blocks,
+              test_point_sample_length]
+
+# Unit tests that solve models, from under a minute to several minutes
+# each. They are run with the full benchmarks
+SLOW_UNIT_TESTS = [test_reuse_backend, test_run_store_resume,
+                   test_result_store, test_result_cache,
+                   test_aggregation_weights, test_sample_index,
+                   test_adaptive_stopping, test_time_limit,
+                   test_nuclear_units, test_block_solution_cache,
+                   test_stitched_operation_chunks, test_paired_models,
+                   test_parallel_workers, test_plan_operate_capacities]
+
+
+def run_unit_tests(slow=False):
+    """Run the unit tests that do not solve models, and the slow ones
+    that do if slow is True, and return whether all of them passed."""
+    passing = True
+    for test in UNIT_TESTS + (SLOW_UNIT_TESTS if slow else []):
+        logging.info('Running %s', test.__name__)
+        try:
+            test()
+        except AssertionError as error:
+            logging.error('FAIL: %s: %s', test.__name__, error)
+            passing = False
+    if not passing:
+        logging.error('Some unit tests have failed! '
+                      'See log above for details')
+    else:
+        logging.info('All unit tests have passed.')
+    return passing
+
+
+def update_fast_benchmarks():
+    """Run the fast tier and store its outputs as the new fast benchmarks.
+
+    The full benchmarks are run first, and the fast benchmarks are only
+    stored if they pass, so that the fast tier is not certified by the
+    code it tests.
+
+    Returns:
+    --------
+    passing (bool) : whether the full benchmarks passed
+    """
+    if not test_outputs_against_benchmarks(tier='full'):
+        logging.error('Not updating the fast benchmarks, since the full '
+                      'benchmarks do not pass.')
+        return False
+    benchmark_dir = BENCHMARK_TIERS['fast']['benchmark_dir']
+    os.makedirs(benchmark_dir, exist_ok=True)
+    for benchmark_name, estimate_with_stdev in (
+            _run_benchmark_simulations('fast').items()):
+        benchmark_path = os.path.join(benchmark_dir,
+                                      '{}.csv'.format(benchmark_name))
+        estimate_with_stdev.to_csv(benchmark_path, float_format='%.10g')
+        logging.info('Saved fast benchmark to %s', benchmark_path)
+
+    return True
+
+
 if __name__ == '__main__':
-    test_outputs_against_benchmarks()
+    logging.basicConfig(
+        format='[%(asctime)s] %(levelname)s: %(message)s',
+        level=getattr(logging, 'INFO'),
+        datefmt='%Y-%m-%d,%H:%M:%S'
+    )
+    parser = argparse.ArgumentParser(
+        description='Run the unit tests and test model outputs against '
+                    'benchmarks. Runs the full tier unless --fast is given.'
+    )
+    parser.add_argument('--fast', action='store_true',
+                        help='run only the unit tests that do not solve '
+                             'models, and the fast benchmarks on synthetic '
+                             'data (about 2 minutes on a single core), '
+                             'instead of all unit tests and the full '
+                             'benchmarks on the 2017 data')
+    parser.add_argument('--update-fast-benchmarks', action='store_true',
+                        help='store the outputs of the fast tier as its '
+                             'new benchmarks')
+    parser.add_argument('--unit-only', action='store_true',
+                        help='run only the unit tests')
+    args = parser.parse_args()
+    if args.update_fast_benchmarks:
+        raise SystemExit(0 if update_fast_benchmarks() else 1)
+    else:
+        passing = run_unit_tests(slow=not args.fast)
+        if not args.unit_only:
+            passing = test_outputs_against_benchmarks(
+                tier='fast' if args.fast else 'full'
+            ) and passing
+        raise SystemExit(0 if passing else 1)
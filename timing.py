@@ -0,0 +1,121 @@
+"""Timing and memory instrumentation of simulations."""
+
+
+import os
+import json
+import time
+import contextlib
+try:
+    import resource
+except ImportError:    # Not available on Windows
+    resource = None
+
+
+def _reset_peak_rss():
+    """Reset the peak resident set size of this process, if the operating
+    system allows it (Linux only). Returns whether it was reset.
+    """
+    try:
+        with open('/proc/self/clear_refs', 'w') as file:
+            file.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _get_peak_rss_mb():
+    """Get the peak resident set size of this process, in MB.
+
+    On Linux, this is the peak since the last call of _reset_peak_rss.
+    Elsewhere, it is the peak since the process started, or None if it
+    cannot be determined.
+    """
+    try:
+        with open('/proc/self/status') as file:
+            for line in file:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024    # kB to MB
+    except OSError:
+        pass
+    if resource is not None:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return None
+
+
+class PhaseTimer:
+    """Wall time and peak resident memory of each phase of a simulation."""
+
+    def __init__(self):
+        """Create timer without any phases."""
+        self.phases = {}
+        self._open_peaks = []    # Peak memory of each running phase
+
+    def _update_open_peaks(self):
+        """Fold the peak memory since the last reset into all running
+        phases, before it is reset or a phase ends."""
+        peak_rss_mb = _get_peak_rss_mb()
+        if peak_rss_mb is not None:
+            self._open_peaks = [max(open_peak or 0, peak_rss_mb)
+                                for open_peak in self._open_peaks]
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Context manager that times a phase. The time of phases with the
+        same name is added up. Phases can be nested: the peak memory of a
+        phase includes that of the phases within it."""
+        self._update_open_peaks()
+        _reset_peak_rss()
+        self._open_peaks.append(None)
+        start = time.time()
+        try:
+            yield
+        finally:
+            duration = time.time() - start
+            self._update_open_peaks()
+            self._add(name, duration, self._open_peaks.pop())
+
+    def _add(self, name, duration, peak_rss_mb):
+        """Add duration to a phase, updating its peak memory."""
+        if name not in self.phases:
+            self.phases[name] = {'time': 0., 'peak_rss_mb': peak_rss_mb}
+        self.phases[name]['time'] += duration
+        if peak_rss_mb is not None:
+            self.phases[name]['peak_rss_mb'] = max(
+                self.phases[name]['peak_rss_mb'] or 0, peak_rss_mb
+            )
+
+    def split_phase(self, name, durations):
+        """Split a phase into parts that were timed elsewhere (e.g. by
+        Calliope). The parts get the peak memory of the whole phase.
+
+        Parameters:
+        -----------
+        name (str) : name of the phase to split
+        durations (dict) : name and duration of each part, in seconds
+        """
+        peak_rss_mb = self.phases.pop(name)['peak_rss_mb']
+        for part_name, duration in durations.items():
+            self._add(part_name, duration, peak_rss_mb)
+
+    def get_record(self, **info):
+        """Create a JSON-serialisable record of the phases, together with
+        information about the simulation (e.g. model name)."""
+        record = dict(info)
+        record['phases'] = {name: dict(phase)
+                            for name, phase in self.phases.items()}
+        return record
+
+
+def write_record(path, record):
+    """Append a record to a JSON lines file.
+
+    The record is written with a single call in append mode, so that
+    records from processes writing to the same file are not interleaved.
+    """
+    line = (json.dumps(record) + '\n').encode()
+    file_descriptor = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT,
+                              0o644)
+    try:
+        os.write(file_descriptor, line)
+    finally:
+        os.close(file_descriptor)
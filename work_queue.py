@@ -0,0 +1,560 @@
+"""
+Running simulations on several machines through a work queue in a shared
+directory.
+
+A coordinator writes a job file for each simulation to the queue, and any
+number of worker processes, on any machine that can see the directory,
+claim jobs, run them and write back their outputs. The coordinator then
+combines the outputs into the point and stdev estimates, as in
+buq.calculate_point_estimate_and_stdev. Jobs are claimed by renaming their
+file, which is atomic, so that no locks or servers are needed. Start the
+workers, and then the coordinator, from a command line in this directory:
+
+    python3 work_queue.py worker QUEUE_DIR
+    python3 work_queue.py coordinator QUEUE_DIR --model LP_planning
+"""
+
+
+import os
+import json
+import time
+import random
+import socket
+import hashlib
+import logging
+import argparse
+import threading
+import traceback
+import concurrent.futures
+import pandas as pd
+import buq
+import scheduler
+import storage
+
+
+# Subdirectories of the queue, one for each state of a job
+JOB_STATES = ['pending', 'claimed', 'done']
+
+# Functions in buq that jobs may run, by the name stored in the job file.
+# Workers run nothing else, whatever is in the queue directory. Looked up
+# when used, since buq may not be fully imported yet when this module is
+JOB_FUNCTIONS = {
+    'run_years_simulation': 'run_years_simulation',
+    'bootstrap_simulation': '_run_bootstrap_simulation_worker',
+    'run_multi_model_years_simulation': 'run_multi_model_years_simulation',
+    'multi_model_bootstrap_simulation':
+        '_run_multi_model_bootstrap_simulation_worker',
+    'run_plan_operate_years_simulation': 'run_plan_operate_years_simulation',
+    'plan_operate_bootstrap_simulation':
+        '_run_plan_operate_bootstrap_simulation_worker'
+}
+
+
+def _get_failed_result(function_name):
+    """Outputs of a job that raised an error: a run with status 'failed',
+    in the form the job function returns."""
+    results = pd.DataFrame(
+        {'output': [float(buq.RUN_STATUSES.index('failed'))]},
+        index=['status']
+    )
+    if function_name == 'bootstrap_simulation':
+        return results.loc[:, 'output']
+    return results
+
+
+def _encode_result(result):
+    """Convert the outputs of a simulation (pandas DataFrame or Series) to
+    JSON-serialisable values."""
+    if isinstance(result, pd.DataFrame):
+        return {'type': 'DataFrame', 'data': result.to_dict(orient='split')}
+    return {'type': 'Series', 'name': result.name, 'data': result.to_dict()}
+
+
+def _decode_result(record):
+    """Inverse of _encode_result."""
+    if record['type'] == 'DataFrame':
+        return pd.DataFrame(**record['data'])
+    return pd.Series(record['data'], name=record['name'], dtype=float)
+
+
+class WorkQueue:
+    """Queue of simulation jobs in a directory shared between machines.
+
+    The directory contains a subdirectory for each state of a job: a job
+    file is created in 'pending', moved to 'claimed' by the worker that
+    runs it, and its outputs are written to 'done'. Job files are named
+    by the estimated cost of the job and a hash of its arguments, so that
+    workers start the most expensive jobs first, and submitting a job
+    that is already in the queue (e.g. after restarting the coordinator)
+    reuses it instead of running it again. This requires the same seed,
+    so give one (or a run store, which keeps it) to runs through a queue.
+    Delete the directory once the run has finished.
+
+    Workers write a heartbeat counter for each job they run. Claimed jobs
+    whose counter has not changed for claim_timeout, as measured by the
+    clock of the coordinator, are put back in the queue. The clocks of
+    the machines therefore do not need to agree.
+
+    Has the same interface as scheduler.JobScheduler, so it can be passed
+    as the scheduler of buq.calculate_point_estimate_and_stdev and
+    buq.run_buq_algorithm. The arguments of each job are sent to the
+    workers as JSON, so result stores and caches cannot be given; workers
+    can use their own result cache instead (see run_worker).
+    """
+
+    def __init__(self, path, poll_interval=5, claim_timeout=None,
+                 job_cost_per_timestep=None):
+        """Open the queue in directory path, creating it if required.
+
+        Parameters:
+        -----------
+        path (str) : directory of the queue
+        poll_interval (float) : time between checks for finished jobs,
+            in seconds
+        claim_timeout (float) : if given, claimed jobs whose worker has
+            not sent a heartbeat for this long (in seconds), e.g. because
+            its machine crashed, are put back in the queue
+        job_cost_per_timestep (dict) : relative cost per time step of a
+            job of each model, which orders the jobs. Defaults to
+            scheduler.JOB_COST_PER_TIMESTEP
+        """
+
+        self.path = path
+        self.poll_interval = poll_interval
+        self.claim_timeout = claim_timeout
+        self.job_cost_per_timestep = dict(
+            job_cost_per_timestep or scheduler.JOB_COST_PER_TIMESTEP
+        )
+        for state in JOB_STATES:
+            os.makedirs(os.path.join(path, state), exist_ok=True)
+        self.worker_id = '{}:{}'.format(socket.gethostname(), os.getpid())
+        self._heartbeat_counts = {}    # Of the jobs run by this process
+        self._last_heartbeats = {}     # Heartbeat and time it was seen
+        self._heartbeat_lock = threading.Lock()
+        self._closed = threading.Event()
+        self._waiters = concurrent.futures.ThreadPoolExecutor()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.shutdown()
+
+    def shutdown(self):
+        """Stop waiting for submitted jobs. Jobs in the queue are kept."""
+        self._closed.set()
+        self._waiters.shutdown(wait=True)
+
+    def _get_job_path(self, state, job_name):
+        return os.path.join(self.path, state, job_name + '.json')
+
+    def _get_heartbeat_path(self, job_name):
+        return os.path.join(self.path, 'claimed', job_name + '.heartbeat')
+
+    def _remove_heartbeat(self, job_name):
+        try:
+            os.remove(self._get_heartbeat_path(job_name))
+        except FileNotFoundError:
+            pass
+
+    def _list_jobs(self, state):
+        """Names of the jobs in a state, skipping partly written files."""
+        return [file_name[:-len('.json')] for file_name
+                in os.listdir(os.path.join(self.path, state))
+                if file_name.endswith('.json')]
+
+    def put(self, function, model_name_in_paper, num_timesteps, **kwargs):
+        """Add a job that calls function(model_name_in_paper=...,
+        **kwargs), unless the same job is already in the queue.
+
+        Parameters:
+        -----------
+        function (callable) : one of the buq functions in JOB_FUNCTIONS
+        model_name_in_paper (str or list) : model, or models, the
+            function solves
+        num_timesteps (int) : length of the time series of the job, used
+            to estimate its cost
+        kwargs : other arguments of the function, as JSON-serialisable
+            values
+
+        Returns:
+        --------
+        job_name (str) : name of the job in the queue
+        """
+
+        function_names = {getattr(buq, function_name): name
+                          for name, function_name in JOB_FUNCTIONS.items()}
+        if function not in function_names:
+            raise ValueError('Work queue jobs must run one of {}.'.format(
+                list(JOB_FUNCTIONS)
+            ))
+        spec = {'function': function_names[function],
+                'kwargs': dict(kwargs,
+                               model_name_in_paper=model_name_in_paper)}
+        try:
+            spec_json = json.dumps(spec, sort_keys=True)
+        except TypeError:
+            raise ValueError('Work queue job arguments must be '
+                             'JSON-serialisable: {}'.format(kwargs))
+
+        cost = scheduler.get_job_cost(model_name_in_paper, num_timesteps,
+                                      self.job_cost_per_timestep)
+        job_name = '{:012d}-{}'.format(
+            int(cost), hashlib.sha256(spec_json.encode()).hexdigest()[:20]
+        )
+        if any(os.path.exists(self._get_job_path(state, job_name))
+               for state in JOB_STATES):
+            logging.info('Job %s is already in the queue.', job_name)
+        else:
+            storage._write_atomic(self._get_job_path('pending', job_name),
+                                  spec_json)
+
+        return job_name
+
+    def claim(self):
+        """Claim a pending job, the most expensive one first.
+
+        Returns:
+        --------
+        job (tuple) : job name and job specification (dict with the
+            function name and its keyword arguments), or None if there are
+            no pending jobs
+        """
+
+        job_names = self._list_jobs('pending')
+        # Spread workers over jobs of the same cost, to avoid contention
+        random.shuffle(job_names)
+        job_names.sort(key=lambda job_name: job_name.split('-')[0],
+                       reverse=True)
+        for job_name in job_names:
+            claimed_path = self._get_job_path('claimed', job_name)
+            try:
+                os.rename(self._get_job_path('pending', job_name),
+                          claimed_path)
+            except FileNotFoundError:
+                continue    # Claimed by another worker
+            self.heartbeat(job_name)
+            with open(claimed_path) as file:
+                return job_name, json.load(file)
+
+        return None
+
+    def heartbeat(self, job_name):
+        """Mark a claimed job as still running, by writing a new value of
+        its heartbeat counter."""
+        count = self._heartbeat_counts.get(job_name, 0) + 1
+        self._heartbeat_counts[job_name] = count
+        storage._write_atomic(self._get_heartbeat_path(job_name),
+                              '{} {}'.format(self.worker_id, count))
+
+    def complete(self, job_name, result, error=None):
+        """Store the outputs of a claimed job, and the error it raised (if
+        any), in which case result is a failed run."""
+        record = {'result': _encode_result(result)}
+        if error is not None:
+            record['error'] = error
+        storage._write_atomic(self._get_job_path('done', job_name),
+                              json.dumps(record))
+        self._heartbeat_counts.pop(job_name, None)
+        self._remove_heartbeat(job_name)
+        try:
+            os.remove(self._get_job_path('claimed', job_name))
+        except FileNotFoundError:
+            pass    # Put back in the queue meanwhile
+
+    def cancel(self, job_name):
+        """Remove a job from the queue if no worker has claimed it yet."""
+        try:
+            os.remove(self._get_job_path('pending', job_name))
+        except FileNotFoundError:
+            pass
+
+    def requeue_stale_jobs(self):
+        """Put claimed jobs without a recent heartbeat back in the queue,
+        if claim_timeout is set."""
+        if self.claim_timeout is None:
+            return
+        with self._heartbeat_lock:
+            claimed = self._list_jobs('claimed')
+            for job_name in set(self._last_heartbeats).difference(claimed):
+                del self._last_heartbeats[job_name]
+            for job_name in claimed:
+                try:
+                    with open(self._get_heartbeat_path(job_name)) as file:
+                        heartbeat = file.read()
+                except FileNotFoundError:
+                    heartbeat = None    # Claimed just now
+                last_heartbeat, seen = self._last_heartbeats.get(
+                    job_name, (None, None)
+                )
+                if seen is None or heartbeat != last_heartbeat:
+                    self._last_heartbeats[job_name] = (heartbeat,
+                                                       time.monotonic())
+                    continue
+                age = time.monotonic() - seen
+                if age <= self.claim_timeout:
+                    continue
+                try:
+                    os.rename(self._get_job_path('claimed', job_name),
+                              self._get_job_path('pending', job_name))
+                except FileNotFoundError:
+                    continue    # Finished meanwhile
+                self._remove_heartbeat(job_name)
+                del self._last_heartbeats[job_name]
+                logging.warning('Job %s has had no heartbeat for %s s. '
+                                'Putting it back in the queue.',
+                                job_name, int(age))
+
+    def get_result(self, job_name):
+        """Outputs of a finished job. Jobs that raised an error give a run
+        with status 'failed', which is handled by the straggler policy of
+        the BUQ algorithm."""
+        with open(self._get_job_path('done', job_name)) as file:
+            record = json.load(file)
+        if 'error' in record:
+            logging.error('Job %s failed on worker %s', job_name,
+                          record['error'])
+        return _decode_result(record['result'])
+
+    def _wait_for_job(self, job_name):
+        """Wait for a job to finish, and return its outputs."""
+        while not os.path.exists(self._get_job_path('done', job_name)):
+            self.requeue_stale_jobs()
+            if self._closed.wait(self.poll_interval):
+                raise RuntimeError('Work queue shut down before job {} '
+                                   'finished.'.format(job_name))
+        return self.get_result(job_name)
+
+    def submit(self, function, model_name_in_paper, num_timesteps,
+               **kwargs):
+        """Add a job to the queue, see put.
+
+        Returns:
+        --------
+        future (concurrent.futures.Future) : outputs of the job
+        """
+        job_name = self.put(function, model_name_in_paper, num_timesteps,
+                            **kwargs)
+        return self._waiters.submit(self._wait_for_job, job_name)
+
+    def map_samples(self, function, sample_nums, model_name_in_paper,
+                    num_timesteps, **kwargs):
+        """Add a job that calls function(sample_num=sample_num, **kwargs)
+        for each sample number, yielding (sample_num, result) as each job
+        finishes, like scheduler.JobScheduler.map_samples.
+
+        Closing the generator early removes the jobs that have not been
+        claimed yet.
+        """
+
+        sample_nums = iter(sample_nums)
+        job_names = {}
+
+        def submit_available():
+            for sample_num in sample_nums:
+                job_name = self.put(function, model_name_in_paper,
+                                    num_timesteps, sample_num=sample_num,
+                                    **kwargs)
+                job_names[job_name] = sample_num
+
+        submit_available()
+        try:
+            while job_names:
+                done = set(self._list_jobs('done')).intersection(job_names)
+                if not done:
+                    self.requeue_stale_jobs()
+                    time.sleep(self.poll_interval)
+                    continue
+                for job_name in sorted(done, key=job_names.get):
+                    sample_num = job_names.pop(job_name)
+                    logging.info('Done with bootstrap sample %s.',
+                                 sample_num+1)
+                    yield sample_num, self.get_result(job_name)
+                    submit_available()
+        finally:
+            for job_name in job_names:
+                self.cancel(job_name)
+
+
+def _send_heartbeats(queue, job_name, interval, stop):
+    """Send a heartbeat for a job every interval seconds until stop is
+    set."""
+    while not stop.wait(interval):
+        queue.heartbeat(job_name)
+
+
+def run_worker(queue_dir, solver=None, solver_threads=None,
+               result_cache_dir=None, poll_interval=5,
+               heartbeat_interval=60, exit_when_empty=False):
+    """Claim and run jobs from a work queue, one at a time.
+
+    Parameters:
+    -----------
+    queue_dir (str) : directory of the queue
+    solver (str) : 'cbc' or 'gurobi', see buq.run_simulation
+    solver_threads (int) : number of threads the solver may use
+    result_cache_dir (str) : if given, directory of a storage.ResultCache
+        used by the simulations of this worker
+    poll_interval (float) : time between checks for new jobs, in seconds
+    heartbeat_interval (float) : time between heartbeats of the running
+        job, in seconds. Must be well below the claim_timeout of the
+        coordinator
+    exit_when_empty (bool) : stop once there are no pending jobs, instead
+        of waiting for new ones
+
+    Returns:
+    --------
+    num_jobs (int) : number of jobs run
+    """
+
+    queue = WorkQueue(queue_dir, poll_interval=poll_interval)
+    worker_id = queue.worker_id
+    result_cache = None
+    if result_cache_dir is not None:
+        result_cache = storage.ResultCache(result_cache_dir)
+
+    num_jobs = 0
+    while True:
+        job = queue.claim()
+        if job is None:
+            if exit_when_empty:
+                break
+            time.sleep(poll_interval)
+            continue
+        job_name, spec = job
+        logging.info('Worker %s running job %s.', worker_id, job_name)
+        kwargs = spec['kwargs']
+        if result_cache is not None:
+            kwargs['result_cache'] = result_cache
+        stop = threading.Event()
+        heartbeats = threading.Thread(
+            target=_send_heartbeats,
+            args=(queue, job_name, heartbeat_interval, stop), daemon=True
+        )
+        heartbeats.start()
+        error = None
+        try:
+            function = getattr(buq, JOB_FUNCTIONS[spec['function']])
+            result = function(
+                solver=solver, solver_threads=solver_threads, **kwargs
+            )
+        except Exception:
+            # Reported to the coordinator as a failed run, since errors
+            # cannot be raised there
+            logging.exception('Job %s failed.', job_name)
+            result = _get_failed_result(spec['function'])
+            error = '{}:\n{}'.format(worker_id, traceback.format_exc())
+        finally:
+            stop.set()
+            heartbeats.join()
+        queue.complete(job_name, result, error=error)
+        num_jobs += 1
+
+    logging.info('Worker %s ran %s jobs.', worker_id, num_jobs)
+
+    return num_jobs
+
+
+def run_coordinator(queue_dir, poll_interval=5, claim_timeout=None,
+                    **kwargs):
+    """Calculate the point estimate and stdev estimate with simulations
+    run by the workers of a work queue.
+
+    Parameters:
+    -----------
+    queue_dir (str) : directory of the queue
+    poll_interval (float) : time between checks for finished jobs, in
+        seconds
+    claim_timeout (float) : see WorkQueue
+    kwargs : arguments of buq.calculate_point_estimate_and_stdev, apart
+        from num_workers, scheduler and the result store and cache. A seed
+        or a run store is required, so that a restarted coordinator
+        submits the same jobs and reuses those in the queue
+
+    Returns:
+    --------
+    estimate_with_stdev (pandas DataFrame) : see
+        buq.calculate_point_estimate_and_stdev
+    """
+
+    if kwargs.get('seed') is None and kwargs.get('run_store_dir') is None:
+        raise ValueError('Runs through a work queue need a seed or a run '
+                         'store, which keeps the seed.')
+    with WorkQueue(queue_dir, poll_interval=poll_interval,
+                   claim_timeout=claim_timeout) as queue:
+        return buq.calculate_point_estimate_and_stdev(scheduler=queue,
+                                                      **kwargs)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(
+        format='[%(asctime)s] %(levelname)s: %(message)s',
+        level=getattr(logging, 'INFO'),
+        datefmt='%Y-%m-%d,%H:%M:%S'
+    )
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('role', choices=['worker', 'coordinator'])
+    parser.add_argument('queue_dir', help='directory of the work queue')
+    parser.add_argument('--poll-interval', type=float, default=5,
+                        help='seconds between checks of the queue')
+    worker_args = parser.add_argument_group('worker')
+    worker_args.add_argument('--solver', default=None,
+                             help="'cbc' (default) or 'gurobi'")
+    worker_args.add_argument('--solver-threads', type=int, default=None)
+    worker_args.add_argument('--result-cache-dir', default=None)
+    worker_args.add_argument('--exit-when-empty', action='store_true',
+                             help='stop when there are no pending jobs')
+    coordinator_args = parser.add_argument_group('coordinator')
+    coordinator_args.add_argument('--model', default='LP_planning',
+                                  choices=list(buq.MODELS_IN_PAPER))
+    coordinator_args.add_argument('--point-estimate-range', type=int,
+                                  nargs=2, default=[2017, 2017])
+    coordinator_args.add_argument('--scheme', default='weeks',
+                                  choices=['weeks', 'months'])
+    coordinator_args.add_argument('--num-blocks-per-bin', type=int,
+                                  default=3)
+    coordinator_args.add_argument('--num-bootstrap-samples', type=int,
+                                  default=10)
+    coordinator_args.add_argument('--seed', type=int, default=None)
+    coordinator_args.add_argument('--stdev-rel-tol', type=float,
+                                  default=None)
+    coordinator_args.add_argument('--time-limit', type=float, default=None)
+    coordinator_args.add_argument('--mip-gap', type=float, default=None)
+    coordinator_args.add_argument('--straggler-policy', default='drop',
+                                  choices=buq.STRAGGLER_POLICIES)
+    coordinator_args.add_argument('--run-store-dir', default=None)
+    coordinator_args.add_argument('--sample-index-dir', default=None,
+                                  help='directory in which the rows of '
+                                  'the bootstrap samples are stored')
+    coordinator_args.add_argument('--claim-timeout', type=float,
+                                  default=600,
+                                  help='seconds without a heartbeat after '
+                                  'which a claimed job is put back')
+    coordinator_args.add_argument('--output', default='model_outputs.csv',
+                                  help='CSV file for the estimates')
+    args = parser.parse_args()
+
+    if args.role == 'worker':
+        run_worker(args.queue_dir, solver=args.solver,
+                   solver_threads=args.solver_threads,
+                   result_cache_dir=args.result_cache_dir,
+                   poll_interval=args.poll_interval,
+                   exit_when_empty=args.exit_when_empty)
+    else:
+        results = run_coordinator(
+            args.queue_dir, poll_interval=args.poll_interval,
+            claim_timeout=args.claim_timeout,
+            model_name_in_paper=args.model,
+            point_estimate_range=args.point_estimate_range,
+            bootstrap_scheme=args.scheme,
+            num_blocks_per_bin=args.num_blocks_per_bin,
+            num_bootstrap_samples=args.num_bootstrap_samples,
+            stdev_rel_tol=args.stdev_rel_tol,
+            run_store_dir=args.run_store_dir,
+            sample_index_dir=args.sample_index_dir,
+            seed=args.seed,
+            time_limit=args.time_limit,
+            mip_gap=args.mip_gap,
+            straggler_policy=args.straggler_policy
+        )
+        results.to_csv(args.output, float_format='%.5f')